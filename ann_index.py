@@ -0,0 +1,452 @@
+"""
+Approximate nearest-neighbour search over SBERT embeddings.
+
+`IVFIndex` is an inverted-file index built in-process with numpy:
+embeddings are L2-normalized, clustered with spherical k-means into
+`n_lists` cells, and stored contiguously cell by cell. A query only scans
+the `nprobe` cells whose centroids are closest to it, so the cost of a
+query grows with nprobe * (n / n_lists) instead of n. Raising `nprobe`
+trades latency for recall; `nprobe == n_lists` is an exact search.
+
+`SemanticIndex` keeps one IVF index over file embeddings and one over
+section embeddings, as produced by `main.calculate_similarity_sbert`, and
+re-scores the retrieved candidates exactly so its results use the same
+format and scores as the brute-force path.
+
+Usage:
+    index = SemanticIndex.build(files)
+    index.save('notes/.dragon_brain/semantic')
+
+    index = SemanticIndex.load('notes/.dragon_brain/semantic')
+    index.update(files)  # encode only new or edited notes
+    results = index.query(read_markdown_file('notes/target.md'), top_k=10, nprobe=8)
+"""
+import os
+import json
+import uuid
+import numpy as np
+from scipy import sparse
+
+from main import top_k_indices
+from document import NoteDocument
+from ingest import file_key, read_unchanged
+from corpus_index import generation_filename
+from embeddings import (
+    SBERT_AVAILABLE, DEFAULT_MODEL, DEFAULT_BATCH_SIZE,
+    get_engine, get_embedding_cache, embedding_scores
+)
+
+SEMANTIC_INDEX_VERSION = 2
+DEFAULT_NPROBE = 8
+
+META_FILENAME = 'meta.json'
+EMBEDDINGS_FILENAME = 'embeddings.npz'
+FILE_IVF_FILENAME = 'file_ivf.npz'
+SECTION_IVF_FILENAME = 'section_ivf.npz'
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class IVFIndex:
+    """
+    Inverted-file index for cosine similarity search.
+
+    Args:
+        n_lists: Number of k-means cells (default: about sqrt(n))
+        nprobe: Default number of cells scanned per query
+        n_iter: k-means iterations used to train the centroids
+        seed: Random seed for centroid initialization
+    """
+
+    def __init__(self, n_lists=None, nprobe=DEFAULT_NPROBE, n_iter=10, seed=0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.centroids = None
+        self.vectors = None    # normalized vectors, grouped by cell
+        self.ids = None        # original row of each stored vector
+        self.list_ptr = None   # cell c holds vectors[list_ptr[c]:list_ptr[c + 1]]
+
+    def __len__(self):
+        return 0 if self.ids is None else len(self.ids)
+
+    def build(self, vectors):
+        """Trains the cells on `vectors` and stores every row. Returns self."""
+        vectors = _normalize(vectors)
+        n = len(vectors)
+        if n == 0:
+            self.centroids = np.zeros((0, vectors.shape[1] if vectors.ndim == 2 else 0), dtype=np.float32)
+            self.vectors = self.centroids
+            self.ids = np.zeros(0, dtype=np.int64)
+            self.list_ptr = np.zeros(1, dtype=np.int64)
+            self.n_lists = 0
+            return self
+        n_lists = self.n_lists or max(1, int(round(np.sqrt(n))))
+        n_lists = max(1, min(n_lists, n))
+
+        rng = np.random.default_rng(self.seed)
+        # Centroids only need a sample; ~64 points per cell is plenty
+        sample = vectors
+        if n > 64 * n_lists:
+            sample = vectors[rng.choice(n, 64 * n_lists, replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+
+        for _ in range(self.n_iter):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            members = sparse.csr_matrix((np.ones(len(sample), dtype=np.float32), (assignment, np.arange(len(sample)))),
+                                        shape=(n_lists, len(sample)))
+            sums = np.asarray(members @ sample)
+            counts = np.bincount(assignment, minlength=n_lists)
+            # Empty cells keep their previous centroid
+            sums[counts == 0] = centroids[counts == 0]
+            centroids = _normalize(sums)
+
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind='stable')
+        self.centroids = centroids
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.ids = order.astype(np.int64)
+        self.list_ptr = np.concatenate([[0], np.cumsum(np.bincount(assignment, minlength=n_lists))])
+        self.n_lists = n_lists
+        return self
+
+    def search(self, query, k=10, nprobe=None):
+        """
+        Returns (ids, cosine_similarities) of the approximate k nearest rows,
+        highest similarity first.
+        """
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = _normalize(query)
+        nprobe = min(nprobe or self.nprobe, self.n_lists)
+
+        cells = top_k_indices(self.centroids @ query, nprobe)
+        # Cells are contiguous, so each is scored on a slice without copying
+        spans = [(self.list_ptr[c], self.list_ptr[c + 1]) for c in cells]
+        candidates = np.concatenate([np.arange(start, end) for start, end in spans])
+        scores = np.concatenate([self.vectors[start:end] @ query for start, end in spans])
+        best = top_k_indices(scores, k)
+        return self.ids[candidates[best]], scores[best]
+
+    def exact_search(self, query, k=10):
+        """Brute-force search over every stored row, for recall measurements."""
+        if not len(self):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        scores = self.vectors @ _normalize(query)
+        best = top_k_indices(scores, k)
+        return self.ids[best], scores[best]
+
+    def save(self, path):
+        """Writes the index to an .npz file."""
+        _atomic_save(path, centroids=self.centroids, vectors=self.vectors, ids=self.ids,
+                     list_ptr=self.list_ptr, params=np.array([self.nprobe, self.n_iter, self.seed]))
+
+    @classmethod
+    def load(cls, path):
+        """Loads an index written by `save`."""
+        with np.load(path) as data:
+            nprobe, n_iter, seed = (int(value) for value in data['params'])
+            index = cls(n_lists=len(data['centroids']), nprobe=nprobe, n_iter=n_iter, seed=seed)
+            index.centroids = data['centroids']
+            index.vectors = data['vectors']
+            index.ids = data['ids']
+            index.list_ptr = data['list_ptr']
+        return index
+
+
+def _atomic_save(path, **arrays):
+    tmp_path = path + '.tmp.npz'
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+def _analyze_note(file_path):
+    """Reads a note for encoding. Returns (file entry, content sections, text) or None."""
+    # Taken before reading, so a note edited meanwhile never matches its offsets
+    try:
+        key = file_key(file_path)
+    except OSError:
+        return None
+    document = NoteDocument.from_file(file_path)
+    if not document:
+        return None
+    entry = {'file': file_path, 'top_keywords': dict(document.freq[:10]), 'mtime_ns': key[0], 'size': key[1]}
+    return entry, document.content_sections, document.text
+
+
+def _stack(vectors, dim):
+    """Stacks embedding rows into a float32 matrix, (0, dim) when there are none."""
+    return np.asarray(vectors, dtype=np.float32) if vectors else np.zeros((0, dim), dtype=np.float32)
+
+
+class SemanticIndex:
+    """
+    ANN indexes over the file and section embeddings of a set of notes.
+    Sections are stored as character offsets and their content is read back
+    from the note only for returned results, if the note's mtime and size
+    still match the ones recorded when it was encoded.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL):
+        self.model_name = model_name
+        self.files = []              # [{'file', 'top_keywords', 'mtime_ns', 'size'}]
+        self.sections = []           # [(file_index, heading, start, end)]
+        self.section_ptr = np.zeros(1, dtype=np.int64)
+        self.file_embeddings = None
+        self.section_embeddings = None
+        self.file_ivf = IVFIndex()
+        self.section_ivf = IVFIndex()
+
+    def __len__(self):
+        return len(self.files)
+
+    @classmethod
+    def build(cls, files, model_name=DEFAULT_MODEL, batch_size=DEFAULT_BATCH_SIZE,
+              use_cache=True, n_lists=None, nprobe=DEFAULT_NPROBE):
+        """
+        Encodes every note and non-empty section (through the embedding
+        cache, like `calculate_similarity_sbert`) and builds both indexes.
+        """
+        index = cls(model_name)
+        index.file_ivf = IVFIndex(nprobe=nprobe)
+        index.update(files, batch_size, use_cache, n_lists)
+        return index
+
+    def update(self, files, batch_size=DEFAULT_BATCH_SIZE, use_cache=True, n_lists=None):
+        """
+        Brings the index in line with `files`. Only new notes and notes whose
+        mtime/size changed are read and encoded; notes missing from `files`
+        are dropped. When anything changed, both IVF indexes are retrained
+        with `n_lists` cells (default: about sqrt(n)).
+
+        Returns:
+            Dictionary with counts of 'added', 'modified', 'removed' and
+            'unchanged' files
+        """
+        if not SBERT_AVAILABLE:
+            raise ImportError("sentence-transformers not installed. Install with: pip install sentence-transformers")
+
+        stats = {'added': 0, 'modified': 0, 'removed': 0, 'unchanged': 0}
+        existing = {entry['file']: i for i, entry in enumerate(self.files)}
+        # One (stored row, None) per unchanged note, (None, analyzed note) per new or edited one
+        plan = []
+        for file_path in files:
+            i = existing.pop(file_path, None)
+            if i is not None:
+                try:
+                    unchanged = file_key(file_path) == (self.files[i]['mtime_ns'], self.files[i]['size'])
+                except OSError:
+                    unchanged = False
+                if unchanged:
+                    plan.append((i, None))
+                    stats['unchanged'] += 1
+                    continue
+            note = _analyze_note(file_path)
+            if note is not None:
+                plan.append((None, note))
+                stats['added' if i is None else 'modified'] += 1
+            elif i is not None:
+                stats['removed'] += 1
+        stats['removed'] += len(existing)
+        if not (stats['added'] or stats['modified'] or stats['removed']):
+            return stats
+
+        new_notes = [note for _, note in plan if note is not None]
+        file_texts = [text for _, _, text in new_notes]
+        section_texts = [section['content'] for _, sections, _ in new_notes for section in sections]
+        embeddings = np.zeros((0, 0), dtype=np.float32)
+        if file_texts:
+            print(f"Encoding {len(file_texts) + len(section_texts)} texts...")
+            cache = get_embedding_cache() if use_cache else None
+            embeddings = get_engine().encode(file_texts + section_texts, self.model_name, batch_size, cache=cache)
+        new_file_embeddings = embeddings[:len(file_texts)]
+        new_section_embeddings = embeddings[len(file_texts):]
+
+        files_out = []
+        sections_out = []
+        file_vectors = []
+        section_vectors = []
+        new_file = new_section = 0
+        for i, note in plan:
+            file_index = len(files_out)
+            if note is None:
+                start, end = self.section_ptr[i], self.section_ptr[i + 1]
+                files_out.append(self.files[i])
+                sections_out.extend((file_index,) + tuple(section[1:]) for section in self.sections[start:end])
+                file_vectors.append(self.file_embeddings[i])
+                section_vectors.extend(self.section_embeddings[start:end])
+            else:
+                entry, sections, _ = note
+                files_out.append(entry)
+                sections_out.extend((file_index, s['heading'], s['start'], s['end']) for s in sections)
+                file_vectors.append(new_file_embeddings[new_file])
+                section_vectors.extend(new_section_embeddings[new_section:new_section + len(sections)])
+                new_file += 1
+                new_section += len(sections)
+
+        dim = file_vectors[0].shape[0] if file_vectors else 0
+        self.files = files_out
+        self.sections = sections_out
+        self.file_embeddings = _stack(file_vectors, dim)
+        self.section_embeddings = _stack(section_vectors, dim)
+        self.section_ptr = np.zeros(len(files_out) + 1, dtype=np.int64)
+        np.cumsum(np.bincount([section[0] for section in sections_out], minlength=len(files_out)),
+                  out=self.section_ptr[1:])
+
+        nprobe = self.file_ivf.nprobe
+        self.file_ivf = IVFIndex(n_lists=n_lists, nprobe=nprobe).build(self.file_embeddings)
+        self.section_ivf = IVFIndex(n_lists=n_lists, nprobe=nprobe).build(self.section_embeddings)
+        return stats
+
+    def encode_target(self, target_text):
+        return get_engine().encode([target_text], self.model_name)[0]
+
+    def query(self, target_text, top_k=10, nprobe=None, exclude=None):
+        """
+        Returns the top_k most similar files in the format of
+        `main.calculate_similarity_sbert`. Candidates come from the file
+        index; their scores and section scores are computed exactly.
+        With top_k=None every file is scored, without the index.
+        """
+        if not target_text or not self.files:
+            return []
+        target_embedding = self.encode_target(target_text)
+
+        if top_k is None:
+            ids = range(len(self.files))
+        else:
+            # The index ranks by cosine while results are ranked by combined
+            # similarity, so over-fetch candidates (and one for `exclude`)
+            ids, _ = self.file_ivf.search(target_embedding, 2 * top_k + 1, nprobe)
+        ids = [i for i in ids if self.files[i]['file'] != exclude]
+
+        cosine, distance, euclidean, combined = embedding_scores(target_embedding, self.file_embeddings[ids])
+        # Sections (and the note reads behind them) only for the files returned
+        results = []
+        for j in top_k_indices(combined, top_k):
+            i = ids[j]
+            start, end = self.section_ptr[i], self.section_ptr[i + 1]
+            results.append({
+                'file': self.files[i]['file'],
+                'cosine_similarity': float(cosine[j]),
+                'euclidean_similarity': float(euclidean[j]),
+                'combined_similarity': float(combined[j]),
+                'euclidean_distance': float(distance[j]),
+                'top_keywords': self.files[i]['top_keywords'],
+                'heading_similarities': self._heading_similarities(target_embedding, range(start, end))
+            })
+        return results
+
+    def query_sections(self, target_text, top_k=10, nprobe=None, exclude=None):
+        """
+        Returns the top_k most similar sections across all notes, each with its
+        'file'. With top_k=None every section is scored, without the index.
+        """
+        if not target_text or not self.sections:
+            return []
+        target_embedding = self.encode_target(target_text)
+
+        if top_k is None:
+            ids = range(len(self.sections))
+        else:
+            ids, _ = self.section_ivf.search(target_embedding, top_k + self._max_sections(), nprobe)
+        ids = [i for i in ids if self.files[self.sections[i][0]]['file'] != exclude]
+
+        _, _, _, combined = embedding_scores(target_embedding, self.section_embeddings[ids])
+        return self._heading_similarities(target_embedding, [ids[j] for j in top_k_indices(combined, top_k)],
+                                          with_file=True)
+
+    def _max_sections(self):
+        return int(np.diff(self.section_ptr).max()) if len(self.section_ptr) > 1 else 0
+
+    def _heading_similarities(self, target_embedding, section_ids, with_file=False):
+        """
+        Scores sections and reads their content back. Sections of a note that
+        changed since it was encoded are left out: their offsets and
+        embeddings no longer describe its text.
+        """
+        section_ids = list(section_ids)
+        cosine, _, euclidean, combined = embedding_scores(target_embedding, self.section_embeddings[section_ids])
+        texts = {}
+        results = []
+        for j, i in enumerate(section_ids):
+            file_index, heading, start, end = self.sections[i]
+            entry = self.files[file_index]
+            if file_index not in texts:
+                texts[file_index] = read_unchanged(entry['file'], (entry['mtime_ns'], entry['size']))
+                if texts[file_index] is None:
+                    print(f"Warning: '{entry['file']}' changed since it was indexed; its sections are left out.")
+            if texts[file_index] is None:
+                continue
+            result = {
+                'heading': heading,
+                'content': texts[file_index][start:end],
+                'cosine_similarity': float(cosine[j]),
+                'euclidean_similarity': float(euclidean[j]),
+                'combined_similarity': float(combined[j])
+            }
+            if with_file:
+                result['file'] = entry['file']
+            results.append(result)
+        return results
+
+    def save(self, index_path):
+        """
+        Writes the index to a directory (created if needed). As in
+        `CorpusIndex.save`, the arrays are written under a new generation's
+        file names and meta.json, replaced last, selects that generation.
+        """
+        os.makedirs(index_path, exist_ok=True)
+        generation = uuid.uuid4().hex[:16]
+        _atomic_save(os.path.join(index_path, generation_filename(EMBEDDINGS_FILENAME, generation)),
+                     files=self.file_embeddings, sections=self.section_embeddings, section_ptr=self.section_ptr)
+        self.file_ivf.save(os.path.join(index_path, generation_filename(FILE_IVF_FILENAME, generation)))
+        self.section_ivf.save(os.path.join(index_path, generation_filename(SECTION_IVF_FILENAME, generation)))
+        meta = {
+            'version': SEMANTIC_INDEX_VERSION,
+            'generation': generation,
+            'model_name': self.model_name,
+            'files': self.files,
+            'sections': self.sections
+        }
+        tmp_file = os.path.join(index_path, META_FILENAME + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_file, os.path.join(index_path, META_FILENAME))
+
+        current = {generation_filename(name, generation)
+                   for name in (EMBEDDINGS_FILENAME, FILE_IVF_FILENAME, SECTION_IVF_FILENAME)}
+        stems = {os.path.splitext(name)[0] for name in (EMBEDDINGS_FILENAME, FILE_IVF_FILENAME, SECTION_IVF_FILENAME)}
+        for name in os.listdir(index_path):
+            if name.endswith('.npz') and name.split('.')[0] in stems and name not in current:
+                try:
+                    os.remove(os.path.join(index_path, name))
+                except OSError:
+                    pass
+
+    @classmethod
+    def load(cls, index_path):
+        """Loads an index written by `save`."""
+        with open(os.path.join(index_path, META_FILENAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != SEMANTIC_INDEX_VERSION:
+            raise ValueError(f"Unsupported semantic index version {meta.get('version')} in {index_path}")
+
+        index = cls(meta['model_name'])
+        index.files = meta['files']
+        index.sections = [tuple(section) for section in meta['sections']]
+        generation = meta.get('generation')
+        with np.load(os.path.join(index_path, generation_filename(EMBEDDINGS_FILENAME, generation))) as data:
+            index.file_embeddings = data['files']
+            index.section_embeddings = data['sections']
+            index.section_ptr = data['section_ptr']
+        index.file_ivf = IVFIndex.load(os.path.join(index_path, generation_filename(FILE_IVF_FILENAME, generation)))
+        index.section_ivf = IVFIndex.load(
+            os.path.join(index_path, generation_filename(SECTION_IVF_FILENAME, generation))
+        )
+        return index
@@ -0,0 +1,291 @@
+"""
+Batch queries: many targets against one corpus in one run.
+
+Calling `calculate_similarity` once per target re-reads every comparison
+note and refits a TfidfVectorizer on [target] + corpus each time.
+`calculate_similarity_batch` analyzes and vectorizes the corpus once, then
+projects blocks of targets into its vocabulary and scores each block with
+sparse matrix products.
+
+The IDF that `calculate_similarity` fits depends on the target only
+through the target's own terms and, when the target is part of the
+corpus, through the rows that are skipped as "self". With k self rows and
+N corpus rows, a target sees n = N - k + 1 documents and
+
+    idf(term) = ln((1 + n) / (1 + df(term))) + 1                 other terms
+    idf(term) = ln((1 + n) / (1 + df(term) - k + 1)) + 1         target terms
+
+so the per-target correction only touches the target's terms and the
+scores are the same as the per-target runs. Targets inside the corpus
+reuse their corpus row and are not read again.
+
+Usage:
+    for target, results in calculate_similarity_batch(targets, compare_files, top_k=10):
+        ...
+    python main.py --targets-from targets.txt notes/ --top-k 10 --output results.jsonl
+"""
+import json
+from collections import defaultdict
+
+import numpy as np
+
+from main import (
+    normalized_euclidean, section_scores,
+    top_k_indices, build_heading_similarities
+)
+from corpus_index import TermVocabulary
+from ingest import ingest_files, file_key, read_unchanged
+from profiling import stage
+
+DEFAULT_BLOCK_MB = 256
+# Dense float64 arrays alive per target and corpus row (dots, norms, cosine, combined)
+_ARRAYS_PER_TARGET = 4
+
+
+class _BatchCorpus:
+    """Term counts and metadata of the comparison notes, vectorized once."""
+
+    def __init__(self, compare_files, workers=None):
+        self.vocabulary = TermVocabulary()
+        self.files = []
+        self.keys = []
+        self.top_keywords = []
+        self.sections = []
+        self.rows_of = defaultdict(list)
+        self._changed = set()
+        # Keys are taken before reading, so a note edited meanwhile never matches its offsets
+        keys = []
+        for file_path in compare_files:
+            try:
+                keys.append(file_key(file_path))
+            except OSError:
+                keys.append(None)
+        notes = []
+        for file_path, key, note in zip(compare_files, keys, ingest_files(compare_files, workers)):
+            if note:
+                self.rows_of[file_path].append(len(self.files))
+                self.files.append(file_path)
+                self.keys.append(key)
+                self.top_keywords.append(dict(note[1][:10]))
+                self.sections.append([(heading, start, end) for heading, start, end, _ in note[2]])
+                notes.append(note)
+
+        with stage('vectorize', items=len(notes)):
+            self.file_counts = self.vocabulary.count_rows([note[0] for note in notes]).astype(np.float64)
+            self.section_counts = self.vocabulary.count_rows(
+                [section[3] for note in notes for section in note[2]]
+            ).astype(np.float64)
+        n_terms = len(self.vocabulary)
+        self.file_counts.resize((self.file_counts.shape[0], n_terms))
+        self.section_counts.resize((self.section_counts.shape[0], n_terms))
+
+        self.squared = self.file_counts.multiply(self.file_counts).tocsr()
+        self.row_nonzero = self.file_counts.getnnz(axis=1) > 0
+        self.document_frequency = np.bincount(self.file_counts.indices, minlength=n_terms)
+        self.section_ptr = np.concatenate([[0], np.cumsum([len(s) for s in self.sections], dtype=np.int64)])
+        self.section_df = np.bincount(self.section_counts.indices, minlength=n_terms)
+        self._row_square_sums = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def section_text(self, i):
+        """
+        Reads note i again for its section content. Returns '' (with a warning,
+        once per note) if it changed after it was analyzed.
+        """
+        text = read_unchanged(self.files[i], self.keys[i]) if self.keys[i] is not None else None
+        if text is None:
+            if self.files[i] not in self._changed:
+                self._changed.add(self.files[i])
+                print(f"Warning: '{self.files[i]}' changed after it was analyzed; its section text is not shown.")
+            text = ''
+        return text
+
+    def _base_row_square_sums(self, n_documents, idf):
+        """Squared norms of every TF-IDF row when no term gets a target correction."""
+        if n_documents not in self._row_square_sums:
+            self._row_square_sums[n_documents] = self.squared @ (idf ** 2)
+        return self._row_square_sums[n_documents]
+
+    def score(self, targets, oov_square_sums, n_self):
+        """
+        Scores target count rows that share the same number of self rows.
+
+        Returns:
+            (cosine, euclidean_distance, target_norms) with one row per target
+        """
+        n_documents = len(self) - n_self + 1
+        df = self.document_frequency
+        idf = np.log((1 + n_documents) / (1 + df)) + 1
+        oov_idf = np.log((1 + n_documents) / 2) + 1
+
+        targets = targets.tocsr()
+        columns = targets.indices
+        target_idf = np.log((1 + n_documents) / (2 - n_self + df[columns])) + 1
+
+        weighted = targets.copy()
+        weighted.data = targets.data * target_idf
+        target_norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel()
+                               + oov_square_sums * oov_idf ** 2)
+
+        weighted.data = targets.data * target_idf ** 2
+        dots = (weighted @ self.file_counts.T).toarray()
+        row_square_sums = self._base_row_square_sums(n_documents, idf)[np.newaxis, :]
+        if n_self != 1:
+            # Target terms change the IDF, and so the norm, of every row containing them
+            correction = targets.copy()
+            correction.data = target_idf ** 2 - idf[columns] ** 2
+            row_square_sums = row_square_sums + (correction @ self.squared.T).toarray()
+
+        denominator = np.sqrt(np.maximum(row_square_sums, 0)) * target_norms[:, np.newaxis]
+        cosine = np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+        euclidean = normalized_euclidean(cosine, self.row_nonzero[np.newaxis, :], (target_norms > 0)[:, np.newaxis])
+        return cosine, euclidean, target_norms
+
+    def section_scores(self, target, target_square_sum, self_rows, winners, section_idf):
+        """Scores the target against the sections of `winners` with the IDF of all non-self sections."""
+        section_rows = np.concatenate(
+            [np.arange(self.section_ptr[i], self.section_ptr[i + 1]) for i in winners]
+            + [np.zeros(0, dtype=np.int64)]
+        )
+        n_sections = int(self.section_ptr[-1])
+        self_sections = np.concatenate(
+            [np.arange(self.section_ptr[i], self.section_ptr[i + 1]) for i in self_rows]
+            + [np.zeros(0, dtype=np.int64)]
+        )
+        if n_sections - len(self_sections) == 0 or not len(section_rows):
+            return None
+
+        if section_idf == 'corpus':
+            df = self.section_df
+            if len(self_sections):
+                df = df - np.bincount(self.section_counts[self_sections].indices, minlength=len(df))
+            return section_scores(target, target_square_sum, self.section_counts[section_rows], section_idf,
+                                  document_frequency=df, n_documents=n_sections - len(self_sections) + 1)
+        return section_scores(target, target_square_sum, self.section_counts[section_rows], section_idf)
+
+
+def calculate_similarity_batch(targets, compare_files, top_k=None, section_idf='corpus', workers=None,
+                               block_mb=DEFAULT_BLOCK_MB):
+    """
+    Scores many target notes against the same comparison notes.
+
+    Args:
+        targets: Paths of target markdown files
+        compare_files: List of paths to comparison markdown files
+        top_k: Only return the k most similar files per target (default: all)
+        section_idf: 'corpus' or 'pairwise' section IDF (see `main.section_scores`)
+        workers: Processes used to read and analyze notes (see `ingest`)
+        block_mb: Memory for the dense scores of one block of targets
+
+    Yields:
+        (target_file, results) per target, in input order, where results
+        are the same as `main.calculate_similarity(target_file, compare_files,
+        section_idf=section_idf, top_k=top_k)`.
+    """
+    targets = list(targets)
+    print(f"Processing {len(compare_files)} comparison files...")
+    corpus = _BatchCorpus(list(compare_files), workers)
+    if not len(corpus):
+        print("No valid comparison files found.")
+        for target_file in targets:
+            yield target_file, []
+        return
+
+    block_size = max(1, int(block_mb * 1024 * 1024 // (len(corpus) * 8 * _ARRAYS_PER_TARGET)))
+    for block_start in range(0, len(targets), block_size):
+        block = targets[block_start:block_start + block_size]
+        block_results = {}
+
+        # Targets outside the corpus are read; targets inside it reuse their row
+        outside = [i for i, target_file in enumerate(block) if target_file not in corpus.rows_of]
+        notes = dict(zip(outside, ingest_files([block[i] for i in outside], workers)))
+        groups = defaultdict(list)
+        for i, target_file in enumerate(block):
+            if i in notes and not notes[i]:
+                print(f"Error: Could not read target file {target_file}")
+                block_results[i] = []
+            else:
+                groups[len(corpus.rows_of.get(target_file, ()))].append(i)
+
+        for n_self, members in groups.items():
+            if n_self:
+                target_counts = corpus.file_counts[[corpus.rows_of[block[i]][0] for i in members]]
+                oov_square_sums = np.zeros(len(members))
+            else:
+                with stage('vectorize', items=len(members)):
+                    target_counts, oov_square_sums = corpus.vocabulary.query_rows([notes[i][0] for i in members])
+            with stage('score', items=len(members)):
+                cosine, euclidean, target_norms = corpus.score(target_counts, oov_square_sums, n_self)
+            euclidean_sim = 1 / (1 + euclidean)
+            combined = (cosine + euclidean_sim) / 2
+
+            for row, i in enumerate(members):
+                self_rows = corpus.rows_of.get(block[i], [])
+                scores = combined[row]
+                scores[self_rows] = -np.inf
+                order = top_k_indices(scores, None if top_k is None else top_k + n_self)
+                order = order[~np.isin(order, self_rows)][:top_k]
+
+                target = target_counts[row].toarray().ravel()
+                section_results = None
+                if target_norms[row] > 0:
+                    section_results = corpus.section_scores(
+                        target, float(target @ target) + oov_square_sums[row], self_rows, order, section_idf
+                    )
+
+                results = []
+                offset = 0
+                for j in order:
+                    # Section content is only read back for the returned files
+                    sections = []
+                    if corpus.sections[j]:
+                        text = corpus.section_text(j)
+                        sections = [{'heading': heading, 'content': text[start:end]}
+                                    for heading, start, end in corpus.sections[j]]
+                    results.append({
+                        'file': corpus.files[j],
+                        'cosine_similarity': cosine[row, j],
+                        'euclidean_similarity': euclidean_sim[row, j],
+                        'combined_similarity': combined[row, j],
+                        'euclidean_distance': euclidean[row, j],
+                        'top_keywords': corpus.top_keywords[j],
+                        'heading_similarities': build_heading_similarities(sections, section_results, offset)
+                    })
+                    offset += len(corpus.sections[j])
+                block_results[i] = results
+
+        for i, target_file in enumerate(block):
+            yield target_file, block_results[i]
+        print(f"  Scored {min(len(targets), block_start + block_size)}/{len(targets)} targets...")
+
+
+def write_batch_jsonl(batch, f):
+    """
+    Writes one JSON line per (target_file, results) pair as soon as it is
+    produced. Section contents are left out; they are slices of the notes.
+    Returns the number of targets written.
+    """
+    count = 0
+    for target_file, results in batch:
+        f.write(json.dumps({
+            'target': target_file,
+            'results': [{
+                'file': result['file'],
+                'cosine_similarity': float(result['cosine_similarity']),
+                'euclidean_similarity': float(result['euclidean_similarity']),
+                'combined_similarity': float(result['combined_similarity']),
+                'euclidean_distance': float(result['euclidean_distance']),
+                'top_keywords': result['top_keywords'],
+                'heading_similarities': [{
+                    'heading': section['heading'],
+                    'cosine_similarity': float(section['cosine_similarity']),
+                    'euclidean_similarity': float(section['euclidean_similarity']),
+                    'combined_similarity': float(section['combined_similarity'])
+                } for section in result['heading_similarities']]
+            } for result in results]
+        }, ensure_ascii=False) + '\n')
+        f.flush()
+        count += 1
+    return count
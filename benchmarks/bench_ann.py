@@ -0,0 +1,88 @@
+"""
+Benchmark: recall@k and latency of the IVF index against exact search.
+
+By default it runs on synthetic clustered embeddings, so it works without
+sentence-transformers. With --notes it uses real SBERT section embeddings
+of a notes directory instead.
+
+Usage:
+    python benchmarks/bench_ann.py [--n 50000] [--dim 384] [--k 10] [--queries 200]
+    python benchmarks/bench_ann.py --notes sample_notes/ [--model NAME]
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ann_index import IVFIndex, SemanticIndex
+
+
+def synthetic_embeddings(n, dim, n_topics, seed=0):
+    """Gaussian clusters around random topic directions, like sentence embeddings of a vault."""
+    rng = np.random.default_rng(seed)
+    topics = rng.normal(size=(n_topics, dim))
+    vectors = topics[rng.integers(n_topics, size=n)] + 1.5 * rng.normal(size=(n, dim))
+    return vectors.astype(np.float32)
+
+
+def note_embeddings(directory, model_name):
+    files = [str(file) for file in Path(directory).rglob('*.md')]
+    index = SemanticIndex.build(files, model_name=model_name)
+    return index.section_embeddings
+
+
+def run(vectors, k, n_queries, n_lists, nprobes, seed=0):
+    rng = np.random.default_rng(seed)
+    # Queries are perturbed corpus vectors so every query has close neighbours
+    queries = vectors[rng.integers(len(vectors), size=n_queries)]
+    queries = queries + 0.3 * rng.normal(size=queries.shape).astype(np.float32) * np.abs(queries).mean()
+
+    start = time.perf_counter()
+    index = IVFIndex(n_lists=n_lists).build(vectors)
+    build_time = time.perf_counter() - start
+    print(f"Corpus: {len(vectors)} x {vectors.shape[1]}, {index.n_lists} lists, built in {build_time:.2f}s")
+    print()
+
+    start = time.perf_counter()
+    exact = [set(index.exact_search(query, k)[0].tolist()) for query in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / n_queries
+
+    print(f"{'nprobe':>8} {f'recall@{k}':>10} {'ms/query':>10} {'speedup':>8}")
+    print(f"{'exact':>8} {1.0:>10.3f} {exact_ms:>10.3f} {1.0:>7.1f}x")
+    for nprobe in nprobes:
+        if nprobe > index.n_lists:
+            continue
+        start = time.perf_counter()
+        found = [index.search(query, k, nprobe)[0] for query in queries]
+        ann_ms = (time.perf_counter() - start) * 1000 / n_queries
+        recall = np.mean([len(truth.intersection(ids.tolist())) / len(truth) for truth, ids in zip(exact, found)])
+        print(f"{nprobe:>8} {recall:>10.3f} {ann_ms:>10.3f} {exact_ms / ann_ms:>7.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IVF index recall/latency benchmark')
+    parser.add_argument('--n', type=int, default=50000, help='Synthetic corpus size')
+    parser.add_argument('--dim', type=int, default=384, help='Embedding dimension')
+    parser.add_argument('--topics', type=int, default=500, help='Synthetic topic clusters')
+    parser.add_argument('--notes', help='Benchmark SBERT section embeddings of this directory instead')
+    parser.add_argument('--model', default='paraphrase-MiniLM-L6-v2', help='SBERT model for --notes')
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--lists', type=int, help='Number of IVF lists (default: sqrt(n))')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    if args.notes:
+        vectors = note_embeddings(args.notes, args.model)
+    else:
+        vectors = synthetic_embeddings(args.n, args.dim, args.topics)
+    run(vectors, args.k, args.queries, args.lists, args.nprobe)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark: parallel note ingestion with 1 to N worker processes.
+
+Builds a corpus by copying the sample notes into a temporary directory
+(or uses --notes), then times `ingest.ingest_files` for each worker count
+and checks that every run returns identical results.
+
+Usage:
+    python benchmarks/bench_ingest.py [--copies 100] [--workers 1 2 4 8] [--chunksize N]
+    python benchmarks/bench_ingest.py --notes ~/vault
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest import ingest_files
+
+SAMPLE_NOTES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_notes')
+
+
+def make_corpus(directory, copies):
+    """Copies every sample note `copies` times; returns the file list."""
+    files = []
+    sources = sorted(Path(SAMPLE_NOTES).rglob('*.md'))
+    for copy in range(copies):
+        for source in sources:
+            target = os.path.join(directory, f"{source.stem}_{copy}.md")
+            shutil.copyfile(source, target)
+            files.append(target)
+    return files
+
+
+def default_worker_counts():
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+    if counts[-1] != (os.cpu_count() or 1):
+        counts.append(os.cpu_count())
+    return counts
+
+
+def run(files, worker_counts, chunksize):
+    print(f"Corpus: {len(files)} notes, {os.cpu_count()} CPUs")
+    print()
+    print(f"{'workers':>8} {'seconds':>9} {'notes/s':>9} {'speedup':>8}")
+
+    baseline_time = None
+    baseline = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        results = ingest_files(files, workers=workers, chunksize=chunksize)
+        elapsed = time.perf_counter() - start
+
+        if baseline is None:
+            baseline_time, baseline = elapsed, results
+        elif results != baseline:
+            raise AssertionError(f"Results with {workers} workers differ from 1 worker")
+        print(f"{workers:>8} {elapsed:>9.3f} {len(files) / elapsed:>9.0f} {baseline_time / elapsed:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Parallel ingestion scaling benchmark')
+    parser.add_argument('--notes', help='Use the markdown notes in this directory')
+    parser.add_argument('--copies', type=int, default=100, help='Copies of the sample notes (default: 100)')
+    parser.add_argument('--workers', type=int, nargs='+', help='Worker counts (default: 1, 2, 4, ... CPUs)')
+    parser.add_argument('--chunksize', type=int, help='Notes per dispatched chunk (default: automatic)')
+    args = parser.parse_args()
+
+    worker_counts = args.workers or default_worker_counts()
+    if args.notes:
+        run([str(file) for file in Path(args.notes).rglob('*.md')], worker_counts, args.chunksize)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        run(make_corpus(directory, args.copies), worker_counts, args.chunksize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Micro-benchmark: keyword extraction throughput on the sample notes.
+
+Runs `extract_keywords` over every note and every section of the corpus
+(as calculate_similarity does) and reports tokens per second, where tokens
+are the Korean/English words the extractor scans.
+
+Usage:
+    python benchmarks/bench_keywords.py [--notes sample_notes] [--repeat 20]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import extract_keywords, extract_sections_by_heading, read_markdown_file
+
+SAMPLE_NOTES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_notes')
+TOKEN_PATTERN = re.compile(r'[가-힣]+|[a-zA-Z]+')
+
+
+def load_corpus(directory):
+    """Returns (texts, top_n) pairs: every note plus every non-empty section."""
+    calls = []
+    for file_path in sorted(Path(directory).rglob('*.md')):
+        text = read_markdown_file(str(file_path))
+        calls.append((text, 20))
+        for section in extract_sections_by_heading(text):
+            if section['content'].strip():
+                calls.append((section['content'], 10))
+    return calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keyword extraction micro-benchmark')
+    parser.add_argument('--notes', default=SAMPLE_NOTES, help='Directory of markdown notes')
+    parser.add_argument('--repeat', type=int, default=20, help='Passes over the corpus (best one is reported)')
+    args = parser.parse_args()
+
+    calls = load_corpus(args.notes)
+    tokens = sum(len(TOKEN_PATTERN.findall(text)) for text, _ in calls)
+    characters = sum(len(text) for text, _ in calls)
+
+    best = float('inf')
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for text, top_n in calls:
+            extract_keywords(text, top_n)
+        best = min(best, time.perf_counter() - start)
+
+    print(f"Corpus: {len(calls)} texts, {tokens} tokens, {characters} characters")
+    print(f"Best pass: {best * 1000:.2f} ms")
+    print(f"Throughput: {tokens / best:,.0f} tokens/s, {len(calls) / best:,.0f} texts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Startup benchmark: import time of the entry points and CLI usage latency.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters,
+reports the best cumulative import time of each module and the slowest
+imports below it, and fails when a budget is exceeded or when a heavy
+optional dependency (sklearn, torch, sentence_transformers, nltk,
+markdown) is imported at startup. Use it as a regression guard in CI.
+
+Usage:
+    python benchmarks/bench_startup.py [--repeat 5] [--budget-ms 500] [--top 5]
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must only be imported on the code paths that need them
+HEAVY_MODULES = ['sklearn', 'torch', 'sentence_transformers', 'transformers', 'nltk', 'markdown']
+ENTRY_MODULES = ['main', 'corpus_index', 'server']
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def import_profile(module):
+    """Returns ({module: cumulative_us} of top-level imports, cumulative_us of `module`) from -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr}")
+    imported = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            imported[match.group(4)] = int(match.group(2))
+    return imported, imported.get(module, 0)
+
+
+def usage_time():
+    """Wall time of `python main.py` printing its usage."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'main.py'], cwd=ROOT, capture_output=True)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Startup time benchmark and regression guard')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per measurement (best one is reported)')
+    parser.add_argument('--budget-ms', type=float, default=500, help='Maximum import time of each entry module')
+    parser.add_argument('--top', type=int, default=5, help='Slowest imports to list per module')
+    args = parser.parse_args()
+
+    failures = []
+    for module in ENTRY_MODULES:
+        runs = [import_profile(module) for _ in range(args.repeat)]
+        imported, best_us = min(runs, key=lambda run: run[1])
+        print(f"import {module}: {best_us / 1000:.1f} ms (best of {args.repeat})")
+        slowest = sorted(((us, name) for name, us in imported.items() if name != module and '.' not in name),
+                         reverse=True)[:args.top]
+        for us, name in slowest:
+            print(f"  {name:<30} {us / 1000:8.1f} ms")
+
+        heavy = sorted({name.split('.')[0] for name in imported} & set(HEAVY_MODULES))
+        if heavy:
+            failures.append(f"import {module} loads {', '.join(heavy)}")
+        if best_us / 1000 > args.budget_ms:
+            failures.append(f"import {module} took {best_us / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    best_usage = min(usage_time() for _ in range(args.repeat))
+    print(f"python main.py (usage): {best_usage * 1000:.1f} ms wall")
+
+    if failures:
+        print()
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Benchmark suite on a synthetic Korean/English corpus, with regression checks.
+
+Generates a deterministic corpus (see `synthetic_corpus`), then times:
+- keywords:   `extract_keywords` over every note
+- similarity: `calculate_similarity` (TF-IDF) of the first note against the rest
+- sbert:      `calculate_similarity_sbert` on the first --sbert-notes notes,
+              without the embedding cache (skipped without sentence-transformers)
+- feed:       GUI feed building: `build_feed_cards` on the similarity results
+              and rendering of the first page of cards with a cold renderer
+
+Each benchmark reports the best and median of --repeat runs, after an
+untimed warm-up on a tiny input so lazy imports (scikit-learn, markdown,
+the SBERT model) are not timed. Results are written as JSON; with
+--compare, best times are checked against a baseline file and the run
+exits non-zero when one is slower by more than --threshold.
+
+Usage:
+    python benchmarks/bench_suite.py --notes 1k --output baseline.json
+    python benchmarks/bench_suite.py --notes 1k --compare baseline.json [--threshold 0.1]
+    python benchmarks/bench_suite.py --notes 100k --corpus-dir /tmp/corpus-100k --only keywords similarity
+"""
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import contextlib
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import calculate_similarity, extract_keywords, read_markdown_file
+from synthetic_corpus import generate_corpus, NoteGenerator
+
+BENCHMARKS = ('keywords', 'similarity', 'sbert', 'feed')
+DEFAULT_OUTPUT = 'bench_results.json'
+# Slowdown of the best time, relative to the baseline, that counts as a regression
+DEFAULT_THRESHOLD = 0.10
+
+
+def note_count(value):
+    """Parses a note count such as 1000, 10k or 100k."""
+    value = value.lower()
+    return int(float(value[:-1]) * 1000) if value.endswith('k') else int(value)
+
+
+def measure(function, repeat):
+    """Runs `function` `repeat` times; returns (timing dict, last return value)."""
+    times = []
+    for _ in range(repeat):
+        # Garbage left by earlier runs is not collected on the clock
+        gc.collect()
+        start = time.perf_counter()
+        # The pipeline's progress messages are not part of the benchmark
+        with contextlib.redirect_stdout(None):
+            value = function()
+        times.append(time.perf_counter() - start)
+    return {'best_s': min(times), 'median_s': statistics.median(times), 'runs': repeat}, value
+
+
+def run_benchmarks(files, names, repeat, top_k, sbert_notes):
+    """Returns {name: timing dict with item counts} for the requested benchmarks."""
+    results = {}
+    target, compare_files = files[0], files[1:]
+    similarity_results = None
+
+    if 'keywords' in names:
+        texts = [read_markdown_file(path) for path in files]
+        timing, _ = measure(lambda: [extract_keywords(text) for text in texts], repeat)
+        results['keywords'] = dict(timing, items=len(texts))
+
+    if 'similarity' in names or 'feed' in names:
+        measure(lambda: calculate_similarity(target, compare_files[:1]), 1)
+        timing, similarity_results = measure(lambda: calculate_similarity(target, compare_files, top_k=top_k), repeat)
+        if 'similarity' in names:
+            results['similarity'] = dict(timing, items=len(compare_files))
+
+    if 'sbert' in names:
+        from main import SBERT_AVAILABLE
+        if SBERT_AVAILABLE:
+            from main import calculate_similarity_sbert
+            subset = files[1:sbert_notes + 1]
+            measure(lambda: calculate_similarity_sbert(target, subset[:1], use_cache=False), 1)
+            timing, _ = measure(lambda: calculate_similarity_sbert(target, subset, use_cache=False, top_k=top_k),
+                                repeat)
+            results['sbert'] = dict(timing, items=len(subset))
+        else:
+            print("sbert: skipped (sentence-transformers not installed)")
+
+    if 'feed' in names:
+        from feed import build_feed_cards, card_html, MarkdownRenderer, PAGE_SIZE
+
+        def build_feed():
+            renderer = MarkdownRenderer()
+            cards = build_feed_cards(similarity_results)
+            return [card_html(card, renderer.render) for card in cards[:PAGE_SIZE]]
+
+        MarkdownRenderer().render("warm-up")
+        timing, _ = measure(build_feed, repeat)
+        results['feed'] = dict(timing, items=min(PAGE_SIZE, sum(
+            max(1, len(result.get('heading_similarities', []))) for result in similarity_results
+        )))
+    return results
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares best times of benchmarks present in both runs.
+
+    Returns:
+        List of dictionaries (name, baseline_s, current_s, change, regression)
+        where change is the relative slowdown (0.25 = 25% slower)
+    """
+    rows = []
+    for name, timing in current['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is None:
+            continue
+        change = timing['best_s'] / base['best_s'] - 1 if base['best_s'] > 0 else 0.0
+        rows.append({'name': name, 'baseline_s': base['best_s'], 'current_s': timing['best_s'],
+                     'change': change, 'regression': change > threshold})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite on a synthetic bilingual corpus')
+    parser.add_argument('--notes', type=note_count, default=1000, help='Notes in the corpus: 1k, 10k, 100k, ...')
+    parser.add_argument('--sections', type=int, nargs=2, default=(2, 8), metavar=('MIN', 'MAX'),
+                        help='Sections per note (default: 2 8)')
+    parser.add_argument('--words', type=int, default=80, help='Mean words per section (default: 80)')
+    parser.add_argument('--sigma', type=float, default=0.6, help='Log-normal spread of section lengths')
+    parser.add_argument('--korean-ratio', type=float, default=0.5, help='Share of Korean notes (default: 0.5)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus-dir', help='Keep the corpus here and reuse it on later runs (default: temporary)')
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS), help='Benchmarks to run')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per benchmark (default: 3)')
+    parser.add_argument('--top-k', type=int, default=50, help='Files returned by the similarity runs (default: 50)')
+    parser.add_argument('--sbert-notes', type=int, default=200, help='Notes compared by the SBERT benchmark')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help=f'Results JSON (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--compare', metavar='BASELINE', help='Baseline JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative slowdown flagged as a regression (default: 0.10)')
+    args = parser.parse_args()
+
+    generator_options = dict(sections=tuple(args.sections), words=args.words, sigma=args.sigma,
+                             korean_ratio=args.korean_ratio, seed=args.seed)
+    with tempfile.TemporaryDirectory() as temporary:
+        directory = args.corpus_dir or temporary
+        start = time.perf_counter()
+        files = generate_corpus(directory, args.notes, **generator_options)
+        print(f"Corpus: {len(files)} notes in {directory} ({time.perf_counter() - start:.1f}s)")
+        benchmarks = run_benchmarks(files, args.only, args.repeat, args.top_k, args.sbert_notes)
+
+    current = {
+        'corpus': dict(generator_options, notes=args.notes,
+                       fingerprint=NoteGenerator(**generator_options).fingerprint()),
+        'environment': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+        'benchmarks': benchmarks
+    }
+    print()
+    print(f"{'benchmark':<12} {'items':>8} {'best (s)':>10} {'median (s)':>11} {'items/s':>10}")
+    for name, timing in benchmarks.items():
+        print(f"{name:<12} {timing['items']:>8} {timing['best_s']:>10.3f} {timing['median_s']:>11.3f} "
+              f"{timing['items'] / timing['best_s']:>10.0f}")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(current, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('corpus', {}).get('fingerprint') != current['corpus']['fingerprint']:
+            print("Warning: the baseline was measured on a different corpus; timings are not comparable")
+        rows = compare(baseline, current, args.threshold)
+        print(f"\nCompared with {args.compare} (threshold {args.threshold:.0%}):")
+        for row in rows:
+            flag = '  REGRESSION' if row['regression'] else ''
+            print(f"{row['name']:<12} {row['baseline_s']:>10.3f} -> {row['current_s']:>8.3f} "
+                  f"{row['change']:>+8.1%}{flag}")
+        regressions = [row['name'] for row in rows if row['regression']]
+        if regressions:
+            print(f"\nRegressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Deterministic generator of Korean and English markdown notes for benchmarks.
+
+Notes are modelled on `sample_notes/`: every sample note is a topic whose
+words, headings and bold terms make up the vocabulary of the notes
+generated from it, so generated notes share keywords within a topic the
+way real notes do. A note has a title, an intro and a configurable number
+of `##` sections (some with `###` subsections) whose lengths follow a
+log-normal distribution, with bold terms, lists, wiki-style links and
+occasional code blocks, which exercises every part of `extract_keywords`.
+
+The same parameters and sample notes always produce the same files, so
+timings of two runs compare like for like.
+
+Usage:
+    files = generate_corpus('/tmp/corpus', n_notes=10000, seed=0)
+
+    python benchmarks/synthetic_corpus.py /tmp/corpus --notes 10000 [--sections 2 8] [--words 80]
+"""
+import os
+import re
+import sys
+import json
+import random
+import hashlib
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import read_markdown_file, find_headings, BOLD_PATTERN, CODE_BLOCK_PATTERN
+
+SAMPLE_NOTES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_notes')
+MANIFEST = 'corpus.json'
+# Notes per subdirectory, so large corpora do not end up in one directory
+NOTES_PER_DIRECTORY = 1000
+
+TOKEN_PATTERN = re.compile(r'[가-힣]+|[a-zA-Z][a-zA-Z\-]+')
+HANGUL_PATTERN = re.compile(r'[가-힣]')
+# Share of a sentence's words taken from other topics of the same language
+SHARED_WORD_RATE = 0.2
+
+CODE_SNIPPETS = [
+    "def process(items):\n    return [item for item in items if item]",
+    "SELECT id, name FROM notes WHERE score > 0.5;",
+    "const result = data.map(x => x * 2);",
+    "for i in range(10):\n    print(i)",
+]
+
+
+def load_topics(directory=SAMPLE_NOTES):
+    """Returns one topic per sample note: name, language, words, headings and bold terms."""
+    topics = []
+    for file_path in sorted(Path(directory).rglob('*.md')):
+        text = read_markdown_file(str(file_path))
+        if not text:
+            continue
+        prose = CODE_BLOCK_PATTERN.sub(' ', text)
+        words = TOKEN_PATTERN.findall(prose)
+        if not words:
+            continue
+        hangul = sum(1 for word in words if HANGUL_PATTERN.match(word))
+        headings = [heading for _, _, level, heading in find_headings(text) if level > 1]
+        bold = [a or b for a, b in BOLD_PATTERN.findall(prose)]
+        topics.append({
+            'name': file_path.stem,
+            'language': 'ko' if hangul * 2 >= len(words) else 'en',
+            'words': sorted(set(words)),
+            'headings': sorted(set(headings)) or sorted(set(words))[:10],
+            'bold': sorted(set(bold)) or sorted(set(words))[:10],
+        })
+    return topics
+
+
+class NoteGenerator:
+    """
+    Generates notes from the sample-note topics.
+
+    Args:
+        sections: (min, max) number of `##` sections per note
+        words: Mean words per section
+        sigma: Log-normal spread of the section length
+        korean_ratio: Share of notes written from Korean topics
+        seed: Random seed
+        sample_notes: Directory whose notes define the topics
+    """
+
+    def __init__(self, sections=(2, 8), words=80, sigma=0.6, korean_ratio=0.5, seed=0,
+                 sample_notes=SAMPLE_NOTES):
+        self.sections = tuple(sections)
+        self.words = words
+        self.sigma = sigma
+        self.korean_ratio = korean_ratio
+        self.seed = seed
+        self.topics = load_topics(sample_notes)
+        self.by_language = {
+            language: [topic for topic in self.topics if topic['language'] == language]
+            for language in ('en', 'ko')
+        }
+        self.shared_words = {
+            language: sorted({word for topic in topics for word in topic['words']})
+            for language, topics in self.by_language.items()
+        }
+        if not self.topics:
+            raise ValueError(f"No sample notes found in {sample_notes}")
+
+    def fingerprint(self):
+        """Hash of the generator's parameters and vocabulary; equal fingerprints mean equal corpora."""
+        digest = hashlib.blake2b(digest_size=8)
+        digest.update(repr((self.sections, self.words, self.sigma, self.korean_ratio, self.seed)).encode('utf-8'))
+        digest.update(json.dumps(self.topics, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _pick_topic(self, rng):
+        languages = [language for language in ('ko', 'en') if self.by_language[language]]
+        if len(languages) == 2:
+            language = 'ko' if rng.random() < self.korean_ratio else 'en'
+        else:
+            language = languages[0]
+        return rng.choice(self.by_language[language])
+
+    def _sentence(self, rng, topic, length):
+        shared = self.shared_words[topic['language']]
+        words = [rng.choice(shared) if rng.random() < SHARED_WORD_RATE else rng.choice(topic['words'])
+                 for _ in range(length)]
+        if topic['language'] == 'en':
+            words[0] = words[0].capitalize()
+        return ' '.join(words) + '.'
+
+    def _paragraph(self, rng, topic, n_words):
+        sentences = []
+        while n_words > 0:
+            length = min(n_words, rng.randint(6, 14))
+            sentence = self._sentence(rng, topic, length)
+            if rng.random() < 0.3:
+                term = rng.choice(topic['bold'])
+                sentence = f"**{term}**: {sentence}"
+            sentences.append(sentence)
+            n_words -= length
+        return ' '.join(sentences)
+
+    def _section_body(self, rng, topic, n_words, note_names):
+        blocks = []
+        if rng.random() < 0.4:
+            # A list of bold terms takes a share of the section's words
+            items = rng.randint(2, 5)
+            blocks.append('\n'.join(
+                f"- **{rng.choice(topic['bold'])}**: {self._sentence(rng, topic, rng.randint(3, 6))}"
+                for _ in range(items)
+            ))
+            n_words -= items * 5
+        if note_names and rng.random() < 0.2:
+            linked = rng.choice(note_names)
+            blocks.append(f"See also [{linked}]({linked}.md).")
+        if rng.random() < 0.1:
+            blocks.append(f"```\n{rng.choice(CODE_SNIPPETS)}\n```")
+        blocks.insert(0, self._paragraph(rng, topic, max(n_words, 6)))
+        return '\n\n'.join(blocks)
+
+    def note(self, number):
+        """Returns (file name, markdown text) of note `number`; each note has its own random stream."""
+        rng = random.Random(f"{self.seed}:{number}")
+        topic = self._pick_topic(rng)
+        title = f"{rng.choice(topic['headings'])} {number}"
+        lines = [f"# {title}", '', self._paragraph(rng, topic, rng.randint(15, 40))]
+        note_names = [f"{topic['name']}_{other}" for other in (number - 1, number + 1) if other >= 0]
+
+        for _ in range(rng.randint(*self.sections)):
+            n_words = max(10, int(rng.lognormvariate(0, self.sigma) * self.words))
+            lines += ['', f"## {rng.choice(topic['headings'])}", '']
+            if n_words > 2 * self.words and rng.random() < 0.5:
+                # Long sections are split into subsections
+                half = n_words // 2
+                lines.append(self._section_body(rng, topic, half, note_names))
+                lines += ['', f"### {rng.choice(topic['headings'])}", '']
+                lines.append(self._section_body(rng, topic, n_words - half, note_names))
+            else:
+                lines.append(self._section_body(rng, topic, n_words, note_names))
+        return f"{topic['name']}_{number}.md", '\n'.join(lines) + '\n'
+
+
+def generate_corpus(directory, n_notes, sections=(2, 8), words=80, sigma=0.6, korean_ratio=0.5, seed=0,
+                    sample_notes=SAMPLE_NOTES):
+    """
+    Writes `n_notes` notes into `directory` and returns their paths in note order.
+    A directory already holding the same corpus (same manifest) is reused as is.
+    """
+    generator = NoteGenerator(sections, words, sigma, korean_ratio, seed, sample_notes)
+    manifest = {'notes': n_notes, 'fingerprint': generator.fingerprint()}
+    manifest_path = os.path.join(directory, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            existing = json.load(f)
+        if {key: existing.get(key) for key in manifest} == manifest:
+            return [os.path.join(directory, path) for path in existing['files']]
+
+    os.makedirs(directory, exist_ok=True)
+    files = []
+    for number in range(n_notes):
+        name, text = generator.note(number)
+        relative = os.path.join(f"{number // NOTES_PER_DIRECTORY:03d}", name)
+        path = os.path.join(directory, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        files.append(relative)
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(manifest, files=files), f, ensure_ascii=False)
+    return [os.path.join(directory, path) for path in files]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic Korean/English markdown corpus')
+    parser.add_argument('directory', help='Output directory')
+    parser.add_argument('--notes', type=int, default=1000, help='Number of notes (default: 1000)')
+    parser.add_argument('--sections', type=int, nargs=2, default=(2, 8), metavar=('MIN', 'MAX'),
+                        help='Sections per note (default: 2 8)')
+    parser.add_argument('--words', type=int, default=80, help='Mean words per section (default: 80)')
+    parser.add_argument('--sigma', type=float, default=0.6, help='Log-normal spread of section lengths')
+    parser.add_argument('--korean-ratio', type=float, default=0.5, help='Share of Korean notes (default: 0.5)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    files = generate_corpus(args.directory, args.notes, args.sections, args.words, args.sigma,
+                            args.korean_ratio, args.seed)
+    print(f"{len(files)} notes in {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
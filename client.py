@@ -0,0 +1,105 @@
+"""
+Thin client for the query server (`python main.py serve`).
+
+Only uses the standard library, so it starts in a few milliseconds and
+can be vendored into editor plugins and scripts.
+
+Usage:
+    python client.py notes/target.md [--top-k N] [--sbert] [--json]
+    python client.py --health
+    python client.py --refresh
+
+    from client import query
+    results = query(file='notes/target.md', top_k=5)
+"""
+import os
+import sys
+import json
+import argparse
+import urllib.error
+import urllib.request
+
+DEFAULT_URL = 'http://127.0.0.1:8765'
+DEFAULT_TIMEOUT = 30
+
+
+class ServerError(Exception):
+    """Raised when the server is unreachable or rejects a request."""
+
+
+def _request(path, payload=None, url=DEFAULT_URL, timeout=DEFAULT_TIMEOUT):
+    data = None if payload is None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    request = urllib.request.Request(url.rstrip('/') + path, data=data,
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read().decode('utf-8')).get('error', e.reason)
+        except ValueError:
+            message = e.reason
+        raise ServerError(f"{e.code}: {message}") from None
+    except urllib.error.URLError as e:
+        raise ServerError(f"Could not reach {url} ({e.reason}). Start it with: python main.py serve <directory>") from None
+
+
+def query(file=None, text=None, top_k=10, section_idf='corpus', sbert=False, sections=True,
+          url=DEFAULT_URL, timeout=DEFAULT_TIMEOUT):
+    """
+    Returns the most similar notes to a note path or an unsaved note text,
+    as a list of result dictionaries (see `main.calculate_similarity`).
+    A relative `file` is resolved against this process's working directory,
+    not the server's.
+    """
+    payload = {'top_k': top_k, 'section_idf': section_idf, 'sbert': sbert, 'sections': sections}
+    if text is not None:
+        payload['text'] = text
+    if file is not None:
+        payload['file'] = os.path.abspath(file)
+    return _request('/query', payload, url, timeout)['results']
+
+
+def health(url=DEFAULT_URL, timeout=DEFAULT_TIMEOUT):
+    """Returns the server status (indexed notes, query count, uptime)."""
+    return _request('/health', url=url, timeout=timeout)
+
+
+def refresh(url=DEFAULT_URL, timeout=DEFAULT_TIMEOUT):
+    """Asks the server to pick up added, edited and deleted notes."""
+    return _request('/refresh', {}, url, timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query a running Dragon Brain server')
+    parser.add_argument('file', nargs='?', help='Target note')
+    parser.add_argument('--top-k', type=int, default=10, help='Number of results')
+    parser.add_argument('--sbert', action='store_true', help='Use the SBERT index')
+    parser.add_argument('--url', default=DEFAULT_URL, help='Server URL')
+    parser.add_argument('--json', action='store_true', help='Print the raw JSON response')
+    parser.add_argument('--health', action='store_true', help='Show server status')
+    parser.add_argument('--refresh', action='store_true', help='Re-index changed notes')
+    options = parser.parse_args()
+
+    try:
+        if options.health or options.refresh:
+            response = health(options.url) if options.health else refresh(options.url)
+            print(json.dumps(response, ensure_ascii=False, indent=2))
+            return
+        if not options.file:
+            parser.error('a target file is required')
+        results = query(file=options.file, top_k=options.top_k, sbert=options.sbert,
+                        sections=options.json, url=options.url)
+    except ServerError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if options.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return
+    for rank, result in enumerate(results, 1):
+        print(f"{rank:2d}. {result['combined_similarity']:.4f}  {result['file']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,691 @@
+"""
+Persistent on-disk corpus index for Dragon Brain.
+
+The index stores, for every note in a vault:
+- keyword term counts of the whole file (one sparse row per file)
+- keyword term counts of every non-empty section (one sparse row per section)
+- per-file metadata: path, mtime, size, content hash, top keywords and
+  section headings with character offsets
+
+Term counts are stored instead of TF-IDF weights because the IDF used by
+`calculate_similarity` depends on the target file. Keeping raw counts lets a
+query rebuild exactly the same TF-IDF vectors as
+`TfidfVectorizer().fit_transform([target] + compare_files)` without reading,
+re-extracting or re-vectorizing any of the indexed notes.
+
+With `n_features`, terms are mapped to a fixed number of hash buckets
+(`HashingVocabulary`) instead of a term dictionary. Rows vectorized in
+different processes or chunks then share their columns, document
+frequencies add up, and memory no longer grows with the vocabulary; terms
+that share a bucket are counted as one, so scores are approximate.
+
+Usage:
+    index = CorpusIndex.build(files, root='notes/')
+    index.save(default_index_path('notes/'))
+
+    index = CorpusIndex.load(default_index_path('notes/'))
+    index.update(files)  # re-process only new, edited or deleted notes
+    index = CorpusIndex.build(files, root='notes/', n_features=2 ** 20)  # hashed columns
+    results = index.query(read_markdown_file('notes/target.md'), exclude='notes/target.md')
+"""
+import os
+import re
+import json
+import uuid
+import zlib
+import hashlib
+from collections import Counter
+import numpy as np
+from scipy import sparse
+
+from main import (
+    read_markdown_file, extract_keywords,
+    tfidf_cosine, normalized_euclidean, section_scores, top_k_indices
+)
+from ingest import ingest_texts, file_key, read_unchanged
+from profiling import Profile, stage
+
+INDEX_VERSION = 1
+DEFAULT_INDEX_DIRNAME = '.dragon_brain'
+# Hash buckets of a HashingVocabulary (as in sklearn's HashingVectorizer)
+DEFAULT_N_FEATURES = 2 ** 20
+
+META_FILENAME = 'meta.json'
+# Matrix files are suffixed with the generation recorded in meta.json
+# (indexes saved without one use the plain names)
+FILE_COUNTS_FILENAME = 'file_counts.npz'
+SECTION_COUNTS_FILENAME = 'section_counts.npz'
+
+# Same tokenization as the default TfidfVectorizer used in main.py
+# (lowercase, then token_pattern r"(?u)\b\w\w+\b"), without importing sklearn
+TOKEN_PATTERN = re.compile(r"(?u)\b\w\w+\b")
+
+
+def _analyze(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def default_index_path(directory):
+    """Returns the default index location for a notes directory."""
+    return os.path.join(directory, DEFAULT_INDEX_DIRNAME)
+
+
+def content_hash(text):
+    """Returns the sha256 hex digest of a note's text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class TermVocabulary:
+    """Maps terms to column ids and turns keyword strings into sparse count rows."""
+
+    def __init__(self, terms=None):
+        self.terms = list(terms or [])
+        self.ids = {term: i for i, term in enumerate(self.terms)}
+
+    def __len__(self):
+        return len(self.terms)
+
+    def count_rows(self, texts):
+        """Returns a CSR matrix of term counts, adding unseen terms to the vocabulary."""
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            for term, count in Counter(_analyze(text)).items():
+                term_id = self.ids.get(term)
+                if term_id is None:
+                    term_id = len(self.terms)
+                    self.terms.append(term)
+                    self.ids[term] = term_id
+                indices.append(term_id)
+                data.append(count)
+            indptr.append(len(indices))
+
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=np.int32), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(texts), len(self.terms))
+        )
+
+    def query_vector(self, text):
+        """
+        Returns (counts, oov_square_sum) for a query text.
+        counts is a dense float vector over the vocabulary; terms that are not
+        in the vocabulary only contribute to the squared norm.
+        """
+        counts = np.zeros(len(self))
+        term_counts, oov_square_sum = self.query_counts(text)
+        for term_id, count in term_counts.items():
+            counts[term_id] = count
+        return counts, oov_square_sum
+
+    def query_counts(self, text):
+        """Like `query_vector`, with counts as a {term_id: count} dict of the terms present."""
+        term_counts = {}
+        oov_square_sum = 0.0
+        for term, count in Counter(_analyze(text)).items():
+            term_id = self.ids.get(term)
+            if term_id is None:
+                oov_square_sum += count ** 2
+            else:
+                term_counts[term_id] = count
+        return term_counts, oov_square_sum
+
+    def query_rows(self, texts):
+        """
+        Like `query_vector` for many texts at once: returns a CSR matrix of
+        term counts over the vocabulary (which is not extended) and an
+        array with the oov_square_sum of every text.
+        """
+        indptr = [0]
+        indices = []
+        data = []
+        oov_square_sums = np.zeros(len(texts))
+        for row, text in enumerate(texts):
+            for term, count in Counter(_analyze(text)).items():
+                term_id = self.ids.get(term)
+                if term_id is None:
+                    oov_square_sums[row] += count ** 2
+                else:
+                    indices.append(term_id)
+                    data.append(count)
+            indptr.append(len(indices))
+
+        counts = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(texts), len(self.terms))
+        )
+        return counts, oov_square_sums
+
+
+class HashingVocabulary(TermVocabulary):
+    """
+    `TermVocabulary` with `n_features` hash buckets as columns.
+
+    A term's column is the CRC32 of its UTF-8 bytes modulo n_features, the
+    same in every process, so nothing is stored per term and no term is out
+    of vocabulary. Terms sharing a bucket add their counts.
+    """
+
+    def __init__(self, n_features=DEFAULT_N_FEATURES):
+        if n_features < 1:
+            raise ValueError(f"n_features must be positive, got {n_features}")
+        super().__init__()
+        self.n_features = n_features
+
+    def __len__(self):
+        return self.n_features
+
+    def bucket_counts(self, text):
+        """Returns {bucket: count} for a keyword string."""
+        counts = {}
+        for term, count in Counter(_analyze(text)).items():
+            bucket = zlib.crc32(term.encode('utf-8')) % self.n_features
+            counts[bucket] = counts.get(bucket, 0) + count
+        return counts
+
+    def _rows(self, texts, dtype):
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            for bucket, count in self.bucket_counts(text).items():
+                indices.append(bucket)
+                data.append(count)
+            indptr.append(len(indices))
+        return sparse.csr_matrix(
+            (np.asarray(data, dtype=dtype), np.asarray(indices, dtype=np.int32), np.asarray(indptr, dtype=np.int64)),
+            shape=(len(texts), self.n_features)
+        )
+
+    def count_rows(self, texts):
+        return self._rows(texts, np.int32)
+
+    def query_counts(self, text):
+        return self.bucket_counts(text), 0.0
+
+    def query_rows(self, texts):
+        return self._rows(texts, np.float64), np.zeros(len(texts))
+
+
+def _resize(matrix, n_columns):
+    """Pads a CSR matrix with empty columns so it matches the vocabulary size."""
+    matrix = matrix.tocsr()
+    if matrix.shape[1] != n_columns:
+        matrix.resize((matrix.shape[0], n_columns))
+    return matrix
+
+
+def _index_dtype(n):
+    """Index dtype scipy keeps for n entries (int64 arrays that fit int32 get copied down)."""
+    return np.int32 if n <= np.iinfo(np.int32).max else np.int64
+
+
+class _RowBuffer:
+    """
+    CSR rows with spare capacity after the last row. `append` copies only
+    the new rows (and the arrays when they double), where `sparse.vstack`
+    copies the whole matrix on every call. `matrix` views the filled part.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+        self.n_rows, self.nnz = matrix.shape[0], matrix.nnz
+        dtype = _index_dtype(self.nnz)
+        self.data = matrix.data[:self.nnz].copy()
+        self.indices = matrix.indices[:self.nnz].astype(dtype)
+        self.indptr = matrix.indptr.astype(dtype)
+
+    def _reserve(self, n_rows, nnz):
+        if n_rows + 1 > len(self.indptr) or nnz > len(self.indices):
+            capacity = max(nnz, 2 * len(self.indices))
+            dtype = _index_dtype(capacity)
+            data = np.empty(capacity, dtype=self.data.dtype)
+            indices = np.empty(capacity, dtype=dtype)
+            indptr = np.empty(max(n_rows + 1, 2 * len(self.indptr)), dtype=dtype)
+            data[:self.nnz] = self.data[:self.nnz]
+            indices[:self.nnz] = self.indices[:self.nnz]
+            indptr[:self.n_rows + 1] = self.indptr[:self.n_rows + 1]
+            self.data, self.indices, self.indptr = data, indices, indptr
+
+    def append(self, rows, n_columns):
+        """Appends the rows of a CSR matrix; returns the whole matrix with n_columns columns."""
+        n_rows, nnz = self.n_rows + rows.shape[0], self.nnz + rows.nnz
+        self._reserve(n_rows, nnz)
+        self.data[self.nnz:nnz] = rows.data[:rows.nnz]
+        self.indices[self.nnz:nnz] = rows.indices[:rows.nnz]
+        self.indptr[self.n_rows + 1:n_rows + 1] = self.nnz + rows.indptr[1:]
+        self.n_rows, self.nnz = n_rows, nnz
+        self.matrix = sparse.csr_matrix(
+            (self.data[:nnz], self.indices[:nnz], self.indptr[:n_rows + 1]), shape=(n_rows, n_columns)
+        )
+        return self.matrix
+
+
+class CorpusIndex:
+    """
+    Sparse keyword index over a set of markdown notes.
+
+    Rows of `file_counts` correspond to `entries`; rows of `section_counts`
+    for entry i are `section_ptr[i]:section_ptr[i + 1]`. With `n_features`,
+    columns are hash buckets of a `HashingVocabulary`.
+    """
+
+    def __init__(self, root=None, n_features=None):
+        self.root = root
+        self.vocabulary = HashingVocabulary(n_features) if n_features else TermVocabulary()
+        self.entries = []
+        self.file_counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.section_counts = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.section_ptr = np.zeros(1, dtype=np.int64)
+        self._row_buffers = None  # Spare capacity for `add_notes`
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def n_features(self):
+        """Hash buckets of a hashed index, None for a term dictionary."""
+        return getattr(self.vocabulary, 'n_features', None)
+
+    def path(self, i):
+        """Returns the filesystem path of entry i."""
+        rel_path = self.entries[i]['path']
+        return os.path.join(self.root, rel_path) if self.root else rel_path
+
+    def _relative_path(self, path):
+        return os.path.relpath(path, self.root) if self.root else str(path)
+
+    @classmethod
+    def build(cls, files, root=None, workers=None, n_features=None):
+        """Reads and processes every file and returns a new index (hashed with `n_features` buckets)."""
+        index = cls(root, n_features)
+        print(f"Indexing {len(files)} files...")
+        index.update(files, workers)
+        return index
+
+    def update(self, files, workers=None):
+        """
+        Brings the index in line with `files`.
+        Only files whose mtime/size changed are read; of those, only files whose
+        content hash changed are re-processed. Indexed files missing from
+        `files` are dropped and new files are added.
+        `workers` processes extract keywords in parallel (see `ingest`).
+
+        Returns:
+            Dictionary with counts of 'added', 'modified', 'removed', 'touched'
+            (mtime changed, content identical) and 'unchanged' files, plus
+            'timings' (seconds per stage).
+        """
+        timings = Profile()
+        stats = {'added': 0, 'modified': 0, 'removed': 0, 'touched': 0, 'unchanged': 0}
+
+        # Stage 1: diff file list and stat() results against stored keys
+        with timings.stage('scan'):
+            current = {}
+            for file_path in files:
+                current[self._relative_path(file_path)] = file_path
+            existing = {entry['path']: i for i, entry in enumerate(self.entries)}
+
+            keep = np.zeros(len(self.entries), dtype=bool)
+            candidates = []
+            for rel_path, file_path in current.items():
+                key = file_key(file_path)
+                i = existing.get(rel_path)
+                if i is not None and (self.entries[i]['mtime_ns'], self.entries[i]['size']) == key:
+                    keep[i] = True
+                    stats['unchanged'] += 1
+                else:
+                    candidates.append((rel_path, file_path, i, key))
+
+        # Stage 2: read files with new stat() keys and compare content hashes
+        with timings.stage('read'):
+            changed = []
+            for rel_path, file_path, i, key in candidates:
+                text = read_markdown_file(file_path)
+                if not text:
+                    continue
+                digest = content_hash(text)
+                if i is not None and self.entries[i]['sha256'] == digest:
+                    self.entries[i]['mtime_ns'], self.entries[i]['size'] = key
+                    keep[i] = True
+                    stats['touched'] += 1
+                else:
+                    changed.append((rel_path, i, key, digest, text))
+
+        # Stage 3: keyword and section extraction for new or edited notes
+        with timings.stage('extract'):
+            new_entries = []
+            file_keywords = []
+            section_keywords = []
+            replaced = {}
+            analyzed = ingest_texts([change[4] for change in changed], workers)
+            for (rel_path, i, key, digest, _), (keywords, freq, sections) in zip(changed, analyzed):
+                if i is None:
+                    stats['added'] += 1
+                else:
+                    replaced[i] = len(new_entries)
+                    stats['modified'] += 1
+                new_entries.append({
+                    'path': rel_path,
+                    'mtime_ns': key[0],
+                    'size': key[1],
+                    'sha256': digest,
+                    'top_keywords': [[word, count] for word, count in freq[:10]],
+                    'sections': [[heading, start, end] for heading, start, end, _ in sections]
+                })
+                file_keywords.append(keywords)
+                section_keywords.extend(section[3] for section in sections)
+
+        # Stage 4: vectorize new rows and splice them into the stored matrices
+        with timings.stage('vectorize'):
+            new_file_counts = self.vocabulary.count_rows(file_keywords)
+            new_section_counts = self.vocabulary.count_rows(section_keywords)
+            new_section_ptr = np.zeros(len(new_entries) + 1, dtype=np.int64)
+            np.cumsum([len(entry['sections']) for entry in new_entries], out=new_section_ptr[1:])
+
+            n_old = len(self.entries)
+            n_old_sections = self.section_counts.shape[0]
+            entries = []
+            file_rows = []
+            section_rows = []
+            # Existing entries keep their order; edited notes are replaced in place
+            for i in range(n_old):
+                if i in replaced:
+                    j = replaced[i]
+                    entries.append(new_entries[j])
+                    file_rows.append(n_old + j)
+                    section_rows.append(n_old_sections + np.arange(new_section_ptr[j], new_section_ptr[j + 1]))
+                elif keep[i]:
+                    entries.append(self.entries[i])
+                    file_rows.append(i)
+                    section_rows.append(np.arange(self.section_ptr[i], self.section_ptr[i + 1]))
+                else:
+                    stats['removed'] += 1
+            added = set(replaced.values())
+            for j, entry in enumerate(new_entries):
+                if j not in added:
+                    entries.append(entry)
+                    file_rows.append(n_old + j)
+                    section_rows.append(n_old_sections + np.arange(new_section_ptr[j], new_section_ptr[j + 1]))
+
+            n_terms = len(self.vocabulary)
+            all_file_counts = sparse.vstack(
+                [_resize(self.file_counts, n_terms), _resize(new_file_counts, n_terms)], format='csr'
+            )
+            all_section_counts = sparse.vstack(
+                [_resize(self.section_counts, n_terms), _resize(new_section_counts, n_terms)], format='csr'
+            )
+            section_rows = np.concatenate(section_rows) if section_rows else np.zeros(0, dtype=np.int64)
+
+            self.entries = entries
+            self.file_counts = all_file_counts[np.asarray(file_rows, dtype=np.int64)]
+            self.section_counts = all_section_counts[section_rows]
+            self._compact_vocabulary()
+            self._finalize()
+
+        stats['timings'] = {name: record['wall_s'] for name, record in timings.stages.items()}
+        return stats
+
+    def add_notes(self, files, notes):
+        """
+        Appends notes that were already analyzed (the tuples returned by
+        `ingest.ingest_files`; None entries are skipped) without reading or
+        hashing them again. Used to build an in-memory index chunk by chunk:
+        rows are appended in place, so each chunk copies only its own rows.
+        Entries get the files' current mtime and size but no content hash.
+        """
+        kept = [(file_path, note) for file_path, note in zip(files, notes) if note]
+        for file_path, (_, top_keywords, sections) in kept:
+            key = file_key(file_path)
+            self.entries.append({
+                'path': self._relative_path(file_path),
+                'mtime_ns': key[0],
+                'size': key[1],
+                'sha256': None,
+                'top_keywords': [[word, count] for word, count in top_keywords[:10]],
+                'sections': [[heading, start, end] for heading, start, end, _ in sections]
+            })
+        new_file_counts = self.vocabulary.count_rows([note[0] for _, note in kept])
+        new_section_counts = self.vocabulary.count_rows([s[3] for _, note in kept for s in note[2]])
+
+        # Buffers are reseeded when another method replaced the matrices
+        buffers = self._row_buffers
+        if buffers is None or buffers[0].matrix is not self.file_counts \
+                or buffers[1].matrix is not self.section_counts:
+            buffers = self._row_buffers = (_RowBuffer(self.file_counts), _RowBuffer(self.section_counts))
+        n_terms = len(self.vocabulary)
+        self.file_counts = buffers[0].append(new_file_counts, n_terms)
+        self.section_counts = buffers[1].append(new_section_counts, n_terms)
+        section_lengths = np.cumsum([len(note[2]) for _, note in kept], dtype=np.int64)
+        self.section_ptr = np.concatenate([self.section_ptr, self.section_ptr[-1] + section_lengths])
+        return len(kept)
+
+    def _compact_vocabulary(self):
+        """Drops terms no longer used by any file or section once they pile up."""
+        n_terms = len(self.vocabulary)
+        if n_terms == 0 or self.n_features:
+            return
+        used = np.zeros(n_terms, dtype=bool)
+        used[self.file_counts.indices] = True
+        used[self.section_counts.indices] = True
+        if used.sum() >= 0.75 * n_terms:
+            return
+
+        terms = [term for term, is_used in zip(self.vocabulary.terms, used) if is_used]
+        self.vocabulary = TermVocabulary(terms)
+        self.file_counts = self.file_counts[:, used]
+        self.section_counts = self.section_counts[:, used]
+
+    def _finalize(self):
+        """Aligns matrix shapes with the vocabulary and rebuilds section pointers."""
+        n_terms = len(self.vocabulary)
+        self.file_counts = _resize(self.file_counts, n_terms)
+        self.section_counts = _resize(self.section_counts, n_terms)
+        self.section_ptr = np.zeros(len(self.entries) + 1, dtype=np.int64)
+        np.cumsum([len(entry['sections']) for entry in self.entries], out=self.section_ptr[1:])
+
+    def save(self, index_path):
+        """
+        Writes the index to a directory (created if needed).
+        The matrices are written under a new generation's file names, then
+        meta.json is switched to that generation in one atomic replace, and
+        only then are older matrices removed. A save interrupted at any point
+        leaves a meta.json whose matrices are the ones it was saved with.
+        """
+        os.makedirs(index_path, exist_ok=True)
+        generation = uuid.uuid4().hex[:16]
+        meta = {
+            'version': INDEX_VERSION,
+            'generation': generation,
+            'root': os.path.abspath(self.root) if self.root else None,
+            'vocabulary': self.vocabulary.terms,
+            'n_features': self.n_features,
+            'files': self.entries
+        }
+
+        matrices = {FILE_COUNTS_FILENAME: self.file_counts, SECTION_COUNTS_FILENAME: self.section_counts}
+        for name, matrix in matrices.items():
+            _atomic_write(os.path.join(index_path, generation_filename(name, generation)),
+                          lambda f: sparse.save_npz(f, matrix))
+        _atomic_write(os.path.join(index_path, META_FILENAME),
+                      lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8')))
+
+        current = {generation_filename(name, generation) for name in matrices}
+        stems = {os.path.splitext(name)[0] for name in matrices}
+        for name in os.listdir(index_path):
+            if name.endswith('.npz') and name.split('.')[0] in stems and name not in current:
+                try:
+                    os.remove(os.path.join(index_path, name))
+                except OSError:
+                    pass
+
+    @classmethod
+    def load(cls, index_path, root=None):
+        """
+        Loads an index written by `save`.
+        `root` overrides the stored notes directory (e.g. a relative path).
+        """
+        with open(os.path.join(index_path, META_FILENAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version {meta.get('version')} in {index_path}")
+
+        index = cls(root if root is not None else meta['root'], meta.get('n_features'))
+        if not index.n_features:
+            index.vocabulary = TermVocabulary(meta['vocabulary'])
+        index.entries = meta['files']
+        generation = meta.get('generation')
+        index.file_counts = sparse.load_npz(
+            os.path.join(index_path, generation_filename(FILE_COUNTS_FILENAME, generation))
+        ).tocsr()
+        index.section_counts = sparse.load_npz(
+            os.path.join(index_path, generation_filename(SECTION_COUNTS_FILENAME, generation))
+        ).tocsr()
+        index._finalize()
+        return index
+
+    def compared_rows(self, exclude=None):
+        """Returns the indices of the entries a query excluding path `exclude` compares against."""
+        keep = np.ones(len(self.entries), dtype=bool)
+        if exclude is not None:
+            excluded = os.path.abspath(exclude)
+            for i in range(len(self.entries)):
+                if os.path.abspath(self.path(i)) == excluded:
+                    keep[i] = False
+        return np.flatnonzero(keep)
+
+    def query(self, target_text, exclude=None, top_k=None, section_idf='corpus', section_text=True,
+              sections=True):
+        """
+        Scores target text against every indexed note.
+
+        Args:
+            target_text: Markdown text of the target note
+            exclude: Path to leave out of the comparison (usually the target file)
+            top_k: Only return the k most similar files (default: all)
+            section_idf: 'corpus' or 'pairwise' section IDF (see `main.section_scores`)
+            section_text: Read the returned notes back for their section
+                'content'. Scores need only the index; with False, 'content'
+                is None and no note is read.
+            sections: Score sections at all; with False every result's
+                'heading_similarities' is empty.
+
+        Returns:
+            List of result dictionaries sorted by similarity, in the same
+            format as `main.calculate_similarity`.
+        """
+        if not target_text or not self.entries:
+            return []
+
+        with stage('keywords', items=1):
+            target_keywords, _ = extract_keywords(target_text)
+            target, oov_square_sum = self.vocabulary.query_vector(target_keywords)
+
+        rows = self.compared_rows(exclude)
+        if len(rows) == 0:
+            return []
+
+        with stage('score', items=len(rows)):
+            counts = self.file_counts[rows]
+            document_frequency = np.bincount(counts.indices, minlength=len(self.vocabulary))
+            cosine, row_nonzero, target_nonzero = tfidf_cosine(
+                counts, document_frequency, len(rows) + 1, target, oov_square_sum
+            )
+            euclidean = normalized_euclidean(cosine, row_nonzero, target_nonzero)
+            euclidean_sim = 1 / (1 + euclidean)
+            combined = (cosine + euclidean_sim) / 2
+
+        with stage('sort', items=len(rows)):
+            order = top_k_indices(combined, top_k)
+
+        section_results = None
+        section_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        if sections:
+            # Sections are scored in one pass. Corpus IDF needs the sections of
+            # every compared file; pairwise IDF only those of the winners.
+            section_files = rows if section_idf == 'corpus' else rows[order]
+            section_starts = self.section_ptr[section_files]
+            section_lengths = self.section_ptr[section_files + 1] - section_starts
+            section_offsets = np.zeros(len(section_files) + 1, dtype=np.int64)
+            np.cumsum(section_lengths, out=section_offsets[1:])
+            if section_idf != 'corpus':
+                # Offsets are looked up by position in `rows`
+                positions = np.zeros(len(rows) + 1, dtype=np.int64)
+                positions[order] = section_offsets[:-1]
+                section_offsets = positions
+            section_rows = np.concatenate(
+                [np.arange(start, start + length) for start, length in zip(section_starts, section_lengths)]
+                + [np.zeros(0, dtype=np.int64)]
+            )
+            if target_keywords and len(section_rows):
+                target_square_sum = float(target @ target) + oov_square_sum
+                with stage('score', items=len(section_rows)):
+                    section_results = section_scores(
+                        target, target_square_sum, self.section_counts[section_rows], section_idf
+                    )
+
+        results = []
+        for position in order:
+            i = rows[position]
+            results.append({
+                'file': self.path(i),
+                'cosine_similarity': cosine[position],
+                'euclidean_similarity': euclidean_sim[position],
+                'combined_similarity': combined[position],
+                'euclidean_distance': euclidean[position],
+                'top_keywords': dict((word, count) for word, count in self.entries[i]['top_keywords']),
+                'heading_similarities': self.heading_similarities(
+                    i, section_results, section_offsets[position], section_text
+                )
+            })
+
+        return results
+
+    def heading_similarities(self, i, section_results, offset, section_text=True):
+        """
+        Builds heading similarity dicts of entry i from rows offset.. of section_results.
+        A note edited since it was indexed keeps its scores but loses its section
+        content, since the stored offsets no longer fit its text. Without
+        `section_text` the note is not read and 'content' is None.
+        """
+        entry = self.entries[i]
+        sections = entry['sections']
+        if section_results is None or not sections:
+            return []
+
+        text = None
+        if section_text:
+            text = read_unchanged(self.path(i), (entry['mtime_ns'], entry['size']))
+            if text is None:
+                print(f"Warning: '{self.path(i)}' changed since it was indexed; run 'update' to refresh the index.")
+                text = ''
+        cosine, euclidean_sim, combined, valid = section_results
+        results = []
+        for j, (heading, start, end) in enumerate(sections, offset):
+            # An empty vocabulary makes TfidfVectorizer fail; such sections are skipped
+            if not valid[j]:
+                continue
+            results.append({
+                'heading': heading,
+                'content': None if text is None else text[start:end],
+                'cosine_similarity': cosine[j],
+                'euclidean_similarity': euclidean_sim[j],
+                'combined_similarity': combined[j]
+            })
+        return results
+
+
+def generation_filename(filename, generation):
+    """'file_counts.npz' -> 'file_counts.<generation>.npz' (unchanged without a generation)."""
+    if not generation:
+        return filename
+    stem, extension = os.path.splitext(filename)
+    return f"{stem}.{generation}{extension}"
+
+
+def _atomic_write(path, write):
+    """Writes a file through a temporary name so readers never see partial data."""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
@@ -0,0 +1,136 @@
+"""
+Parsed note model shared by the scorers, ingestion and the GUI.
+
+A `NoteDocument` is built once per note text. Heading spans come from a
+single regex pass; sections are derived from them as character offsets;
+keywords of the whole note and of every section are extracted on first
+use and cached. Consumers that previously re-parsed the same text (file
+and section scoring, edit detection, the feed) share one instance instead.
+
+Usage:
+    doc = NoteDocument(read_markdown_file('notes/note.md'))
+    doc.keywords, doc.freq            # extract_keywords(text)
+    doc.sections                      # extract_sections_by_heading(text)
+    doc.section_keywords              # keywords of each non-empty section
+    doc.section_at(cursor_position)   # heading of the section being edited
+    doc = doc.edited(position, chars_removed, chars_added, new_text)  # after a keystroke
+"""
+from bisect import bisect_left, bisect_right
+
+from main import (
+    extract_keywords, extract_sections_by_heading, find_headings, read_markdown_file,
+    HEADING_LINE_PATTERN
+)
+
+
+class NoteDocument:
+    """
+    One parsed markdown note.
+
+    Attributes:
+        text: The note's full text
+        headings: (line_start, line_end, level, heading) of every heading line
+    """
+    __slots__ = ('text', 'headings', '_heading_starts', '_sections', '_content_sections',
+                 '_keywords', '_freq', '_section_keywords')
+
+    def __init__(self, text, headings=None):
+        self.text = text
+        self.headings = find_headings(text) if headings is None else headings
+        self._heading_starts = [heading[0] for heading in self.headings]
+        self._sections = None
+        self._content_sections = None
+        self._keywords = None
+        self._freq = None
+        self._section_keywords = None
+
+    @classmethod
+    def from_file(cls, file_path):
+        """Reads and parses a note. Returns None if the file is unreadable or empty."""
+        text = read_markdown_file(file_path)
+        return cls(text) if text else None
+
+    @property
+    def sections(self):
+        """Sections in the format of `main.extract_sections_by_heading`."""
+        if self._sections is None:
+            self._sections = extract_sections_by_heading(self.text, self.headings)
+        return self._sections
+
+    @property
+    def content_sections(self):
+        """Sections with non-whitespace content (the ones that are scored)."""
+        if self._content_sections is None:
+            self._content_sections = [section for section in self.sections if section['content'].strip()]
+        return self._content_sections
+
+    @property
+    def keywords(self):
+        """Keyword string of the whole note (as returned by `extract_keywords`)."""
+        if self._keywords is None:
+            self._keywords, self._freq = extract_keywords(self.text)
+        return self._keywords
+
+    @property
+    def freq(self):
+        """(word, count) pairs of the whole note (as returned by `extract_keywords`)."""
+        if self._freq is None:
+            self._keywords, self._freq = extract_keywords(self.text)
+        return self._freq
+
+    @property
+    def section_keywords(self):
+        """Keyword strings of `content_sections`, in the same order."""
+        if self._section_keywords is None:
+            self._section_keywords = [
+                extract_keywords(section['content'], top_n=10)[0] for section in self.content_sections
+            ]
+        return self._section_keywords
+
+    def edited(self, position, chars_removed, chars_added, new_text):
+        """
+        Returns the document of `new_text`, which is this text with
+        `chars_removed` characters at `position` replaced by `chars_added`
+        new ones (as reported by QTextDocument.contentsChange).
+
+        Headings are single lines, so only the lines touched by the edit
+        are re-scanned; headings before them are kept and headings after
+        them are shifted. Inconsistent edit reports fall back to a full parse.
+        """
+        delta = chars_added - chars_removed
+        if (position < 0 or position + chars_removed > len(self.text)
+                or len(new_text) != len(self.text) + delta):
+            return NoteDocument(new_text)
+
+        # First and last character of the touched lines, in old and new text
+        region_start = self.text.rfind('\n', 0, position) + 1
+        old_end = self.text.find('\n', position + chars_removed)
+        old_end = len(self.text) if old_end == -1 else old_end
+        new_end = new_text.find('\n', position + chars_added)
+        new_end = len(new_text) if new_end == -1 else new_end
+
+        first = bisect_left(self._heading_starts, region_start)
+        last = bisect_right(self._heading_starts, old_end)
+        rescanned = [
+            (match.start(), match.end(), len(match.group(1)), match.group(2).strip())
+            for match in HEADING_LINE_PATTERN.finditer(new_text, region_start, new_end)
+        ]
+        shifted = [(start + delta, end + delta, level, heading)
+                   for start, end, level, heading in self.headings[last:]]
+        return NoteDocument(new_text, self.headings[:first] + rescanned + shifted)
+
+    def section_at(self, position):
+        """
+        Returns the heading of the section containing character `position`
+        (a heading line belongs to its own section), or None before the
+        first heading.
+        """
+        i = bisect_right(self._heading_starts, position) - 1
+        return self.headings[i][3] if i >= 0 else None
+
+    def section_spans(self):
+        """(heading, start, end, section_keywords) for every content section."""
+        return [
+            (section['heading'], section['start'], section['end'], keywords)
+            for section, keywords in zip(self.content_sections, self.section_keywords)
+        ]
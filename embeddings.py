@@ -0,0 +1,618 @@
+"""
+Shared Sentence-BERT embedding engine for Dragon Brain.
+
+Loading a SentenceTransformer takes seconds, so models are loaded once per
+process and shared by every caller (CLI, GUI worker threads, server mode).
+Loaded models are kept in LRU order and evicted when their combined size
+exceeds a memory budget or when they have been idle for too long.
+
+Embeddings can also be persisted in an on-disk cache keyed by
+(model_name, sha256(text)), so unchanged notes and sections are never
+encoded twice. The cache is shared by every process (CLI, GUI, server);
+each model's store is read and written under a lock file.
+
+Usage:
+    from embeddings import get_engine, get_embedding_cache
+
+    engine = get_engine()
+    model = engine.get_model('paraphrase-MiniLM-L6-v2')
+    vectors = engine.encode(texts, cache=get_embedding_cache())
+"""
+import os
+import re
+import gc
+import json
+import hashlib
+import threading
+import time
+import importlib.util
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+
+# Cross-process locking of the embedding cache: flock where available,
+# byte-range locks on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# SBERT support (optional). sentence-transformers pulls in torch, which takes
+# seconds to import, so only its presence is checked here; the class is
+# imported by the first model load.
+SBERT_AVAILABLE = importlib.util.find_spec('sentence_transformers') is not None
+SentenceTransformer = None
+
+
+def _sentence_transformer_class():
+    global SentenceTransformer
+    if SentenceTransformer is None:
+        from sentence_transformers import SentenceTransformer
+    return SentenceTransformer
+
+DEFAULT_MODEL = 'paraphrase-MiniLM-L6-v2'
+
+# Combined size of resident models before least recently used ones are evicted
+DEFAULT_MEMORY_BUDGET_MB = 2048
+
+# Models unused for this long are evicted on the next engine access (None = never)
+DEFAULT_MAX_IDLE_SECONDS = 30 * 60
+
+# Texts per forward pass; larger batches amortize Python overhead on CPU
+DEFAULT_BATCH_SIZE = 64
+
+# On-disk embedding cache location and per-model size limit
+DEFAULT_CACHE_DIR = os.environ.get(
+    'DRAGON_BRAIN_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'dragon_brain', 'embeddings')
+)
+DEFAULT_CACHE_MAX_MB = 1024
+
+
+def _model_size_bytes(model):
+    """Estimates the memory held by a model's parameters and buffers."""
+    size = 0
+    try:
+        for tensor in list(model.parameters()) + list(model.buffers()):
+            size += tensor.numel() * tensor.element_size()
+    except AttributeError:
+        pass
+    return size
+
+
+class EmbeddingEngine:
+    """
+    Process-wide cache of loaded SentenceTransformer models.
+    Thread-safe: concurrent requests for the same model load it only once.
+    """
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, max_idle_seconds=DEFAULT_MAX_IDLE_SECONDS):
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.max_idle_seconds = max_idle_seconds
+        # model_name -> {'model', 'size', 'last_used'}, least recently used first
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+
+    def get_model(self, model_name=DEFAULT_MODEL):
+        """Returns a loaded model, loading it on first use."""
+        if not SBERT_AVAILABLE:
+            raise ImportError("sentence-transformers not installed. Install with: pip install sentence-transformers")
+
+        self.evict_idle()
+        model = self._touch(model_name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(model_name, threading.Lock())
+
+        # Only one thread loads a given model; others wait and reuse it
+        with load_lock:
+            model = self._touch(model_name)
+            if model is not None:
+                return model
+
+            print(f"Loading SBERT model: {model_name}...")
+            model = _sentence_transformer_class()(model_name)
+            with self._lock:
+                self._models[model_name] = {
+                    'model': model,
+                    'size': _model_size_bytes(model),
+                    'last_used': time.monotonic()
+                }
+                evicted = self._evict_over_budget(keep=model_name)
+            self._release(evicted)
+            return model
+
+    def encode(self, texts, model_name=DEFAULT_MODEL, batch_size=DEFAULT_BATCH_SIZE, cache=None):
+        """
+        Encodes many texts in large batches and returns a float32 matrix
+        (one row per text, in input order).
+        Texts are sorted by length first so each batch holds texts of similar
+        length and little padding is computed.
+        With an EmbeddingCache, only texts missing from the cache are encoded.
+        """
+        if cache is not None:
+            return cache.get_or_encode(
+                model_name, texts, lambda missing: self.encode(missing, model_name, batch_size)
+            )
+
+        model = self.get_model(model_name)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        encoded = model.encode(
+            [texts[i] for i in order],
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        encoded = np.asarray(encoded, dtype=np.float32)
+
+        embeddings = np.empty_like(encoded)
+        embeddings[order] = encoded
+        return embeddings
+
+    def _touch(self, model_name):
+        """Marks a resident model as most recently used and returns it."""
+        with self._lock:
+            entry = self._models.get(model_name)
+            if entry is None:
+                return None
+            entry['last_used'] = time.monotonic()
+            self._models.move_to_end(model_name)
+            return entry['model']
+
+    def _evict_over_budget(self, keep):
+        """Drops least recently used models until the budget is met. Caller holds the lock."""
+        evicted = []
+        total = sum(entry['size'] for entry in self._models.values())
+        for name in list(self._models):
+            if total <= self.memory_budget_bytes:
+                break
+            if name == keep:
+                continue
+            total -= self._models[name]['size']
+            evicted.append(name)
+            del self._models[name]
+        return evicted
+
+    def evict_idle(self):
+        """Evicts models that have not been used for `max_idle_seconds`."""
+        if self.max_idle_seconds is None:
+            return []
+        now = time.monotonic()
+        with self._lock:
+            evicted = [
+                name for name, entry in self._models.items()
+                if now - entry['last_used'] > self.max_idle_seconds
+            ]
+            for name in evicted:
+                del self._models[name]
+        self._release(evicted)
+        return evicted
+
+    def unload(self, model_name=None):
+        """Unloads one model, or every model if no name is given."""
+        with self._lock:
+            names = list(self._models) if model_name is None else [model_name]
+            evicted = [name for name in names if self._models.pop(name, None) is not None]
+        self._release(evicted)
+        return evicted
+
+    def loaded_models(self):
+        """Returns (model_name, size_mb, idle_seconds) for each resident model."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (name, entry['size'] / (1024 * 1024), now - entry['last_used'])
+                for name, entry in self._models.items()
+            ]
+
+    def _release(self, evicted):
+        """Frees memory held by evicted models."""
+        if not evicted:
+            return
+        for name in evicted:
+            print(f"Unloaded SBERT model: {name}")
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+
+def embedding_scores(target_embedding, embeddings):
+    """
+    Scores one target embedding against every row of `embeddings` with
+    matrix operations.
+
+    Returns:
+        (cosine, euclidean_distance, euclidean_similarity, combined_similarity) arrays
+    """
+    target = np.asarray(target_embedding, dtype=np.float64)
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    if embeddings.shape[0] == 0:
+        empty = np.zeros(0)
+        return empty, empty, empty, empty
+
+    dots = embeddings @ target
+    denominator = np.linalg.norm(embeddings, axis=1) * np.linalg.norm(target)
+    cosine = np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+
+    euclidean_distance = np.linalg.norm(embeddings - target, axis=1)
+    euclidean_sim = 1 / (1 + euclidean_distance)
+    combined_sim = (cosine + euclidean_sim) / 2
+
+    return cosine, euclidean_distance, euclidean_sim, combined_sim
+
+
+def text_hash(text):
+    """Returns the sha256 hex digest used as an embedding cache key."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _model_slug(model_name):
+    """Turns a model name (possibly 'org/name') into a directory name."""
+    return re.sub(r'[^A-Za-z0-9._-]', '_', model_name)
+
+
+def _lock_file(f):
+    """Blocks until this process holds the lock on an open lock file."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            # LK_LOCK retries for about 10 seconds before giving up
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class _ModelStore:
+    """
+    Embeddings of one model: a memory-mapped matrix plus a JSON key index.
+    Files:
+        vectors.<generation>.npy - (capacity x dim) matrix, rows 0..count-1 in use
+        index.json - model name, dtype, count, generation and sha256 -> [row, last_used]
+        lock       - held while the store is read or written (see `locked`); it
+                     holds the number of index.json writes, so other processes
+                     can tell when to reload
+
+    Growing or compacting the matrix writes the next generation's file;
+    index.json is switched to it atomically and only then is the old file
+    removed, so the index never maps keys to rows of another matrix.
+    """
+
+    INDEX_FILENAME = 'index.json'
+    LOCK_FILENAME = 'lock'
+    # Matrix of caches written before generations were introduced
+    LEGACY_VECTORS_FILENAME = 'vectors.npy'
+
+    def __init__(self, path, model_name, dtype):
+        self.path = path
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+        self._lock_file = None
+        # Count of index.json writes the in-memory state matches (None: not loaded)
+        self._writes = None
+        self._clear()
+
+    def _clear(self):
+        self.keys = {}
+        self.count = 0
+        self.generation = 0
+        self.vectors_filename = None
+        self.vectors = None
+        self.dirty = False
+        self._rewritten = False
+
+    @property
+    def dim(self):
+        return 0 if self.vectors is None else self.vectors.shape[1]
+
+    @property
+    def size_bytes(self):
+        return self.count * self.dim * self.dtype.itemsize
+
+    @contextmanager
+    def locked(self):
+        """
+        Holds the store's lock file, shared by every process using the cache,
+        and reloads the store first if another process changed it.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        fd = os.open(os.path.join(self.path, self.LOCK_FILENAME), os.O_RDWR | os.O_CREAT)
+        with os.fdopen(fd, 'r+b') as lock_file:
+            _lock_file(lock_file)
+            try:
+                self._lock_file = lock_file
+                self._reload_if_changed()
+                yield self
+            finally:
+                self._lock_file = None
+                _unlock_file(lock_file)
+
+    def _reload_if_changed(self):
+        self._lock_file.seek(0)
+        writes = int(self._lock_file.read().strip() or 0)
+        if writes == self._writes:
+            return
+        self._writes = writes
+        index_file = os.path.join(self.path, self.INDEX_FILENAME)
+        if not os.path.exists(index_file):
+            self._clear()
+            return
+        with open(index_file, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.dtype = np.dtype(meta['dtype'])
+        self.keys = meta['keys']
+        self.count = meta['count']
+        self.generation = meta.get('generation', 0)
+        self.vectors_filename = meta.get('vectors', self.LEGACY_VECTORS_FILENAME)
+        self.vectors = np.load(os.path.join(self.path, self.vectors_filename), mmap_mode='r+')
+        self.dirty = False
+        self._rewritten = False
+
+    def lookup(self, hashes):
+        """Returns the row of each hash (-1 when missing) and refreshes last-used times."""
+        now = int(time.time())
+        rows = np.full(len(hashes), -1, dtype=np.int64)
+        for i, key in enumerate(hashes):
+            entry = self.keys.get(key)
+            if entry is not None:
+                rows[i] = entry[0]
+                # Coarse timestamps avoid rewriting the index on every hit
+                if now - entry[1] > 3600:
+                    entry[1] = now
+                    self.dirty = True
+        return rows
+
+    def read(self, rows):
+        return np.asarray(self.vectors[rows], dtype=np.float32)
+
+    def add(self, hashes, vectors):
+        """Appends vectors, growing the memory-mapped file as needed."""
+        if len(hashes) == 0:
+            return
+        vectors = np.asarray(vectors)
+        self._reserve(self.count + len(hashes), vectors.shape[1])
+        now = int(time.time())
+        for key, vector in zip(hashes, vectors):
+            if key in self.keys:
+                continue
+            self.vectors[self.count] = vector
+            self.keys[key] = [self.count, now]
+            self.count += 1
+        self.dirty = True
+
+    def _reserve(self, capacity, dim):
+        if self.vectors is not None and self.vectors.shape[0] >= capacity:
+            return
+        new_capacity = max(capacity, 2 * (0 if self.vectors is None else self.vectors.shape[0]), 1024)
+        self._rewrite(np.arange(self.count), new_capacity, dim)
+
+    def _rewrite(self, rows, capacity, dim=None):
+        """
+        Copies `rows` into the next generation's file. The index keeps
+        pointing at the current file until `flush`.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        dim = dim or self.dim
+        self.generation += 1
+        filename = f"vectors.{self.generation}.npy"
+        new_vectors = np.lib.format.open_memmap(os.path.join(self.path, filename), mode='w+',
+                                                dtype=self.dtype, shape=(capacity, dim))
+        if len(rows):
+            new_vectors[:len(rows)] = self.vectors[rows]
+        new_vectors.flush()
+        self.vectors = new_vectors
+        self.vectors_filename = filename
+        self.count = len(rows)
+        self.dirty = True
+        self._rewritten = True
+
+    def evict(self, max_bytes=None, max_age_seconds=None):
+        """Drops least recently used entries over the limits and compacts the file."""
+        entries = sorted(self.keys.items(), key=lambda item: item[1][1], reverse=True)
+        if max_age_seconds is not None:
+            cutoff = time.time() - max_age_seconds
+            entries = [item for item in entries if item[1][1] >= cutoff]
+        if max_bytes is not None and self.dim:
+            entries = entries[:int(max_bytes // (self.dim * self.dtype.itemsize))]
+        removed = len(self.keys) - len(entries)
+        if removed == 0:
+            return 0
+
+        rows = np.array([entry[0] for _, entry in entries], dtype=np.int64)
+        self._rewrite(rows, max(len(rows), 1024))
+        self.keys = {key: [row, entry[1]] for row, (key, entry) in enumerate(entries)}
+        return removed
+
+    def flush(self):
+        """Writes the index; must be called inside `locked`."""
+        if not self.dirty:
+            return
+        if self.vectors is not None:
+            self.vectors.flush()
+        os.makedirs(self.path, exist_ok=True)
+        meta = {
+            'model_name': self.model_name,
+            'dtype': self.dtype.name,
+            'count': self.count,
+            'generation': self.generation,
+            'vectors': self.vectors_filename,
+            'keys': self.keys
+        }
+        index_file = os.path.join(self.path, self.INDEX_FILENAME)
+        tmp_file = index_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, index_file)
+        self.dirty = False
+        self._writes += 1
+        self._lock_file.seek(0)
+        self._lock_file.truncate()
+        self._lock_file.write(str(self._writes).encode('ascii'))
+        self._lock_file.flush()
+
+        if self._rewritten:
+            # Older generations (and files left by an interrupted rewrite) are unused now
+            for name in os.listdir(self.path):
+                if name.startswith('vectors.') and name.endswith('.npy') and name != self.vectors_filename:
+                    try:
+                        os.remove(os.path.join(self.path, name))
+                    except OSError:
+                        pass  # Still mapped by another process on Windows; removed next time
+            self._rewritten = False
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding store keyed by (model_name, sha256(text)).
+    Each model has its own memory-mapped matrix; once a model's vectors
+    exceed `max_mb`, least recently used entries are evicted. Processes
+    sharing the cache directory serialize lookups and writes on a lock file
+    per model, and reload a store that another process has changed.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_CACHE_MAX_MB, dtype='float32'):
+        self.cache_dir = cache_dir
+        self.max_bytes = None if max_mb is None else int(max_mb * 1024 * 1024)
+        self.dtype = dtype
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def _store(self, model_name):
+        store = self._stores.get(model_name)
+        if store is None:
+            store = _ModelStore(os.path.join(self.cache_dir, _model_slug(model_name)), model_name, self.dtype)
+            self._stores[model_name] = store
+        return store
+
+    def get_or_encode(self, model_name, texts, encode):
+        """
+        Returns embeddings for `texts`, calling `encode(missing_texts)` only
+        for texts that are not cached yet and storing the results.
+        """
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            store = self._store(model_name)
+            with store.locked():
+                rows = store.lookup(hashes)
+                hits = rows >= 0
+                hit_vectors = store.read(rows[hits]) if hits.any() else None
+
+        # Encode each distinct missing text once
+        missing = {}
+        for i in np.flatnonzero(~hits):
+            missing.setdefault(hashes[i], len(missing))
+        missing_texts = [None] * len(missing)
+        for i in np.flatnonzero(~hits):
+            missing_texts[missing[hashes[i]]] = texts[i]
+        encoded = np.asarray(encode(missing_texts), dtype=np.float32) if missing else None
+
+        dim = hit_vectors.shape[1] if hit_vectors is not None else (encoded.shape[1] if encoded is not None else 0)
+        embeddings = np.zeros((len(texts), dim), dtype=np.float32)
+        if hit_vectors is not None:
+            embeddings[hits] = hit_vectors
+        for i in np.flatnonzero(~hits):
+            embeddings[i] = encoded[missing[hashes[i]]]
+
+        # The encoding ran without the lock; texts another process stored
+        # meanwhile are skipped by `add`
+        with self._lock, store.locked():
+            if missing:
+                store.add(list(missing), encoded)
+                if self.max_bytes is not None and store.size_bytes > self.max_bytes:
+                    # Leave headroom so the next few writes do not evict again
+                    store.evict(max_bytes=0.9 * self.max_bytes)
+            store.flush()
+        return embeddings
+
+    def model_names(self):
+        """Returns the names of all models with cached embeddings."""
+        names = []
+        if os.path.isdir(self.cache_dir):
+            for entry in sorted(os.listdir(self.cache_dir)):
+                index_file = os.path.join(self.cache_dir, entry, _ModelStore.INDEX_FILENAME)
+                if os.path.exists(index_file):
+                    with open(index_file, 'r', encoding='utf-8') as f:
+                        names.append(json.load(f)['model_name'])
+        return names
+
+    def stats(self):
+        """Returns one dictionary per model: model, entries, dim, dtype, size_mb, file_mb."""
+        results = []
+        with self._lock:
+            for model_name in self.model_names():
+                store = self._store(model_name)
+                with store.locked():
+                    vectors_file = os.path.join(store.path, store.vectors_filename or '')
+                    results.append({
+                        'model': model_name,
+                        'entries': store.count,
+                        'dim': store.dim,
+                        'dtype': store.dtype.name,
+                        'size_mb': store.size_bytes / (1024 * 1024),
+                        'file_mb': os.path.getsize(vectors_file) / (1024 * 1024) if os.path.isfile(vectors_file)
+                        else 0.0
+                    })
+        return results
+
+    def prune(self, max_mb=None, max_age_days=None, model_name=None):
+        """
+        Evicts least recently used entries so each model fits in `max_mb`
+        (default: the cache limit) and drops entries unused for `max_age_days`.
+        Returns the number of removed entries per model.
+        """
+        max_bytes = self.max_bytes if max_mb is None else int(max_mb * 1024 * 1024)
+        max_age_seconds = None if max_age_days is None else max_age_days * 86400
+        removed = {}
+        with self._lock:
+            names = [model_name] if model_name else self.model_names()
+            for name in names:
+                store = self._store(name)
+                with store.locked():
+                    removed[name] = store.evict(max_bytes=max_bytes, max_age_seconds=max_age_seconds)
+                    store.flush()
+        return removed
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_cache = None
+
+
+def get_engine():
+    """Returns the embedding engine shared by the whole process."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = EmbeddingEngine()
+        return _engine
+
+
+def get_embedding_cache():
+    """Returns the on-disk embedding cache shared by the whole process."""
+    global _cache
+    with _engine_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
@@ -0,0 +1,211 @@
+"""
+Cards of the GUI's related-sections feed.
+
+The feed shows one card per similar section of every result, best match
+first. `build_feed_cards` only flattens and sorts the results; nothing is
+read or rendered there. The GUI's list view asks for cards a page at a
+time as the user scrolls, and a card's markdown is rendered (and a
+whole-file card's text read from disk) the first time the card is shown.
+
+`MarkdownRenderer` keeps rendered HTML in an LRU cache keyed by a hash of
+the markdown and the render options, so re-ranking, which mostly shows
+the same sections again, re-renders only sections it has not shown yet.
+
+Usage:
+    renderer = MarkdownRenderer()
+    cards = build_feed_cards(results)
+    html = card_html(cards[0], renderer.render)
+"""
+import os
+import re
+import hashlib
+import threading
+import importlib.util
+from collections import OrderedDict
+from html import escape
+
+from main import read_markdown_file
+
+# markdown library (optional); imported on first render
+MARKDOWN_AVAILABLE = importlib.util.find_spec('markdown') is not None
+MARKDOWN_EXTENSIONS = ('fenced_code', 'tables', 'nl2br')
+# Size of the rendered HTML kept by MarkdownRenderer
+DEFAULT_RENDER_CACHE_BYTES = 32 * 1024 * 1024
+
+# Cards handed to the view per page
+PAGE_SIZE = 50
+# Accent colors of the similarity classes
+CLASS_COLORS = {'high': '#30d158', 'medium': '#ff9f0a', 'low': '#ff453a'}
+
+# Rich-text style sheet of a card (the subset of CSS QTextDocument supports)
+CARD_CSS = """
+body { font-family: -apple-system, 'Segoe UI', 'Helvetica Neue', Arial, sans-serif; font-size: 14px; color: #1d1d1f; }
+.file-name { font-size: 16px; font-weight: 600; }
+.badge { font-size: 12px; font-weight: 600; }
+.section-header { font-size: 15px; font-weight: 600; margin-top: 8px; }
+h1 { font-size: 22px; } h2 { font-size: 19px; } h3 { font-size: 17px; } h4 { font-size: 15px; }
+code { font-family: 'SF Mono', Menlo, 'Courier New', monospace; background-color: #eceef1; }
+pre { font-family: 'SF Mono', Menlo, 'Courier New', monospace; background-color: #1d1d1f; color: #f5f5f7; }
+blockquote { color: #6e6e73; font-style: italic; }
+a { color: #0066cc; }
+.keywords { font-size: 12px; color: #0051d5; margin-top: 8px; }
+"""
+
+
+def similarity_class(percent):
+    """Returns 'high', 'medium' or 'low' for a similarity in percent."""
+    if percent >= 70:
+        return 'high'
+    if percent >= 50:
+        return 'medium'
+    return 'low'
+
+
+def build_feed_cards(results):
+    """
+    Flattens similarity results into feed cards sorted by section similarity.
+    A result without section scores becomes one card for the whole file,
+    whose text is read by `card_content` when the card is first shown.
+
+    Returns:
+        List of card dictionaries (file_path, file_name, file_similarity,
+        sim_class, section_similarity, heading, content, keywords)
+    """
+    cards = []
+    for result in results:
+        file_path = result['file']
+        file_name = os.path.basename(file_path)
+        file_similarity = result['combined_similarity'] * 100
+        card = {
+            'file_path': file_path,
+            'file_name': file_name,
+            'file_similarity': file_similarity,
+            'sim_class': similarity_class(file_similarity),
+            'keywords': list(result.get('top_keywords', {}).keys())[:8]
+        }
+
+        heading_sims = result.get('heading_similarities', [])
+        if heading_sims:
+            for heading_match in sorted(heading_sims, key=lambda x: x['combined_similarity'], reverse=True):
+                cards.append(dict(card, section_similarity=heading_match['combined_similarity'] * 100,
+                                  heading=heading_match['heading'], content=heading_match.get('content', '')))
+        else:
+            # No section data, show full file
+            cards.append(dict(card, section_similarity=file_similarity, heading=file_name, content=None))
+
+    cards.sort(key=lambda card: card['section_similarity'], reverse=True)
+    return cards
+
+
+def card_content(card):
+    """Returns the markdown text of a card, reading whole-file cards on first use."""
+    if card['content'] is None:
+        card['content'] = read_markdown_file(card['file_path']) or "Could not read file content."
+    return card['content']
+
+
+def card_html(card, render_markdown):
+    """Returns the rich-text body of a card; `render_markdown` converts markdown to HTML."""
+    color = CLASS_COLORS[card['sim_class']]
+    keywords = ' &middot; '.join(escape(keyword) for keyword in card['keywords'])
+    return (
+        f"<div class='file-name'>{escape(card['file_name'])}</div>"
+        f"<div class='badge' style='color: {color};'>{card['section_similarity']:.1f}% match</div>"
+        f"<div class='section-header'>{escape(card['heading'])}</div>"
+        f"<div class='section-content'>{render_markdown(card_content(card))}</div>"
+        + (f"<div class='keywords'><b>Keywords:</b> {keywords}</div>" if keywords else "")
+    )
+
+
+def basic_markdown_to_html(md_text):
+    """Minimal markdown rendering used when the markdown library is not installed."""
+    html = md_text
+    # Headers
+    html = re.sub(r'^### (.*?)$', r'<h3>\1</h3>', html, flags=re.MULTILINE)
+    html = re.sub(r'^## (.*?)$', r'<h2>\1</h2>', html, flags=re.MULTILINE)
+    html = re.sub(r'^# (.*?)$', r'<h1>\1</h1>', html, flags=re.MULTILINE)
+    # Bold
+    html = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', html)
+    # Italic
+    html = re.sub(r'\*(.*?)\*', r'<i>\1</i>', html)
+    # Code blocks
+    html = re.sub(r'```(.*?)```', r'<pre>\1</pre>', html, flags=re.DOTALL)
+    # Inline code
+    html = re.sub(r'`(.*?)`', r'<code>\1</code>', html)
+    # Line breaks
+    html = html.replace('\n', '<br>')
+    return html
+
+
+class MarkdownRenderer:
+    """
+    Converts markdown to HTML, caching the results.
+
+    One `markdown.Markdown` instance is built on first use and reset between
+    documents. Rendered HTML is kept in an LRU cache keyed by a hash of the
+    text and the render options; least recently used entries are dropped
+    once the cached HTML exceeds `max_bytes`.
+
+    Args:
+        extensions: Extensions of the markdown library
+        max_bytes: Cap on the UTF-8 size of the cached HTML
+        use_markdown: Use the markdown library (default: when installed)
+    """
+
+    def __init__(self, extensions=MARKDOWN_EXTENSIONS, max_bytes=DEFAULT_RENDER_CACHE_BYTES, use_markdown=None):
+        self.extensions = tuple(extensions)
+        self.max_bytes = max_bytes
+        self.use_markdown = MARKDOWN_AVAILABLE if use_markdown is None else use_markdown
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._markdown = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        options = ('markdown',) + self.extensions if self.use_markdown else ('basic',)
+        self._options_key = repr(options).encode('utf-8') + b'\0'
+
+    def __len__(self):
+        return len(self._cache)
+
+    def _key(self, md_text):
+        digest = hashlib.blake2b(self._options_key, digest_size=16)
+        digest.update(md_text.encode('utf-8', 'surrogatepass'))
+        return digest.digest()
+
+    def _convert(self, md_text):
+        if self.use_markdown:
+            try:
+                if self._markdown is None:
+                    import markdown
+                    self._markdown = markdown.Markdown(extensions=list(self.extensions))
+                return self._markdown.reset().convert(md_text)
+            except Exception:
+                pass
+        return basic_markdown_to_html(md_text)
+
+    def render(self, md_text):
+        """Returns the HTML of `md_text`, rendering it only if it is not cached."""
+        key = self._key(md_text)
+        with self._lock:
+            html = self._cache.get(key)
+            if html is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return html
+
+            self.misses += 1
+            html = self._convert(md_text)
+            size = len(html.encode('utf-8', 'surrogatepass'))
+            if size <= self.max_bytes:
+                self._cache[key] = html
+                self.cached_bytes += size
+                while self.cached_bytes > self.max_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self.cached_bytes -= len(evicted.encode('utf-8', 'surrogatepass'))
+            return html
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.cached_bytes = 0
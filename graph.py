@@ -0,0 +1,225 @@
+"""
+All-pairs "related notes" graph for a whole vault in one job.
+
+Every note's top-k neighbours are computed from one vectorization of the
+corpus instead of running `calculate_similarity` once per note:
+
+- TF-IDF: `calculate_similarity(note, vault)` fits its IDF on the whole
+  vault, so a single TfidfVectorizer fit reproduces the scores of every
+  per-note run. Similarities are computed block by block as sparse
+  products X[block] @ X.T.
+- SBERT: every note is encoded once (through the embedding cache) and
+  scored block by block with dense products.
+
+Each block is a dense (block_rows x n_notes) score matrix; its height is
+chosen so the block fits in `block_mb`. Rows are written to the output as
+soon as their block is done, so memory does not grow with the output.
+
+Usage:
+    python main.py graph notes/ --top-k 10 --output related.jsonl
+"""
+import csv
+import sys
+import json
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from main import read_markdown_file, normalized_euclidean
+from embeddings import DEFAULT_MODEL, DEFAULT_BATCH_SIZE, get_engine, get_embedding_cache
+from ingest import ingest_files
+
+DEFAULT_TOP_K = 10
+DEFAULT_BLOCK_MB = 256
+# Dense 8-byte arrays alive per block row: cosine, euclidean similarity
+# (computed in place over the distance), combined, and the int64 index
+# array of argpartition
+_ARRAYS_PER_BLOCK = 4
+
+
+def block_rows(n_notes, block_mb=DEFAULT_BLOCK_MB):
+    """Number of notes scored per block so a block stays within block_mb."""
+    bytes_per_row = max(1, n_notes) * 8 * _ARRAYS_PER_BLOCK
+    return max(1, int(block_mb * 1024 * 1024 // bytes_per_row))
+
+
+def _row_top_k(scores, k):
+    """
+    Column indices of the k highest scores of every row, highest first.
+    Ties within the selection are ordered by column, like a stable sort.
+    """
+    n_columns = scores.shape[1]
+    k = min(k, n_columns)
+    if k < n_columns:
+        # Partitioning the scores themselves avoids a negated copy of the block
+        selected = np.argpartition(scores, n_columns - k, axis=1)[:, n_columns - k:]
+    else:
+        selected = np.tile(np.arange(n_columns), (scores.shape[0], 1))
+    selected_scores = np.take_along_axis(scores, selected, axis=1)
+    order = np.lexsort((selected, -selected_scores), axis=1)
+    return np.take_along_axis(selected, order, axis=1)
+
+
+class _Progress:
+    """Prints done/total, rate and ETA to stderr at most once per second."""
+
+    def __init__(self, total, label):
+        self.total = total
+        self.label = label
+        self.start = time.perf_counter()
+        self.last = 0.0
+
+    def update(self, done):
+        now = time.perf_counter()
+        if now - self.last < 1.0 and done < self.total:
+            return
+        self.last = now
+        elapsed = now - self.start
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total - done) / rate if rate > 0 else 0.0
+        sys.stderr.write(f"\r{self.label}: {done}/{self.total} notes "
+                         f"({100 * done / max(1, self.total):.1f}%), "
+                         f"{rate:.0f} notes/s, ETA {time.strftime('%H:%M:%S', time.gmtime(eta))}")
+        if done >= self.total:
+            sys.stderr.write("\n")
+        sys.stderr.flush()
+
+
+def tfidf_neighbors(keywords, top_k=DEFAULT_TOP_K, block_mb=DEFAULT_BLOCK_MB, progress=True):
+    """
+    Yields (row, neighbor_rows, cosine, euclidean_similarity, combined) for
+    every note, scored on one TF-IDF fit of all keyword strings.
+    """
+    matrix = TfidfVectorizer().fit_transform(keywords).tocsr()
+    transposed = matrix.T.tocsc()
+    nonzero = matrix.getnnz(axis=1) > 0
+    n_notes = matrix.shape[0]
+    rows_per_block = block_rows(n_notes, block_mb)
+    tracker = _Progress(n_notes, "Scoring") if progress else None
+
+    for start in range(0, n_notes, rows_per_block):
+        stop = min(n_notes, start + rows_per_block)
+        # TF-IDF rows are L2-normalized, so the product is the cosine
+        cosine = (matrix[start:stop] @ transposed).toarray()
+        distance = normalized_euclidean(cosine, nonzero[np.newaxis, :], nonzero[start:stop, np.newaxis])
+        yield from _block_neighbors(start, cosine, distance, top_k)
+        if tracker:
+            tracker.update(stop)
+
+
+def embedding_neighbors(embeddings, top_k=DEFAULT_TOP_K, block_mb=DEFAULT_BLOCK_MB, progress=True):
+    """
+    Yields (row, neighbor_rows, cosine, euclidean_similarity, combined) for
+    every embedding, with the metrics of `embeddings.embedding_scores`.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float64)
+    norms = np.linalg.norm(embeddings, axis=1)
+    squared_norms = norms ** 2
+    n_notes = embeddings.shape[0]
+    rows_per_block = block_rows(n_notes, block_mb)
+    tracker = _Progress(n_notes, "Scoring") if progress else None
+
+    for start in range(0, n_notes, rows_per_block):
+        stop = min(n_notes, start + rows_per_block)
+        dots = embeddings[start:stop] @ embeddings.T
+        # Built step by step in place so no more than two blocks are alive at once
+        distance = np.multiply(dots, -2)
+        distance += squared_norms[start:stop, np.newaxis]
+        distance += squared_norms
+        np.sqrt(np.maximum(distance, 0, out=distance), out=distance)
+        denominator = norms[start:stop, np.newaxis] * norms[np.newaxis, :]
+        cosine = np.divide(dots, denominator, out=dots, where=denominator > 0)
+        cosine[denominator <= 0] = 0
+        del dots, denominator
+        yield from _block_neighbors(start, cosine, distance, top_k)
+        if tracker:
+            tracker.update(stop)
+
+
+def _block_neighbors(start, cosine, distance, top_k):
+    # The distance block is not used again, so it becomes the similarity
+    euclidean_sim = np.reciprocal(np.add(distance, 1, out=distance), out=distance)
+    combined = np.add(cosine, euclidean_sim)
+    combined /= 2
+    # A note is not its own neighbour
+    rows = np.arange(cosine.shape[0])
+    combined[rows, start + rows] = -np.inf
+    neighbors = _row_top_k(combined, top_k) if cosine.shape[1] > 1 else np.zeros((len(rows), 0), dtype=np.int64)
+    for i, columns in enumerate(neighbors):
+        columns = columns[np.isfinite(combined[i, columns])]
+        yield start + i, columns, cosine[i, columns], euclidean_sim[i, columns], combined[i, columns]
+
+
+def build_graph(files, output_path, top_k=DEFAULT_TOP_K, use_sbert=False, model_name=DEFAULT_MODEL,
+                output_format=None, block_mb=DEFAULT_BLOCK_MB, workers=None, progress=True):
+    """
+    Computes the top_k related notes of every note in `files` and writes an
+    adjacency file.
+
+    Args:
+        files: Paths of markdown notes
+        output_path: Output file; '.csv' writes CSV, anything else JSONL
+        top_k: Neighbours per note
+        use_sbert: Score with SBERT embeddings instead of TF-IDF
+        model_name: Sentence-transformers model used when use_sbert=True
+        output_format: 'jsonl' or 'csv' (default: from the output extension)
+        block_mb: Memory for one block of the score matrix
+        workers: Processes used to analyze notes (see `ingest`)
+        progress: Print progress and ETA to stderr
+
+    Returns:
+        Number of notes in the graph
+    """
+    output_format = output_format or ('csv' if output_path.lower().endswith('.csv') else 'jsonl')
+    start_time = time.perf_counter()
+
+    if use_sbert:
+        print(f"Reading {len(files)} notes...")
+        texts = [read_markdown_file(path) for path in files]
+        files = [path for path, text in zip(files, texts) if text]
+        texts = [text for text in texts if text]
+        if not files:
+            print("No valid notes found.")
+            return 0
+        print(f"Encoding {len(texts)} notes...")
+        embeddings = get_engine().encode(texts, model_name, DEFAULT_BATCH_SIZE, cache=get_embedding_cache())
+        del texts
+        neighbors = embedding_neighbors(embeddings, top_k, block_mb, progress)
+    else:
+        print(f"Reading and analyzing {len(files)} notes...")
+        notes = ingest_files(files, workers)
+        files = [path for path, note in zip(files, notes) if note]
+        if not files:
+            print("No valid notes found.")
+            return 0
+        keywords = [note[0] for note in notes if note]
+        del notes
+        neighbors = tfidf_neighbors(keywords, top_k, block_mb, progress)
+
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        if output_format == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(['source', 'target', 'rank', 'cosine_similarity',
+                             'euclidean_similarity', 'combined_similarity'])
+            for row, columns, cosine, euclidean_sim, combined in neighbors:
+                for rank, j in enumerate(columns):
+                    writer.writerow([files[row], files[j], rank + 1, f"{cosine[rank]:.6f}",
+                                     f"{euclidean_sim[rank]:.6f}", f"{combined[rank]:.6f}"])
+        elif output_format == 'jsonl':
+            for row, columns, cosine, euclidean_sim, combined in neighbors:
+                f.write(json.dumps({
+                    'source': files[row],
+                    'neighbors': [{
+                        'target': files[j],
+                        'cosine_similarity': round(float(cosine[rank]), 6),
+                        'euclidean_similarity': round(float(euclidean_sim[rank]), 6),
+                        'combined_similarity': round(float(combined[rank]), 6)
+                    } for rank, j in enumerate(columns)]
+                }, ensure_ascii=False) + '\n')
+        else:
+            raise ValueError(f"Unknown output format '{output_format}' (expected 'jsonl' or 'csv')")
+
+    print(f"Wrote top-{top_k} neighbours of {len(files)} notes to {output_path} "
+          f"in {time.perf_counter() - start_time:.2f}s")
+    return len(files)
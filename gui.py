@@ -1,6 +1,6 @@
 import sys
 import os
-import re
+import time
 from pathlib import Path
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -8,50 +8,243 @@ from PyQt6.QtWidgets import (
     QSplitter, QGroupBox, QProgressBar, QTabWidget, QListWidgetItem,
     QScrollArea
 )
-from PyQt6.QtWidgets import QCheckBox
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
-from PyQt6.QtGui import QFont, QTextCursor
-
-# Try to import markdown library
-try:
-    import markdown
-    MARKDOWN_AVAILABLE = True
-except ImportError:
-    MARKDOWN_AVAILABLE = False
+from PyQt6.QtWidgets import QCheckBox, QSpinBox, QListView, QStyledItemDelegate
+from PyQt6.QtCore import Qt, QThread, QTimer, QSize, QRectF, QAbstractListModel, QModelIndex, pyqtSignal
+from PyQt6.QtGui import QFont, QTextCursor, QTextDocument, QColor, QPainter, QPainterPath
 
 from main import calculate_similarity, read_markdown_file
+from document import NoteDocument
+from embeddings import DEFAULT_MODEL
+from progressive import progressive_similarity, Cancelled
+from live_query import LiveRanker, DEFAULT_DEBOUNCE_MS
+from profiling import Profile, profiling, format_profile
+from feed import build_feed_cards, card_html, MarkdownRenderer, PAGE_SIZE, CLASS_COLORS, CARD_CSS
 
 
 class SimilarityWorker(QThread):
-    """Worker thread for calculating similarity without blocking GUI"""
+    """
+    Worker thread for calculating similarity without blocking GUI.
+    TF-IDF runs analyze the comparison files in chunks and emit `partial`
+    file-level results (shown as whole-file cards, without section matches)
+    and files done/total after each chunk. `cancel()` stops the run
+    before its next chunk; a cancelled run emits nothing further.
+    After `finished`, `profiled` carries the run's per-stage timings
+    (`Profile.as_dict()`, see `profiling`).
+    """
     finished = pyqtSignal(list)
+    partial = pyqtSignal(list)
     progress = pyqtSignal(str)
+    files_progress = pyqtSignal(int, int)
     error = pyqtSignal(str)
+    profiled = pyqtSignal(dict)
     
-    def __init__(self, target_file, compare_files, use_sbert=False):
+    def __init__(self, target_file, compare_files, use_sbert=False, model_name=DEFAULT_MODEL, top_k=None):
         super().__init__()
         self.target_file = target_file
         self.compare_files = compare_files
         self.use_sbert = use_sbert
+        self.model_name = model_name
+        self.top_k = top_k
+        self.index = None  # In-memory corpus index of a finished TF-IDF run
+        self.profile = Profile()
+        self._cancelled = False
+    
+    def cancel(self):
+        """Asks the run to stop at the next chunk boundary."""
+        self._cancelled = True
+    
+    def is_cancelled(self):
+        return self._cancelled
     
     def run(self):
         try:
-            self.progress.emit("Starting similarity calculation...")
-            results = calculate_similarity(self.target_file, self.compare_files, use_sbert=self.use_sbert)
+            with profiling(self.profile):
+                completed = self._calculate()
+            if completed:
+                self.profiled.emit(self.profile.as_dict())
+        except Cancelled:
+            pass
+        except Exception as e:
+            if not self._cancelled:
+                self.error.emit(str(e))
+    
+    def _calculate(self):
+        """Runs the calculation; returns False if it was cancelled."""
+        self.progress.emit("Starting similarity calculation...")
+        if self.use_sbert:
+            # SBERT models are loaded once and shared across runs by the embedding engine
+            results = calculate_similarity(self.target_file, self.compare_files,
+                                           use_sbert=True, model_name=self.model_name, top_k=self.top_k)
+            if self._cancelled:
+                return False
             self.finished.emit(results)
+            return True
+        
+        for update in progressive_similarity(self.target_file, self.compare_files, top_k=self.top_k,
+                                             cancelled=self.is_cancelled):
+            if self._cancelled:
+                return False
+            self.files_progress.emit(update['done'], update['total'])
+            if update['final']:
+                self.index = update['index']
+                self.finished.emit(update['results'])
+            else:
+                self.partial.emit(update['results'])
+        return True
+
+
+class LiveQueryWorker(QThread):
+    """
+    Re-scores unsaved editor text against the cached corpus of the last run.
+    `finished` carries the results and what the ranker recomputed (or None).
+    """
+    finished = pyqtSignal(list, object)
+    error = pyqtSignal(str)
+    
+    def __init__(self, ranker, text, headings=None):
+        super().__init__()
+        self.ranker = ranker
+        self.text = text
+        self.headings = headings
+    
+    def run(self):
+        try:
+            self.finished.emit(*self.ranker.rank_with_update(self.text, self.headings))
         except Exception as e:
             self.error.emit(str(e))
 
 
+class FeedModel(QAbstractListModel):
+    """Feed cards, handed to the view one page at a time as it scrolls."""
+    CardRole = Qt.ItemDataRole.UserRole
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.cards = []
+        self.loaded = 0
+    
+    def set_cards(self, cards):
+        self.beginResetModel()
+        self.cards = cards
+        self.loaded = min(PAGE_SIZE, len(cards))
+        self.endResetModel()
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.loaded
+    
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.loaded < len(self.cards)
+    
+    def fetchMore(self, parent):
+        count = min(PAGE_SIZE, len(self.cards) - self.loaded)
+        if parent.isValid() or count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+    
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= self.loaded:
+            return None
+        card = self.cards[index.row()]
+        if role == self.CardRole:
+            return card
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{card['file_name']}: {card['heading']}"
+        return None
+
+
+class FeedDelegate(QStyledItemDelegate):
+    """
+    Paints feed cards. A card's markdown is rendered when the view first
+    needs its size or paints it; rendered documents of the most recently
+    shown cards are kept, card heights are kept for every laid-out card.
+    """
+    MARGIN = 8
+    PADDING = 16
+    MAX_DOCUMENTS = 100
+    
+    def __init__(self, view, render_markdown):
+        super().__init__(view)
+        self.view = view
+        self.render_markdown = render_markdown
+        self.width = None
+        # Rendered documents and heights by row, for the current text width
+        self.documents = {}
+        self.heights = {}
+    
+    def clear(self):
+        self.documents.clear()
+        self.heights.clear()
+    
+    def _text_width(self):
+        width = max(100, self.view.viewport().width() - 2 * (self.MARGIN + self.PADDING))
+        if width != self.width:
+            # Rendered layouts depend on the width
+            self.clear()
+            self.width = width
+        return width
+    
+    def _document(self, row, card, width):
+        document = self.documents.pop(row, None)
+        if document is None:
+            document = QTextDocument()
+            document.setDefaultStyleSheet(CARD_CSS)
+            document.setHtml(card_html(card, self.render_markdown))
+            document.setTextWidth(width)
+            if len(self.documents) >= self.MAX_DOCUMENTS:
+                # Dicts keep insertion order; the first key is the least recently used
+                del self.documents[next(iter(self.documents))]
+        self.documents[row] = document
+        return document
+    
+    def sizeHint(self, option, index):
+        width = self._text_width()
+        row = index.row()
+        if row not in self.heights:
+            card = index.data(FeedModel.CardRole)
+            self.heights[row] = int(self._document(row, card, width).size().height())
+        return QSize(width, self.heights[row] + 2 * (self.MARGIN + self.PADDING))
+    
+    def paint(self, painter, option, index):
+        card = index.data(FeedModel.CardRole)
+        if card is None:
+            return
+        width = self._text_width()
+        document = self._document(index.row(), card, width)
+        
+        painter.save()
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        rect = QRectF(option.rect).adjusted(self.MARGIN, self.MARGIN / 2, -self.MARGIN, -self.MARGIN / 2)
+        path = QPainterPath()
+        path.addRoundedRect(rect, 14, 14)
+        painter.fillPath(path, QColor('#ffffff'))
+        painter.fillRect(QRectF(rect.left(), rect.top() + 14, 4, rect.height() - 28), QColor(CLASS_COLORS[card['sim_class']]))
+        painter.translate(rect.left() + self.PADDING, rect.top() + self.PADDING)
+        document.drawContents(painter, QRectF(0, 0, width, rect.height() - 2 * self.PADDING))
+        painter.restore()
+
+
 class MarkdownSimilarityGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.target_file = None
         self.compare_files = []
         self.results = []
+        self.last_render_seconds = 0.0
+        self.last_profile = None  # Stage timings of the last finished run
         self.worker = None
+        # Cancelled workers still finishing their current chunk
+        self.cancelled_workers = []
+        # Rendered section HTML, reused across result updates
+        self.renderer = MarkdownRenderer()
+        # Live re-ranking against the corpus cached by the last TF-IDF run
+        self.live_ranker = None
+        self.live_worker = None
+        self.live_workers = []
         self.last_edit_section = None
         self.last_target_content = ""
+        self.target_document = None
         
         self.init_ui()
     
@@ -108,6 +301,24 @@ class MarkdownSimilarityGUI(QMainWindow):
         self.sbert_checkbox.setToolTip("If checked, similarity will be calculated using a Sentence-BERT model (requires sentence-transformers package).")
         file_layout.addWidget(self.sbert_checkbox)
         
+        # Option: number of files in the feed
+        top_k_layout = QHBoxLayout()
+        top_k_layout.addWidget(QLabel("Max files:"))
+        self.top_k_spinbox = QSpinBox()
+        self.top_k_spinbox.setRange(0, 10000)
+        self.top_k_spinbox.setValue(20)
+        self.top_k_spinbox.setSpecialValueText("All")
+        self.top_k_spinbox.setToolTip("Only the most similar files are ranked and shown (0 = all files).")
+        top_k_layout.addWidget(self.top_k_spinbox)
+        
+        # Option: live re-ranking of unsaved edits
+        self.live_checkbox = QCheckBox("Live re-rank while editing")
+        self.live_checkbox.setToolTip("Re-score the edited text against the last calculation's files "
+                                      "shortly after typing stops, without saving (TF-IDF only).")
+        top_k_layout.addWidget(self.live_checkbox)
+        top_k_layout.addStretch()
+        file_layout.addLayout(top_k_layout)
+        
         # Calculate button
         self.calculate_btn = QPushButton("Calculate Similarity")
         self.calculate_btn.setEnabled(False)
@@ -141,7 +352,13 @@ class MarkdownSimilarityGUI(QMainWindow):
         self.target_content = QTextEdit()
         self.target_content.setReadOnly(False)  # Allow editing
         self.target_content.setFont(QFont("Courier", 10))
-        self.target_content.textChanged.connect(self.on_target_content_changed)
+        self.target_content.document().contentsChange.connect(self.on_target_contents_change)
+        
+        # Debounce: re-rank once typing pauses
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(DEFAULT_DEBOUNCE_MS)
+        self.live_timer.timeout.connect(self.run_live_query)
         left_layout.addWidget(self.target_content)
         splitter.addWidget(left_panel)
         
@@ -155,16 +372,28 @@ class MarkdownSimilarityGUI(QMainWindow):
         feed_header.setStyleSheet("font-size: 16px; font-weight: bold; padding: 10px; background-color: #f0f0f0;")
         right_layout.addWidget(feed_header)
         
-        # Scrollable news feed area
-        self.news_feed = QTextEdit()
-        self.news_feed.setReadOnly(True)
+        # Scrollable news feed: only the cards in view are rendered, and more
+        # cards are loaded a page at a time when scrolling reaches the end
+        self.feed_empty_label = QLabel("No results yet. Select files and calculate similarity.")
+        self.feed_empty_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.feed_empty_label.setStyleSheet("padding: 20px; color: #999;")
+        right_layout.addWidget(self.feed_empty_label)
+        
+        self.feed_model = FeedModel(self)
+        self.news_feed = QListView()
+        self.news_feed.setModel(self.feed_model)
+        self.feed_delegate = FeedDelegate(self.news_feed, self.markdown_to_html)
+        self.news_feed.setItemDelegate(self.feed_delegate)
+        self.news_feed.setVerticalScrollMode(QListView.ScrollMode.ScrollPerPixel)
+        self.news_feed.setResizeMode(QListView.ResizeMode.Adjust)
+        self.news_feed.setSelectionMode(QListView.SelectionMode.NoSelection)
         self.news_feed.setStyleSheet("""
-            QTextEdit {
-                background-color: #fafafa;
+            QListView {
+                background-color: #f5f5f7;
                 border: none;
-                font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
             }
         """)
+        self.news_feed.setVisible(False)
         right_layout.addWidget(self.news_feed)
         
         splitter.addWidget(right_panel)
@@ -183,6 +412,7 @@ class MarkdownSimilarityGUI(QMainWindow):
         )
         if file_path:
             self.target_file = file_path
+            self.live_ranker = None
             self.target_label.setText(os.path.basename(file_path))
             self.target_label.setStyleSheet("color: black;")
             self.load_target_content()
@@ -195,6 +425,7 @@ class MarkdownSimilarityGUI(QMainWindow):
         )
         if file_paths:
             self.compare_files = file_paths
+            self.live_ranker = None
             self.compare_label.setText(f"{len(file_paths)} files selected")
             self.compare_label.setStyleSheet("color: black;")
             self.check_ready_to_calculate()
@@ -205,6 +436,7 @@ class MarkdownSimilarityGUI(QMainWindow):
         if dir_path:
             md_files = list(Path(dir_path).rglob('*.md'))
             self.compare_files = [str(f) for f in md_files]
+            self.live_ranker = None
             self.compare_label.setText(f"{len(self.compare_files)} files from directory")
             self.compare_label.setStyleSheet("color: black;")
             self.check_ready_to_calculate()
@@ -219,12 +451,14 @@ class MarkdownSimilarityGUI(QMainWindow):
     def load_target_content(self):
         if self.target_file:
             content = read_markdown_file(self.target_file)
-            self.target_content.setText(content)
+            # Set before setText so the resulting change signal is not an edit
             self.last_target_content = content
+            self.target_document = NoteDocument(content)
+            self.target_content.setText(content)
             self.last_edit_section = None
             self.edit_detection_label.setText("")
     
-    def on_target_content_changed(self):
+    def on_target_contents_change(self, position, chars_removed, chars_added):
         """Detect when target content is edited and identify the section"""
         if not self.target_file:
             return
@@ -235,12 +469,15 @@ class MarkdownSimilarityGUI(QMainWindow):
         if current_content == self.last_target_content:
             return
         
-        # Detect the edited section
-        cursor = self.target_content.textCursor()
-        cursor_position = cursor.position()
+        # Re-parse only the edited lines. Qt positions count UTF-16 units, which
+        # differ from string offsets once the text has characters beyond the BMP.
+        if self.target_document is None or len(current_content.encode('utf-16-le')) != 2 * len(current_content):
+            self.target_document = NoteDocument(current_content)
+        else:
+            self.target_document = self.target_document.edited(position, chars_removed, chars_added, current_content)
         
-        # Find the section (by header) where the cursor is
-        section = self.find_section_at_position(current_content, cursor_position)
+        # Find the section (by header) where the edit happened
+        section = self.target_document.section_at(position)
         
         if section:
             self.last_edit_section = section
@@ -253,24 +490,50 @@ class MarkdownSimilarityGUI(QMainWindow):
             self.statusBar().showMessage("Edit detected in target file")
         
         self.last_target_content = current_content
+        
+        if self.live_checkbox.isChecked():
+            # Restart the debounce interval on every keystroke
+            self.live_timer.start()
     
-    def find_section_at_position(self, content, position):
-        """Find the markdown section (heading) at the given cursor position"""
-        # Split content into lines and find which line the position is at
-        lines = content[:position].split('\n')
-        current_line = len(lines) - 1
-        
-        # Search backwards for the nearest heading
-        all_lines = content.split('\n')
-        for i in range(current_line, -1, -1):
-            line = all_lines[i].strip()
-            # Check if line is a markdown heading (starts with #)
-            if line.startswith('#'):
-                # Extract heading text
-                heading_text = line.lstrip('#').strip()
-                return heading_text
+    def run_live_query(self):
+        """Re-ranks the unsaved editor text against the cached corpus."""
+        if self.live_ranker is None:
+            self.statusBar().showMessage("Calculate similarity once (TF-IDF) to enable live re-ranking")
+            return
+        if self.worker is not None and self.worker.isRunning():
+            # A full calculation is running; it will produce fresh results
+            return
         
-        return None
+        self.live_workers = [worker for worker in self.live_workers if worker.isRunning()]
+        text = self.target_content.toPlainText()
+        # Headings are kept up to date incrementally by the edit detector
+        headings = None
+        if self.target_document is not None and self.target_document.text == text:
+            headings = self.target_document.headings
+        self.live_worker = LiveQueryWorker(self.live_ranker, text, headings)
+        self.live_worker.finished.connect(self.on_live_results)
+        self.live_worker.error.connect(self.on_live_error)
+        self.live_workers.append(self.live_worker)
+        self.live_worker.start()
+    
+    def on_live_results(self, results, update):
+        # Older live queries may finish after newer ones
+        if self.sender() is not self.live_worker:
+            return
+        self.results = results
+        self.build_news_feed(results)
+        status_msg = f"Live: {len(results)} similar files for the unsaved text"
+        if self.last_edit_section:
+            status_msg += f" (edited section: '{self.last_edit_section}')"
+        if update:
+            status_msg += (f" - re-analyzed {update['analyzed_sections']}/{update['sections']} sections "
+                           f"in {update['elapsed_ms']:.0f} ms")
+        self.statusBar().showMessage(status_msg)
+    
+    def on_live_error(self, error_msg):
+        if self.sender() is not self.live_worker:
+            return
+        self.statusBar().showMessage(f"Live re-rank error: {error_msg}")
     
     def refresh_calculation(self):
         """Refresh similarity calculation with edit detection"""
@@ -307,33 +570,85 @@ class MarkdownSimilarityGUI(QMainWindow):
         if not self.target_file or not self.compare_files:
             return
         
-        # Disable button and show progress
-        self.calculate_btn.setEnabled(False)
+        # A new run replaces any run in flight
+        self.cancel_calculation()
+        
+        # Show progress; the range is set once the worker reports file counts
         self.progress_bar.setVisible(True)
-        self.progress_bar.setRange(0, 0)  # Indeterminate progress
+        self.progress_bar.setRange(0, 0)
         self.statusBar().showMessage("Calculating similarity...")
         
         # Clear previous results
-        self.news_feed.clear()
+        self.feed_delegate.clear()
+        self.feed_model.set_cards([])
         
         # Start worker thread (pass SBERT option)
         use_sbert_opt = self.sbert_checkbox.isChecked() if hasattr(self, 'sbert_checkbox') else False
-        self.worker = SimilarityWorker(self.target_file, self.compare_files, use_sbert=use_sbert_opt)
+        top_k = self.top_k_spinbox.value() or None
+        self.worker = SimilarityWorker(self.target_file, self.compare_files, use_sbert=use_sbert_opt, top_k=top_k)
         self.worker.finished.connect(self.on_calculation_finished)
+        self.worker.partial.connect(self.on_partial_results)
         self.worker.progress.connect(self.on_progress_update)
+        self.worker.files_progress.connect(self.on_files_progress)
         self.worker.error.connect(self.on_calculation_error)
+        self.worker.profiled.connect(self.on_calculation_profiled)
         self.worker.start()
     
+    def cancel_calculation(self):
+        """Cancels the running worker, if any, without waiting for it."""
+        self.cancelled_workers = [worker for worker in self.cancelled_workers if worker.isRunning()]
+        if self.worker is not None and self.worker.isRunning():
+            self.worker.cancel()
+            # Keep a reference until the thread exits; its signals are ignored
+            self.cancelled_workers.append(self.worker)
+        self.worker = None
+    
+    def closeEvent(self, event):
+        # Threads must not outlive the window; cancelled runs stop at their next chunk
+        self.cancel_calculation()
+        self.live_timer.stop()
+        for worker in self.cancelled_workers + self.live_workers:
+            worker.wait()
+        super().closeEvent(event)
+    
+    def is_current_worker(self):
+        """Signals queued by a cancelled worker may still arrive; only the current one counts."""
+        return self.sender() is self.worker
+    
     def on_progress_update(self, message):
+        if not self.is_current_worker():
+            return
         self.statusBar().showMessage(message)
     
+    def on_files_progress(self, done, total):
+        if not self.is_current_worker():
+            return
+        self.progress_bar.setRange(0, max(1, total))
+        self.progress_bar.setValue(done)
+        self.statusBar().showMessage(f"Analyzed {done}/{total} files...")
+    
+    def on_partial_results(self, results):
+        if not self.is_current_worker():
+            return
+        self.results = results
+        self.build_news_feed(results)
+    
     def on_calculation_finished(self, results):
+        if not self.is_current_worker():
+            return
         self.results = results
+        # Keep the analyzed corpus for live re-ranking of later edits
+        if self.worker.index is not None:
+            self.live_ranker = LiveRanker(self.worker.index, exclude=self.target_file, top_k=self.worker.top_k)
+        else:
+            self.live_ranker = None
         self.progress_bar.setVisible(False)
         self.calculate_btn.setEnabled(True)
         
-        # Build news feed HTML
+        # Build news feed (timed as the run's render stage)
+        render_start = time.perf_counter()
         self.build_news_feed(results)
+        self.last_render_seconds = time.perf_counter() - render_start
         
         # Show status with edit section info if available
         status_msg = f"Found {len(results)} similar files"
@@ -341,380 +656,40 @@ class MarkdownSimilarityGUI(QMainWindow):
             status_msg += f" (focused on edited section: '{self.last_edit_section}')"
         self.statusBar().showMessage(status_msg)
     
+    def on_calculation_profiled(self, data):
+        """Shows the finished run's stage timings (status bar tooltip and summary)"""
+        if not self.is_current_worker():
+            return
+        data['stages'].append({'name': 'render', 'calls': 1, 'items': len(self.results),
+                               'wall_s': self.last_render_seconds, 'cpu_s': None,
+                               'peak_rss_mb': None, 'peak_traced_mb': None})
+        self.last_profile = data
+        self.statusBar().setToolTip(f"<pre>{format_profile(data)}</pre>")
+        
+        top_level = [stage for stage in data['stages'] if '.' not in stage['name']]
+        slowest = max(top_level, key=lambda stage: stage['wall_s'])
+        self.statusBar().showMessage(
+            f"{self.statusBar().currentMessage()} - {data['total_wall_s']:.2f}s "
+            f"(slowest stage: {slowest['name']} {slowest['wall_s']:.2f}s; hover for details)"
+        )
+    
     def on_calculation_error(self, error_msg):
+        if not self.is_current_worker():
+            return
         self.progress_bar.setVisible(False)
         self.calculate_btn.setEnabled(True)
         self.statusBar().showMessage(f"Error: {error_msg}")
     
     def markdown_to_html(self, md_text):
-        """Convert markdown text to HTML with proper styling"""
-        if MARKDOWN_AVAILABLE:
-            try:
-                # Use markdown library if available
-                html = markdown.markdown(md_text, extensions=['fenced_code', 'tables', 'nl2br'])
-                return html
-            except:
-                pass
-        
-        # Fallback: basic markdown rendering
-        html = md_text
-        # Headers
-        html = re.sub(r'^### (.*?)$', r'<h3>\1</h3>', html, flags=re.MULTILINE)
-        html = re.sub(r'^## (.*?)$', r'<h2>\1</h2>', html, flags=re.MULTILINE)
-        html = re.sub(r'^# (.*?)$', r'<h1>\1</h1>', html, flags=re.MULTILINE)
-        # Bold
-        html = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', html)
-        # Italic
-        html = re.sub(r'\*(.*?)\*', r'<i>\1</i>', html)
-        # Code blocks
-        html = re.sub(r'```(.*?)```', r'<pre>\1</pre>', html, flags=re.DOTALL)
-        # Inline code
-        html = re.sub(r'`(.*?)`', r'<code>\1</code>', html)
-        # Line breaks
-        html = html.replace('\n', '<br>')
-        return html
+        """Convert markdown text to HTML with proper styling (cached by content)"""
+        return self.renderer.render(md_text)
     
     def build_news_feed(self, results):
-        """Build a scrollable news feed of all related sections"""
-        if not results:
-            self.news_feed.setHtml("<p style='padding: 20px; text-align: center; color: #999;'>No results yet. Select files and calculate similarity.</p>")
-            return
-        
-        feed_html = """
-        <html>
-        <head>
-        <style>
-            body {
-                font-family: -apple-system, BlinkMacSystemFont, 'SF Pro Text', 'Helvetica Neue', Arial, sans-serif;
-                line-height: 1.47059;
-                font-size: 17px;
-                letter-spacing: -0.022em;
-                color: #1d1d1f;
-                margin: 0;
-                padding: 16px;
-                background-color: #f5f5f7;
-            }
-            .feed-item {
-                background: #ffffff;
-                border-radius: 18px;
-                padding: 24px;
-                margin-bottom: 16px;
-                box-shadow: 0 4px 16px rgba(0,0,0,0.08);
-                border: 0.5px solid rgba(0,0,0,0.04);
-                transition: all 0.3s ease;
-            }
-            .feed-item:hover {
-                box-shadow: 0 8px 24px rgba(0,0,0,0.12);
-            }
-            .feed-item.high {
-                border-left: 4px solid #30d158;
-            }
-            .feed-item.medium {
-                border-left: 4px solid #ff9f0a;
-            }
-            .feed-item.low {
-                border-left: 4px solid #ff453a;
-            }
-            .file-header {
-                margin-bottom: 16px;
-                padding-bottom: 12px;
-                border-bottom: 1px solid rgba(0,0,0,0.06);
-            }
-            .file-name {
-                font-size: 20px;
-                font-weight: 600;
-                letter-spacing: -0.015em;
-                color: #1d1d1f;
-                margin: 0 0 8px 0;
-            }
-            .similarity-badge {
-                display: inline-block;
-                padding: 4px 14px;
-                border-radius: 16px;
-                font-size: 13px;
-                font-weight: 600;
-                letter-spacing: -0.01em;
-                color: white;
-            }
-            .similarity-badge.high {
-                background: linear-gradient(135deg, #30d158 0%, #28a745 100%);
-            }
-            .similarity-badge.medium {
-                background: linear-gradient(135deg, #ff9f0a 0%, #ff8c00 100%);
-            }
-            .similarity-badge.low {
-                background: linear-gradient(135deg, #ff453a 0%, #e63946 100%);
-            }
-            .section {
-                margin: 20px 0;
-                padding: 20px;
-                background-color: #f9f9f9;
-                border-radius: 12px;
-                border: 1px solid rgba(0,0,0,0.06);
-            }
-            .section-header {
-                font-size: 19px;
-                font-weight: 600;
-                letter-spacing: -0.015em;
-                color: #1d1d1f;
-                margin: 0 0 12px 0;
-            }
-            .section-similarity {
-                font-size: 13px;
-                color: #86868b;
-                margin-bottom: 12px;
-            }
-            .section-content {
-                color: #1d1d1f;
-                line-height: 1.52947;
-                font-size: 17px;
-                letter-spacing: -0.022em;
-            }
-            .section-content h1 {
-                font-size: 32px;
-                font-weight: 700;
-                letter-spacing: -0.005em;
-                line-height: 1.125;
-                margin: 24px 0 16px 0;
-                color: #1d1d1f;
-            }
-            .section-content h2 {
-                font-size: 28px;
-                font-weight: 700;
-                letter-spacing: -0.003em;
-                line-height: 1.14286;
-                margin: 20px 0 14px 0;
-                color: #1d1d1f;
-            }
-            .section-content h3 {
-                font-size: 24px;
-                font-weight: 600;
-                letter-spacing: -0.002em;
-                line-height: 1.16667;
-                margin: 18px 0 12px 0;
-                color: #1d1d1f;
-            }
-            .section-content h4 {
-                font-size: 20px;
-                font-weight: 600;
-                letter-spacing: -0.015em;
-                line-height: 1.2;
-                margin: 16px 0 10px 0;
-                color: #1d1d1f;
-            }
-            .section-content p {
-                margin: 0 0 16px 0;
-                line-height: 1.52947;
-            }
-            .section-content strong {
-                font-weight: 600;
-                color: #1d1d1f;
-            }
-            .section-content em {
-                font-style: italic;
-            }
-            .section-content code {
-                background-color: rgba(175,184,193,0.2);
-                padding: 3px 7px;
-                border-radius: 6px;
-                font-family: 'SF Mono', 'Monaco', 'Menlo', 'Courier New', monospace;
-                font-size: 15px;
-                color: #1d1d1f;
-                font-weight: 400;
-            }
-            .section-content pre {
-                background-color: #1d1d1f;
-                color: #f5f5f7;
-                padding: 20px;
-                border-radius: 12px;
-                overflow-x: auto;
-                font-family: 'SF Mono', 'Monaco', 'Menlo', 'Courier New', monospace;
-                font-size: 14px;
-                line-height: 1.5;
-                margin: 20px 0;
-            }
-            .section-content pre code {
-                background-color: transparent;
-                padding: 0;
-                border-radius: 0;
-                color: #f5f5f7;
-                font-size: 14px;
-            }
-            .section-content blockquote {
-                border-left: 4px solid #d2d2d7;
-                padding-left: 20px;
-                margin: 20px 0;
-                color: #6e6e73;
-                font-style: italic;
-                font-size: 17px;
-            }
-            .section-content ul, .section-content ol {
-                margin: 16px 0;
-                padding-left: 32px;
-            }
-            .section-content li {
-                margin: 8px 0;
-                line-height: 1.52947;
-            }
-            .section-content a {
-                color: #0066cc;
-                text-decoration: none;
-                transition: color 0.2s ease;
-            }
-            .section-content a:hover {
-                color: #0077ed;
-                text-decoration: underline;
-            }
-            .section-content table {
-                border-collapse: collapse;
-                width: 100%;
-                margin: 20px 0;
-                font-size: 15px;
-            }
-            .section-content th, .section-content td {
-                border: 1px solid #d2d2d7;
-                padding: 12px 16px;
-                text-align: left;
-            }
-            .section-content th {
-                background-color: #f5f5f7;
-                font-weight: 600;
-                color: #1d1d1f;
-            }
-            .section-content tr:nth-child(even) {
-                background-color: #fafafa;
-            }
-            .keywords {
-                margin-top: 20px;
-                padding: 16px;
-                background: linear-gradient(135deg, #f5f5f7 0%, #e8e8ed 100%);
-                border-radius: 12px;
-                font-size: 14px;
-            }
-            .keyword-tag {
-                display: inline-block;
-                background: linear-gradient(135deg, #007aff 0%, #0051d5 100%);
-                color: white;
-                padding: 5px 12px;
-                margin: 4px;
-                border-radius: 14px;
-                font-size: 13px;
-                font-weight: 500;
-                letter-spacing: -0.01em;
-                box-shadow: 0 2px 8px rgba(0,122,255,0.25);
-            }
-            .keywords strong {
-                font-weight: 600;
-                color: #1d1d1f;
-                font-size: 14px;
-            }
-        </style>
-        </head>
-        <body>
-        """
-        
-        # Collect all sections from all files
-        all_sections = []
-        
-        for result in results:
-            file_name = os.path.basename(result['file'])
-            file_path = result['file']
-            combined_percent = result['combined_similarity'] * 100
-            
-            # Determine similarity class
-            if combined_percent >= 70:
-                sim_class = "high"
-                item_class = "high"
-            elif combined_percent >= 50:
-                sim_class = "medium"
-                item_class = "medium"
-            else:
-                sim_class = "low"
-                item_class = "low"
-            
-            # Get heading similarities
-            heading_sims = result.get('heading_similarities', [])
-            
-            # If we have section-level data, add each section
-            if heading_sims:
-                heading_sims_sorted = sorted(heading_sims, key=lambda x: x['combined_similarity'], reverse=True)
-                
-                for heading_match in heading_sims_sorted:
-                    section_sim = heading_match['combined_similarity'] * 100
-                    heading = heading_match['heading']
-                    content = heading_match.get('content', '')
-                    
-                    all_sections.append({
-                        'file_name': file_name,
-                        'file_path': file_path,
-                        'file_similarity': combined_percent,
-                        'sim_class': sim_class,
-                        'item_class': item_class,
-                        'section_similarity': section_sim,
-                        'heading': heading,
-                        'content': content,
-                        'keywords': result.get('top_keywords', {})
-                    })
-            else:
-                # No section data, show full file
-                try:
-                    content = read_markdown_file(file_path)
-                except:
-                    content = "Could not read file content."
-                
-                all_sections.append({
-                    'file_name': file_name,
-                    'file_path': file_path,
-                    'file_similarity': combined_percent,
-                    'sim_class': sim_class,
-                    'item_class': item_class,
-                    'section_similarity': combined_percent,
-                    'heading': file_name,
-                    'content': content,
-                    'keywords': result.get('top_keywords', {})
-                })
-        
-        # Sort all sections by similarity
-        all_sections_sorted = sorted(all_sections, key=lambda x: x['section_similarity'], reverse=True)
-        
-        # Build HTML for each section
-        for idx, section in enumerate(all_sections_sorted):
-            # Render markdown content to HTML
-            content_html = self.markdown_to_html(section['content'])
-            
-            # Get top keywords
-            keywords = list(section['keywords'].keys())[:8]
-            keywords_html = ''.join([f'<span class="keyword-tag">{kw}</span>' for kw in keywords])
-            
-            feed_html += f"""
-            <div class="feed-item {section['item_class']}">
-                <div class="file-header">
-                    <div class="file-name">{section['file_name']}</div>
-                    <span class="similarity-badge {section['sim_class']}">
-                        {section['section_similarity']:.1f}% match
-                    </span>
-                </div>
-                
-                <div class="section">
-                    <div class="section-header">{section['heading']}</div>
-                    <div class="section-content">
-                        {content_html}
-                    </div>
-                </div>
-                
-                <div class="keywords">
-                    <strong>Keywords:</strong><br>
-                    {keywords_html}
-                </div>
-            </div>
-            """
-        
-        feed_html += """
-        </body>
-        </html>
-        """
-        
-        self.news_feed.setHtml(feed_html)
+        """Shows a scrollable feed of all related sections, best match first"""
+        self.feed_delegate.clear()
+        self.feed_model.set_cards(build_feed_cards(results))
+        self.feed_empty_label.setVisible(not results)
+        self.news_feed.setVisible(bool(results))
 
 
 def main():
@@ -0,0 +1,172 @@
+"""
+Parallel ingestion of markdown notes.
+
+Keyword and section extraction is CPU-bound regex work, so large corpora
+are processed in a pool of worker processes. Workers receive file paths (or
+texts) in chunks and send back compact tuples instead of result
+dictionaries or note texts:
+
+    (keywords, top_keywords, sections)
+
+where `keywords` is the space-joined keyword string used for TF-IDF,
+`top_keywords` the 10 most frequent (word, count) pairs and `sections` a
+list of (heading, start, end, section_keywords) for non-empty sections.
+Section content is recovered later as text[start:end]; callers that need
+the content of every section ask for the text itself (`with_text=True`),
+which is then appended to each tuple, instead of reading notes again.
+Results are returned in input order, whatever the number of workers.
+
+When a run is profiled (see `profiling`), workers also report the time
+spent reading, extracting keywords and splitting sections, which is added
+to the profile as 'ingest.read', 'ingest.keywords' and 'ingest.sections'.
+
+Usage:
+    notes = ingest_files(files, workers=8)
+"""
+import os
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from main import read_markdown_file
+from document import NoteDocument
+from profiling import current_profile
+
+# Below this many notes the pool start-up costs more than it saves
+PARALLEL_MIN_NOTES = 64
+# Chunks per worker when no chunksize is given; >1 balances uneven notes
+CHUNKS_PER_WORKER = 4
+MAX_CHUNKSIZE = 64
+
+
+def file_key(path):
+    """Returns the (mtime_ns, size) pair used to detect changed files cheaply."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def read_unchanged(file_path, key):
+    """
+    Reads a note again for section text sliced with offsets from an earlier
+    analysis. Returns None if it is unreadable or its (mtime_ns, size) is no
+    longer `key`, since the offsets would then point into different text.
+    """
+    text = read_markdown_file(file_path)
+    try:
+        unchanged = file_key(file_path) == key
+    except OSError:
+        return None
+    return text if text and unchanged else None
+
+
+def process_note(text):
+    """
+    Extracts everything needed to score a note from its text.
+    Returns (keywords, freq, sections) where sections is a list of
+    (heading, start, end, section_keywords) for non-empty sections.
+    """
+    document = NoteDocument(text)
+    return document.keywords, document.freq, document.section_spans()
+
+
+def analyze_text(text):
+    """Returns the compact (keywords, top_keywords, sections) tuple of a note."""
+    keywords, freq, sections = process_note(text)
+    return keywords, freq[:10], sections
+
+
+def analyze_file(file_path, with_text=False):
+    """Reads and analyzes one note. Returns None for unreadable or empty files."""
+    text = read_markdown_file(file_path)
+    if not text:
+        return None
+    note = analyze_text(text)
+    return note + (text,) if with_text else note
+
+
+def analyze_file_timed(file_path, with_text=False):
+    """
+    `analyze_file` for profiled runs. Returns (note, (read_s, keywords_s, sections_s)).
+    """
+    start = time.perf_counter()
+    text = read_markdown_file(file_path)
+    read_time = time.perf_counter() - start
+    if not text:
+        return None, (read_time, 0.0, 0.0)
+
+    # Parsing a document finds its headings, which is part of section splitting
+    start = time.perf_counter()
+    document = NoteDocument(text)
+    sections_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    keywords, freq = document.keywords, document.freq
+    keywords_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sections = document.section_spans()
+    sections_time += time.perf_counter() - start
+    note = (keywords, freq[:10], sections) + ((text,) if with_text else ())
+    return note, (read_time, keywords_time, sections_time)
+
+
+def resolve_workers(workers, n_items):
+    """
+    Number of processes to use: `workers` if given, otherwise every CPU for
+    corpora of at least PARALLEL_MIN_NOTES notes and 1 below that.
+    """
+    if workers is None:
+        workers = (os.cpu_count() or 1) if n_items >= PARALLEL_MIN_NOTES else 1
+    return max(1, min(workers, n_items))
+
+
+def _chunksize(n_items, workers):
+    return max(1, min(MAX_CHUNKSIZE, n_items // (workers * CHUNKS_PER_WORKER)))
+
+
+def _map(function, items, workers=None, chunksize=None, executor=None):
+    items = list(items)
+    workers = resolve_workers(workers, len(items))
+    if executor is None and workers == 1:
+        return [function(item) for item in items]
+
+    chunksize = chunksize or _chunksize(len(items), workers)
+    if executor is not None:
+        return list(executor.map(function, items, chunksize=chunksize))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields results in input order
+        return list(pool.map(function, items, chunksize=chunksize))
+
+
+def ingest_files(files, workers=None, chunksize=None, executor=None, with_text=False):
+    """
+    Reads and analyzes notes in parallel.
+
+    Args:
+        files: Paths of markdown notes
+        workers: Number of worker processes (default: all CPUs for large corpora)
+        chunksize: Notes sent to a worker at a time (default: based on corpus size)
+        executor: An existing ProcessPoolExecutor to reuse across calls;
+            `workers` should then be its number of workers
+        with_text: Also return each note's text (sent back from the workers)
+
+    Returns:
+        One (keywords, top_keywords, sections) tuple, or None for unreadable
+        files, per input path and in the same order. With `with_text`, the
+        tuples are (keywords, top_keywords, sections, text).
+    """
+    profile = current_profile()
+    if profile is None:
+        return _map(partial(analyze_file, with_text=with_text), files, workers, chunksize, executor)
+
+    files = list(files)
+    with profile.stage('ingest', items=len(files)):
+        timed = _map(partial(analyze_file_timed, with_text=with_text), files, workers, chunksize, executor)
+    for i, name in enumerate(('read', 'keywords', 'sections')):
+        profile.add(f'ingest.{name}', sum(timings[i] for _, timings in timed), items=len(timed), calls=0)
+    return [note for note, _ in timed]
+
+
+def ingest_texts(texts, workers=None, chunksize=None):
+    """Like `ingest_files` for note texts that were already read."""
+    return _map(analyze_text, texts, workers, chunksize)
@@ -0,0 +1,270 @@
+"""
+Live re-ranking of an edited note against a cached corpus.
+
+After one full calculation the comparison notes are held in an in-memory
+`CorpusIndex` (see `progressive.progressive_similarity`). `LiveRanker`
+scores the editor's current text against that index: nothing is written to
+disk and no comparison note is read again except the winners' section text.
+The GUI calls it after a debounce interval, so a burst of keystrokes costs
+one query.
+
+Repeated queries for the same target are incremental:
+- the target is split into chunks at heading lines and keyword counts are
+  kept per chunk, so only the edited section is analyzed again;
+- target-independent corpus statistics (IDF, row norms) are computed once;
+- file-level dot products and norms are updated through the vocabulary
+  columns whose target counts changed, instead of the whole corpus;
+- an edit that leaves the target's keywords unchanged reuses every score;
+- sections are only scored for the returned files.
+
+Results are the same as `CorpusIndex.query` (and so `calculate_similarity`).
+
+Usage:
+    ranker = LiveRanker(index, exclude='notes/target.md', top_k=20)
+    results = ranker.rank(editor_text)   # same format as calculate_similarity
+    results, update = ranker.rank_with_update(editor_text)  # and what the call recomputed
+"""
+import time
+import threading
+from bisect import bisect_right
+from collections import Counter
+
+import numpy as np
+
+from main import (
+    keyword_parts, top_keywords_string, find_headings, CODE_BLOCK_PATTERN,
+    normalized_euclidean, section_scores, top_k_indices
+)
+
+# Quiet time after the last keystroke before the target is re-scored
+DEFAULT_DEBOUNCE_MS = 400
+# Incremental updates between full recomputations of the file-level scores,
+# so float rounding cannot accumulate over a long editing session
+REBASE_EVERY = 256
+
+
+def split_chunks(text, headings=None):
+    """
+    Splits text at heading lines into chunks whose `keyword_parts` add up to
+    those of the whole text. Returns [text] when a keyword match could span
+    two chunks: a code block across a heading, or a chunk ending in '#'
+    (HEADING_PATTERN may continue on the next line).
+    `headings` may pass the result of `find_headings(text)` if already known.
+    """
+    if headings is None:
+        headings = find_headings(text)
+    bounds = [0] + [start for start, _, _, _ in headings if start > 0] + [len(text)]
+    chunks = [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+    if any(chunk.rstrip().endswith('#') for chunk in chunks[:-1]):
+        return [text]
+    if '```' in text:
+        for match in CODE_BLOCK_PATTERN.finditer(text):
+            if match.end() > bounds[bisect_right(bounds, match.start())]:
+                return [text]
+    return chunks
+
+
+class LiveRanker:
+    """
+    Scores unsaved target text against a cached `CorpusIndex`.
+
+    Args:
+        index: CorpusIndex of the comparison notes
+        exclude: Path left out of the ranking (usually the target file)
+        top_k: Only return the k most similar files (default: all)
+        section_idf: 'corpus' or 'pairwise' section IDF (see `main.section_scores`)
+    """
+
+    def __init__(self, index, exclude=None, top_k=None, section_idf='corpus'):
+        if section_idf not in ('corpus', 'pairwise'):
+            raise ValueError(f"Unknown section_idf '{section_idf}' (expected 'corpus' or 'pairwise')")
+        self.index = index
+        self.exclude = exclude
+        self.top_k = top_k
+        self.section_idf = section_idf
+        self.last_update = None
+        self._lock = threading.Lock()
+        self._rows = None
+        self._last_text = None
+        self._last_keywords = None
+        self._last_results = None
+        # Keyword counts per chunk text, for the chunks of the last text
+        self._chunk_parts = {}
+        # Target term counts behind the cached dot products and row norms
+        self._term_counts = None
+        self._dots = None
+        self._square_sums = None
+        self._updates = 0
+
+    def _prepare(self):
+        """Computes the target-independent statistics of the compared notes."""
+        index = self.index
+        rows = index.compared_rows(self.exclude)
+        counts = index.file_counts[rows].astype(np.float64)
+        squared = counts.multiply(counts).tocsr()
+        n_terms = counts.shape[1]
+        n_documents = len(rows) + 1
+        document_frequency = np.bincount(counts.indices, minlength=n_terms)
+
+        # IDF of a term without and with the target containing it (see `tfidf_cosine`)
+        self._idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+        self._target_idf = np.log((1 + n_documents) / (2 + document_frequency)) + 1
+        self._oov_idf = np.log((1 + n_documents) / 2) + 1
+        self._columns = counts.tocsc()
+        self._squared_columns = squared.tocsc()
+        self._base_square_sums = squared @ (self._idf ** 2)
+        self._row_nonzero = counts.getnnz(axis=1) > 0
+
+        if self.section_idf == 'corpus':
+            section_rows = np.concatenate(
+                [np.arange(index.section_ptr[i], index.section_ptr[i + 1]) for i in rows]
+                + [np.zeros(0, dtype=np.int64)]
+            )
+            self._section_df = np.bincount(index.section_counts[section_rows].indices, minlength=n_terms)
+            self._n_sections = len(section_rows)
+        self._rows = rows
+
+    def _keywords(self, text, headings):
+        """Target keyword string; only chunks not seen in the last text are analyzed."""
+        chunks = split_chunks(text, headings)
+        parts = {}
+        for chunk in chunks:
+            if chunk not in parts:
+                cached = self._chunk_parts.get(chunk)
+                if cached is None:
+                    cached = tuple(Counter(part) for part in keyword_parts(chunk))
+                parts[chunk] = cached
+        analyzed = sum(1 for chunk in parts if chunk not in self._chunk_parts)
+        self._chunk_parts = parts
+
+        # Same counting order as `extract_keywords`, so ties rank the same
+        word_freq = Counter()
+        for kind in range(4):
+            for chunk in chunks:
+                word_freq.update(parts[chunk][kind])
+        return top_keywords_string(word_freq), len(chunks), analyzed
+
+    def _file_scores(self, term_counts):
+        """Updates the cached dot products and row norms for new target counts."""
+        target_idf_sq = self._target_idf ** 2
+        previous = self._term_counts
+        if previous is None or self._updates >= REBASE_EVERY:
+            ids = np.fromiter(term_counts, dtype=np.int64, count=len(term_counts))
+            values = np.fromiter(term_counts.values(), dtype=np.float64, count=len(term_counts))
+            self._dots = self._columns[:, ids] @ (values * target_idf_sq[ids])
+            self._square_sums = self._base_square_sums + (
+                self._squared_columns[:, ids] @ (target_idf_sq[ids] - self._idf[ids] ** 2)
+            )
+            self._updates = 0
+            changed = None
+        else:
+            changed = [t for t in previous.keys() | term_counts.keys() if previous.get(t) != term_counts.get(t)]
+            if changed:
+                ids = np.array(changed, dtype=np.int64)
+                new = np.array([term_counts.get(t, 0) for t in changed], dtype=np.float64)
+                old = np.array([previous.get(t, 0) for t in changed], dtype=np.float64)
+                self._dots = self._dots + self._columns[:, ids] @ ((new - old) * target_idf_sq[ids])
+                presence = (new > 0).astype(np.float64) - (old > 0)
+                self._square_sums = self._square_sums + (
+                    self._squared_columns[:, ids] @ (presence * (target_idf_sq[ids] - self._idf[ids] ** 2))
+                )
+            self._updates += 1
+        self._term_counts = term_counts
+        return changed
+
+    def rank(self, text, headings=None):
+        """
+        Returns results for `text`; repeated calls with unchanged text are free.
+        `headings` may pass `find_headings(text)` (e.g. `NoteDocument.headings`).
+        """
+        return self.rank_with_update(text, headings)[0]
+
+    def rank_with_update(self, text, headings=None):
+        """
+        Like `rank`, but returns (results, update): a copy of `last_update`
+        taken under the lock, so a rank running in another thread cannot
+        change it. `update` is None when the text was unchanged or empty.
+        """
+        with self._lock:
+            if text == self._last_text:
+                return self._last_results, None
+            start = time.perf_counter()
+            results = self._rank(text, headings)
+            self._last_text = text
+            self._last_results = results
+            if self.last_update is None:
+                return results, None
+            self.last_update['elapsed_ms'] = (time.perf_counter() - start) * 1000
+            return results, dict(self.last_update)
+
+    def _rank(self, text, headings):
+        self.last_update = None
+        if not text or not len(self.index):
+            return []
+        if self._rows is None:
+            self._prepare()
+        rows = self._rows
+        if len(rows) == 0:
+            return []
+
+        keywords, n_sections, analyzed = self._keywords(text, headings)
+        self.last_update = {'sections': n_sections, 'analyzed_sections': analyzed}
+        if keywords == self._last_keywords:
+            # The edit did not change the target's keyword vector
+            self.last_update['changed_terms'] = 0
+            return self._last_results
+        self._last_keywords = keywords
+
+        term_counts, oov_square_sum = self.index.vocabulary.query_counts(keywords)
+        changed = self._file_scores(term_counts)
+        self.last_update['changed_terms'] = None if changed is None else len(changed)
+
+        ids = np.fromiter(term_counts, dtype=np.int64, count=len(term_counts))
+        values = np.fromiter(term_counts.values(), dtype=np.float64, count=len(term_counts))
+        target_weighted = values * self._target_idf[ids]
+        target_norm = np.sqrt(target_weighted @ target_weighted + oov_square_sum * self._oov_idf ** 2)
+        denominator = np.sqrt(np.maximum(self._square_sums, 0)) * target_norm
+        cosine = np.divide(self._dots, denominator, out=np.zeros_like(self._dots), where=denominator > 0)
+        euclidean = normalized_euclidean(cosine, self._row_nonzero, target_norm > 0)
+        euclidean_sim = 1 / (1 + euclidean)
+        combined = (cosine + euclidean_sim) / 2
+        order = top_k_indices(combined, self.top_k)
+
+        # Sections of the returned files only; corpus IDF uses the cached statistics
+        index = self.index
+        section_ptr = index.section_ptr
+        winners = rows[order]
+        section_lengths = section_ptr[winners + 1] - section_ptr[winners]
+        section_offsets = np.concatenate([[0], np.cumsum(section_lengths)])
+        section_rows = np.concatenate(
+            [np.arange(section_ptr[i], section_ptr[i + 1]) for i in winners] + [np.zeros(0, dtype=np.int64)]
+        )
+        section_results = None
+        if keywords and len(section_rows):
+            target = np.zeros(index.section_counts.shape[1])
+            target[ids] = values
+            target_square_sum = float(values @ values) + oov_square_sum
+            if self.section_idf == 'corpus':
+                section_results = section_scores(
+                    target, target_square_sum, index.section_counts[section_rows], 'corpus',
+                    document_frequency=self._section_df, n_documents=self._n_sections + 1
+                )
+            else:
+                section_results = section_scores(
+                    target, target_square_sum, index.section_counts[section_rows], 'pairwise'
+                )
+
+        results = []
+        for rank, position in enumerate(order):
+            i = rows[position]
+            results.append({
+                'file': index.path(i),
+                'cosine_similarity': cosine[position],
+                'euclidean_similarity': euclidean_sim[position],
+                'combined_similarity': combined[position],
+                'euclidean_distance': euclidean[position],
+                'top_keywords': dict((word, count) for word, count in index.entries[i]['top_keywords']),
+                'heading_similarities': index.heading_similarities(i, section_results, section_offsets[rank])
+            })
+        return results
@@ -1,38 +1,24 @@
 import sys
 import os
+import time
+from contextlib import nullcontext
 from pathlib import Path
 from collections import Counter
+from itertools import filterfalse
 import re
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity, euclidean_distances
 import numpy as np
 
-# SBERT support (optional)
-SBERT_AVAILABLE = False
-try:
-    from sentence_transformers import SentenceTransformer
-    SBERT_AVAILABLE = True
-except ImportError:
-    pass
-
-# NLTK stop words support
-try:
-    from nltk.corpus import stopwords
-    import nltk
-    # Try to load stopwords, download if not available
-    try:
-        ENGLISH_STOP_WORDS = set(stopwords.words('english'))
-    except LookupError:
-        print("Downloading NLTK stopwords...")
-        nltk.download('stopwords', quiet=True)
-        ENGLISH_STOP_WORDS = set(stopwords.words('english'))
-    NLTK_AVAILABLE = True
-except ImportError:
-    NLTK_AVAILABLE = False
-    ENGLISH_STOP_WORDS = set()
-    print("Warning: nltk not installed. Install with: pip install nltk")
-    print("Continuing without NLTK stop words support...")
-    print()
+# SBERT support (optional); models are loaded once per process by the shared engine
+from embeddings import (
+    SBERT_AVAILABLE, DEFAULT_MODEL, DEFAULT_BATCH_SIZE,
+    get_engine, get_embedding_cache, embedding_scores
+)
+
+# Bundled stop word lists: no NLTK import or download at startup
+from stop_words import ENGLISH_STOP_WORDS, KOREAN_STOP_WORDS
+
+# Stage timing; a no-op unless the run is profiled
+from profiling import stage
 
 def read_markdown_file(file_path):
     """
@@ -47,6 +33,19 @@ def read_markdown_file(file_path):
         print(f"Error reading file {file_path}: {e}")
         return ""
 
+# English and Korean stop words in one table
+STOP_WORDS = ENGLISH_STOP_WORDS | KOREAN_STOP_WORDS
+
+# Markdown patterns, compiled once
+HEADING_PATTERN = re.compile(r'#{1,6}\s+(.+)')
+BOLD_PATTERN = re.compile(r'\*\*(.+?)\*\*|__(.+?)__')
+LINK_PATTERN = re.compile(r'\[(.+?)\]\(.+?\)')
+CODE_BLOCK_PATTERN = re.compile(r'```.*?```', re.DOTALL)
+INLINE_CODE_PATTERN = re.compile(r'`.*?`')
+# Korean or English words of at least two letters. Runs of one script are
+# matched whole, so this equals matching every run and dropping 1-letter ones.
+WORD_PATTERN = re.compile(r'[가-힣]{2,}|[a-zA-Z]{2,}')
+
 def extract_keywords(text, top_n=20):
     """
     Extracts important keywords from text.
@@ -57,147 +56,299 @@ def extract_keywords(text, top_n=20):
     - Code blocks
     - Link text
     Uses TF-IDF to select important keywords.
-    Filters out common stop words in English (via NLTK) and Korean.
-    """
-    # English stop words from NLTK (if available)
-    english_stop_words = ENGLISH_STOP_WORDS if NLTK_AVAILABLE else set()
-    
-    # Korean stop words (조사, 접속사, 일반적인 단어)
-    korean_stop_words = {
-        '의', '가', '이', '은', '들', '는', '좀', '잘', '걍', '과', '도', '를', '으로', '자',
-        '에', '와', '한', '하다', '그', '저', '것', '수', '등', '년', '월', '일',
-        '있다', '없다', '되다', '하는', '한다', '있는', '없는', '대한', '위한', '통해',
-        '매우', '정말', '너무', '조금', '많이', '같은', '다른', '새로운', '따라',
-        '또한', '그리고', '하지만', '그러나', '또는', '및', '때문', '이런', '저런',
-        '어떤', '무엇', '누구', '언제', '어디', '왜', '어떻게', '이다', '아니다'
-    }
-    
-    keywords = []
+    Filters out common stop words in English (NLTK's list, bundled) and Korean.
     
+    Patterns and stop words are prepared once at import time; plain-text
+    words are tokenized by one regex pass over the text without code.
+    """
+    word_freq = Counter()
+    for part in keyword_parts(text):
+        word_freq.update(part)
+    return top_keywords_string(word_freq, top_n), list(word_freq.items())
+
+def keyword_parts(text):
+    """
+    Returns the keyword lists `extract_keywords` counts, in counting order:
+    (headings, bold text, link text, plain-text words).
+    """
     # Extract markdown headings (# Title)
-    headings = re.findall(r'#{1,6}\s+(.+)', text)
-    keywords.extend(headings)
+    headings = HEADING_PATTERN.findall(text)
     
     # Extract bold text (**bold** or __bold__)
-    bold_text = re.findall(r'\*\*(.+?)\*\*|__(.+?)__', text)
-    keywords.extend([b[0] or b[1] for b in bold_text])
+    bold = [b[0] or b[1] for b in BOLD_PATTERN.findall(text)]
     
     # Extract link text [link text](url)
-    link_text = re.findall(r'\[(.+?)\]\(.+?\)', text)
-    keywords.extend(link_text)
+    links = LINK_PATTERN.findall(text)
     
-    # Extract plain text, excluding code blocks
-    text_without_code = re.sub(r'```.*?```', '', text, flags=re.DOTALL)
-    text_without_code = re.sub(r'`.*?`', '', text_without_code)
+    # Extract plain text, excluding code blocks. Removal stays two ordered
+    # substitutions: an inline-code match may only pair the backticks left
+    # after block removal, and words on either side of removed code join
+    # up, which a single scan skipping code cannot reproduce.
+    text_without_code = INLINE_CODE_PATTERN.sub('', CODE_BLOCK_PATTERN.sub('', text))
     
-    # Remove markdown syntax
-    clean_text = re.sub(r'[#*_\[\]\(\)`]', ' ', text_without_code)
+    # Extract words (Korean, English), skipping stop words. Markdown syntax
+    # characters need no removal: they already separate words.
+    words = list(filterfalse(STOP_WORDS.__contains__, WORD_PATTERN.findall(text_without_code.lower())))
     
-    # Extract words (Korean, English, numbers)
-    words = re.findall(r'[가-힣]+|[a-zA-Z]+', clean_text.lower())
-    
-    # Filter out short words and stop words
-    filtered_words = [
-        w for w in words 
-        if len(w) >= 2 and w not in english_stop_words and w not in korean_stop_words
+    return headings, bold, links, words
+
+def top_keywords_string(word_freq, top_n=20):
+    """Joins the top_n * 3 most frequent keywords (ties keep first-seen order)."""
+    return ' '.join(word for word, freq in word_freq.most_common(top_n * 3))
+
+# A heading line: 1-6 '#' then whitespace and text on the same line
+HEADING_LINE_PATTERN = re.compile(r'^(#{1,6})[^\S\n]+(.+)', re.MULTILINE)
+
+def find_headings(text):
+    """
+    Finds every markdown heading line in one pass.
+    Returns a list of (line_start, line_end, level, heading) tuples, where
+    text[line_start:line_end] is the heading line without its newline.
+    """
+    return [
+        (match.start(), match.end(), len(match.group(1)), match.group(2).strip())
+        for match in HEADING_LINE_PATTERN.finditer(text)
     ]
-    
-    # Combine all keywords
-    all_keywords = keywords + filtered_words
-    
-    # Extract top keywords by frequency
-    word_freq = Counter(all_keywords)
-    top_keywords = [word for word, freq in word_freq.most_common(top_n * 3)]
-    
-    return ' '.join(top_keywords), list(word_freq.items())
 
-def extract_sections_by_heading(text):
+def extract_sections_by_heading(text, headings=None):
     """
     Splits markdown text into sections based on headings.
     Returns a list of dictionaries with heading and content.
+    Each section also records 'start' and 'end' character offsets such that
+    text[start:end] == content, so section text can be reloaded later.
+    `headings` may pass the result of `find_headings(text)` if already known.
     """
-    sections = []
+    if headings is None:
+        headings = find_headings(text)
     
-    # Split by headings while preserving the heading markers
-    lines = text.split('\n')
+    sections = []
     current_heading = "Introduction"
-    current_content = []
+    current_start = 0
     
-    for line in lines:
-        # Check if line is a heading (# Heading)
-        heading_match = re.match(r'^(#{1,6})\s+(.+)', line)
+    for line_start, line_end, _, heading in headings:
+        # Save previous section if at least one line precedes this heading
+        if line_start > current_start:
+            sections.append(_make_section(text, current_heading, current_start, line_start - 1))
         
-        if heading_match:
-            # Save previous section
-            if current_content:
-                sections.append({
-                    'heading': current_heading,
-                    'content': '\n'.join(current_content).strip()
-                })
-            
-            # Start new section
-            current_heading = heading_match.group(2).strip()
-            current_content = []
-        else:
-            current_content.append(line)
+        # Start new section on the line after the heading
+        current_heading = heading
+        current_start = line_end + 1
     
-    # Add the last section
-    if current_content:
-        sections.append({
-            'heading': current_heading,
-            'content': '\n'.join(current_content).strip()
-        })
+    # Add the last section (a heading on the final line has no content lines)
+    if current_start <= len(text):
+        sections.append(_make_section(text, current_heading, current_start, len(text)))
     
     return sections
 
-def calculate_heading_similarity(target_keywords, compare_sections):
+def _make_section(text, heading, start, end):
+    """Builds a section dict for text[start:end], trimming surrounding whitespace."""
+    raw = text[start:end]
+    content = raw.strip()
+    start += len(raw) - len(raw.lstrip())
+    return {
+        'heading': heading,
+        'content': content,
+        'start': start,
+        'end': start + len(content)
+    }
+
+def top_k_indices(scores, k=None):
+    """
+    Returns the indices of the k highest scores, highest first.
+    Uses partial selection so only the k winners are sorted; ties keep their
+    original order like a stable sort. k=None ranks every score.
+    """
+    scores = np.asarray(scores)
+    if k is None or k >= len(scores):
+        return np.argsort(-scores, kind='stable')
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    winners = np.argpartition(-scores, k - 1)[:k]
+    # Restore original order among the winners before the stable sort
+    winners.sort()
+    return winners[np.argsort(-scores[winners], kind='stable')]
+
+# IDF of a term that appears in exactly one of two documents (smooth_idf=True)
+_PAIRWISE_IDF = np.log(3 / 2) + 1
+
+def _binary(matrix):
+    """Returns a copy of a sparse matrix with every stored value set to 1."""
+    binary = matrix.copy()
+    binary.data = np.ones_like(binary.data, dtype=np.float64)
+    return binary
+
+def tfidf_cosine(counts, document_frequency, n_documents, target, target_oov_square_sum=0.0):
+    """
+    Cosine similarity between a target and each row of `counts`, using the
+    smoothed IDF a TfidfVectorizer would learn from [target] + rows.
+    
+    Args:
+        counts: CSR matrix of term counts (rows = compare documents)
+        document_frequency: Number of rows containing each term
+        n_documents: Number of documents the IDF is fit on (rows + target)
+        target: Dense term count vector of the target
+        target_oov_square_sum: Sum of squared counts of target terms missing from `counts` columns
+    
+    Returns:
+        (cosine, row_nonzero, target_nonzero)
+    """
+    target_present = target > 0
+    idf = np.log((1 + n_documents) / (1 + document_frequency + target_present)) + 1
+    oov_idf = np.log((1 + n_documents) / 2) + 1
+    
+    weighted = counts.multiply(idf[np.newaxis, :]).tocsr()
+    row_norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    
+    target_weighted = target * idf
+    target_norm = np.sqrt(target_weighted @ target_weighted + target_oov_square_sum * oov_idf ** 2)
+    
+    dots = weighted @ target_weighted
+    denominator = row_norms * target_norm
+    cosine = np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+    
+    return cosine, row_norms > 0, target_norm > 0
+
+def pairwise_tfidf_cosine(counts, target, target_square_sum):
+    """
+    Cosine similarity between a target and each row of `counts`, reproducing a
+    separate TfidfVectorizer fit on just the two documents [target, row].
+    With two documents a shared term has IDF 1 and any other term has IDF
+    1 + ln(3/2), so every pair can be scored from a few sparse products.
+    
+    Returns:
+        (cosine, row_nonzero, target_nonzero)
+    """
+    scale = _PAIRWISE_IDF ** 2
+    target_present = (target > 0).astype(np.float64)
+    squared = counts.multiply(counts).tocsr()
+    
+    dots = counts @ target
+    shared_target_sq = _binary(counts) @ (target ** 2)
+    shared_row_sq = squared @ target_present
+    row_sq = np.asarray(squared.sum(axis=1)).ravel()
+    
+    target_norm_sq = scale * target_square_sum - (scale - 1) * shared_target_sq
+    row_norm_sq = scale * row_sq - (scale - 1) * shared_row_sq
+    denominator = np.sqrt(np.maximum(target_norm_sq, 0) * np.maximum(row_norm_sq, 0))
+    cosine = np.divide(dots, denominator, out=np.zeros_like(dots), where=denominator > 0)
+    
+    return cosine, row_sq > 0, target_norm_sq > 0
+
+def normalized_euclidean(cosine, row_nonzero, target_nonzero):
+    """
+    Euclidean distance between L2-normalized vectors given their cosine.
+    Zero vectors stay zero after normalization, so their norm is 0 instead of 1.
+    """
+    row_sq = np.where(row_nonzero, 1.0, 0.0)
+    target_sq = np.where(target_nonzero, 1.0, 0.0)
+    return np.sqrt(np.maximum(row_sq + target_sq - 2 * cosine, 0))
+
+def section_scores(target, target_square_sum, section_counts, section_idf='corpus',
+                   document_frequency=None, n_documents=None):
+    """
+    Scores a target against many sections in one vectorized pass.
+    
+    Args:
+        target: Dense term count vector of the target keywords
+        target_square_sum: Squared norm of the target counts, including terms
+            missing from the section vocabulary
+        section_counts: CSR matrix of section term counts (one row per section)
+        section_idf: 'corpus' weights terms with one IDF fit on the target and
+            all sections; 'pairwise' reproduces a separate two-document
+            TfidfVectorizer per section (the original per-section numbers)
+        document_frequency, n_documents: Corpus IDF statistics when
+            `section_counts` is only part of the sections (default: computed
+            from `section_counts`, with n_documents = rows + target)
+    
+    Returns:
+        (cosine, euclidean_similarity, combined_similarity, valid) arrays.
+        A section is not valid when both it and the target have no terms.
+    """
+    if section_idf == 'pairwise':
+        cosine, section_nonzero, target_nonzero = pairwise_tfidf_cosine(
+            section_counts, target, target_square_sum
+        )
+    elif section_idf == 'corpus':
+        if document_frequency is None:
+            document_frequency = np.bincount(section_counts.indices, minlength=section_counts.shape[1])
+            n_documents = section_counts.shape[0] + 1
+        cosine, section_nonzero, target_nonzero = tfidf_cosine(
+            section_counts, document_frequency, n_documents,
+            target, target_square_sum - float(target @ target)
+        )
+    else:
+        raise ValueError(f"Unknown section_idf '{section_idf}' (expected 'corpus' or 'pairwise')")
+    
+    euclidean_sim = 1 / (1 + normalized_euclidean(cosine, section_nonzero, target_nonzero))
+    combined_sim = (cosine + euclidean_sim) / 2
+    valid = section_nonzero | target_nonzero
+    
+    return cosine, euclidean_sim, combined_sim, valid
+
+def score_section_keywords(target_keywords, section_keywords, section_idf='corpus'):
+    """
+    Vectorizes target keywords and all section keyword strings with a single
+    CountVectorizer and scores them with `section_scores`.
+    Returns None if there is nothing to compare.
+    """
+    if not target_keywords or not section_keywords:
+        return None
+    
+    from sklearn.feature_extraction.text import CountVectorizer
+    
+    try:
+        counts = CountVectorizer().fit_transform([target_keywords] + section_keywords).tocsr()
+    except ValueError:
+        # Empty vocabulary
+        return None
+    
+    target = counts[0].toarray().ravel().astype(np.float64)
+    return section_scores(target, float(target @ target), counts[1:], section_idf)
+
+def calculate_heading_similarity(target_keywords, compare_sections, section_idf='pairwise'):
     """
     Calculates similarity between entire target file and each section of comparison files.
     Returns similarity scores for each heading in the comparison file.
+    All sections are scored in one vectorized pass (see `section_scores`);
+    the default 'pairwise' IDF gives the same numbers as fitting one
+    TfidfVectorizer per section.
     """
     if not target_keywords or not compare_sections:
         return []
     
-    results = []
+    sections = [section for section in compare_sections if section['content'].strip()]
+    section_keywords = [extract_keywords(section['content'], top_n=10)[0] for section in sections]
     
-    for compare_section in compare_sections:
-        compare_heading = compare_section['heading']
-        compare_content = compare_section['content']
-        
-        if not compare_content.strip():
+    scores = score_section_keywords(target_keywords, section_keywords, section_idf)
+    return build_heading_similarities(sections, scores)
+
+def build_heading_similarities(sections, scores, offset=0):
+    """
+    Turns vectorized section scores into heading similarity dictionaries.
+    `sections` correspond to rows offset..offset+len(sections) of `scores`.
+    """
+    if scores is None:
+        return []
+    cosine, euclidean_sim, combined_sim, valid = scores
+    
+    results = []
+    for i, section in enumerate(sections, offset):
+        # Skip if vocabulary is empty
+        if not valid[i]:
             continue
         
-        compare_keywords, _ = extract_keywords(compare_content, top_n=10)
-        
-        # Calculate similarity between target (whole file) and this section
-        try:
-            vectorizer = TfidfVectorizer()
-            tfidf_matrix = vectorizer.fit_transform([target_keywords, compare_keywords])
-            
-            cosine_sim = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-            
-            # Calculate Euclidean distance
-            target_dense = tfidf_matrix[0:1].toarray()
-            compare_dense = tfidf_matrix[1:2].toarray()
-            euclidean_dist = euclidean_distances(target_dense, compare_dense)[0][0]
-            euclidean_sim = 1 / (1 + euclidean_dist)
-            
-            combined_sim = (cosine_sim + euclidean_sim) / 2
-            
-            results.append({
-                'heading': compare_heading,
-                'content': compare_content,
-                'cosine_similarity': cosine_sim,
-                'euclidean_similarity': euclidean_sim,
-                'combined_similarity': combined_sim
-            })
-        except:
-            # Skip if vocabulary is empty
-            continue
+        results.append({
+            'heading': section['heading'],
+            'content': section['content'],
+            'cosine_similarity': cosine[i],
+            'euclidean_similarity': euclidean_sim[i],
+            'combined_similarity': combined_sim[i]
+        })
     
     return results
 
-def calculate_similarity_sbert(target_file, compare_files, model_name='paraphrase-MiniLM-L6-v2'):
+def calculate_similarity_sbert(target_file, compare_files, model_name=DEFAULT_MODEL, batch_size=DEFAULT_BATCH_SIZE,
+                               use_cache=True, top_k=None):
     """
     Calculates similarity using Sentence-BERT (sentence-transformers).
     Uses pre-trained transformer models to encode sentences and compute cosine similarity.
@@ -206,6 +357,13 @@ def calculate_similarity_sbert(target_file, compare_files, model_name='paraphras
         target_file: Path to target markdown file
         compare_files: List of paths to comparison markdown files
         model_name: Name of the sentence-transformers model (default: paraphrase-MiniLM-L6-v2)
+        batch_size: Number of texts per encoder forward pass
+        use_cache: Reuse embeddings from the on-disk embedding cache and store
+            new ones, so unchanged notes and sections are never re-encoded
+        top_k: Only return the k most similar files (default: all)
+    
+    The target, every comparison file and every section are encoded together
+    in large batches, and all scores are computed with matrix operations.
     
     Returns:
         List of result dictionaries sorted by similarity
@@ -213,106 +371,92 @@ def calculate_similarity_sbert(target_file, compare_files, model_name='paraphras
     if not SBERT_AVAILABLE:
         raise ImportError("sentence-transformers not installed. Install with: pip install sentence-transformers")
     
-    print(f"Loading SBERT model: {model_name}...")
-    model = SentenceTransformer(model_name)
+    # Reuses the model if this process already loaded it
+    engine = get_engine()
+    with stage('sbert_load'):
+        engine.get_model(model_name)
     
     # Read target file
     print("Reading and processing target file...")
-    target_text = read_markdown_file(target_file)
+    with stage('read', items=1):
+        target_text = read_markdown_file(target_file)
     if not target_text:
         print(f"Error: Could not read target file {target_file}")
         return []
     
-    # Encode target file
-    target_embedding = model.encode(target_text, convert_to_tensor=False)
-    
-    # Also extract sections for section-level similarity
-    target_sections = extract_sections_by_heading(target_text)
-    
     print(f"\nProcessing {len(compare_files)} comparison files...")
     
-    # Read and encode comparison files
-    compare_data = []
-    for file_path in compare_files:
-        if file_path == target_file:
-            continue  # Skip self
-        
-        text = read_markdown_file(file_path)
-        if text:
-            # Encode entire file
-            embedding = model.encode(text, convert_to_tensor=False)
-            
-            # Extract sections
-            sections = extract_sections_by_heading(text)
-            
-            # Get keywords for display
-            _, freq = extract_keywords(text)
-            
-            compare_data.append({
-                'file': file_path,
-                'embedding': embedding,
-                'sections': sections,
-                'freq': freq
-            })
+    # Read and parse comparison files
+    from document import NoteDocument
+    compare_files = [file_path for file_path in compare_files if file_path != target_file]  # Skip self
+    with stage('read', items=len(compare_files)):
+        texts = [(file_path, read_markdown_file(file_path)) for file_path in compare_files]
+    with stage('sections', items=len(texts)):
+        documents = [(file_path, NoteDocument(text)) for file_path, text in texts if text]
+        compare_data = [{
+            'file': file_path,
+            'text': document.text,
+            # Sections with content are encoded separately
+            'sections': [(s['heading'], s['start'], s['end']) for s in document.content_sections]
+        } for file_path, document in documents]
+    with stage('keywords', items=len(documents)):
+        for data, (_, document) in zip(compare_data, documents):
+            # Keywords for display
+            data['freq'] = document.freq
     
     if not compare_data:
         print("No valid comparison files found.")
         return []
     
-    # Calculate similarities
+    # Encode target, files and sections in one batched pass
+    file_texts = [data['text'] for data in compare_data]
+    section_texts = [data['text'][start:end] for data in compare_data for _, start, end in data['sections']]
+    print(f"Encoding {len(file_texts) + len(section_texts) + 1} texts...")
+    cache = get_embedding_cache() if use_cache else None
+    with stage('sbert_encode', items=len(file_texts) + len(section_texts) + 1):
+        embeddings = engine.encode([target_text] + file_texts + section_texts, model_name, batch_size, cache=cache)
+    target_embedding = embeddings[0]
+    file_embeddings = embeddings[1:1 + len(file_texts)]
+    section_embeddings = embeddings[1 + len(file_texts):]
+    
+    # File-level and section-level scores against the target
+    with stage('score', items=len(file_texts) + len(section_texts)):
+        file_cosine, file_distance, file_euclidean, file_combined = embedding_scores(target_embedding, file_embeddings)
+        section_cosine, _, section_euclidean, section_combined = embedding_scores(target_embedding, section_embeddings)
+    
+    section_offsets = np.cumsum([0] + [len(data['sections']) for data in compare_data])
+    
+    with stage('sort', items=len(file_texts)):
+        order = top_k_indices(file_combined, top_k)
+    
+    # Build result dictionaries only for the winners, best first
     results = []
-    for data in compare_data:
-        # File-level similarity using cosine similarity
-        cosine_sim = float(np.dot(target_embedding, data['embedding']) / 
-                          (np.linalg.norm(target_embedding) * np.linalg.norm(data['embedding'])))
-        
-        # For consistency with TF-IDF version, also compute euclidean-style metric
-        euclidean_dist = float(np.linalg.norm(target_embedding - data['embedding']))
-        euclidean_sim = 1 / (1 + euclidean_dist)
-        
-        combined_sim = (cosine_sim + euclidean_sim) / 2
-        
-        # Section-level similarity (target vs each section of compare file)
+    for i in order:
+        data = compare_data[i]
         heading_similarities = []
-        for compare_section in data['sections']:
-            compare_content = compare_section['content']
-            if not compare_content.strip():
-                continue
-            
-            # Encode section
-            section_embedding = model.encode(compare_content, convert_to_tensor=False)
-            
-            # Calculate similarity
-            section_cosine = float(np.dot(target_embedding, section_embedding) / 
-                                 (np.linalg.norm(target_embedding) * np.linalg.norm(section_embedding)))
-            section_euclidean_dist = float(np.linalg.norm(target_embedding - section_embedding))
-            section_euclidean_sim = 1 / (1 + section_euclidean_dist)
-            section_combined = (section_cosine + section_euclidean_sim) / 2
-            
+        for j, (heading, start, end) in enumerate(data['sections'], section_offsets[i]):
             heading_similarities.append({
-                'heading': compare_section['heading'],
-                'content': compare_content,
-                'cosine_similarity': section_cosine,
-                'euclidean_similarity': section_euclidean_sim,
-                'combined_similarity': section_combined
+                'heading': heading,
+                'content': data['text'][start:end],
+                'cosine_similarity': float(section_cosine[j]),
+                'euclidean_similarity': float(section_euclidean[j]),
+                'combined_similarity': float(section_combined[j])
             })
         
         results.append({
             'file': data['file'],
-            'cosine_similarity': cosine_sim,
-            'euclidean_similarity': euclidean_sim,
-            'combined_similarity': combined_sim,
-            'euclidean_distance': euclidean_dist,
+            'cosine_similarity': float(file_cosine[i]),
+            'euclidean_similarity': float(file_euclidean[i]),
+            'combined_similarity': float(file_combined[i]),
+            'euclidean_distance': float(file_distance[i]),
             'top_keywords': dict(data['freq'][:10]),
             'heading_similarities': heading_similarities
         })
     
-    # Sort by combined similarity (highest first)
-    results.sort(key=lambda x: x['combined_similarity'], reverse=True)
-    
     return results
 
-def calculate_similarity(target_file, compare_files, use_sbert=False):
+def calculate_similarity(target_file, compare_files, use_sbert=False, section_idf='corpus', model_name=DEFAULT_MODEL,
+                         top_k=None, workers=None, n_features=None):
     """
     Calculates similarity between target file and comparison files.
     
@@ -320,6 +464,17 @@ def calculate_similarity(target_file, compare_files, use_sbert=False):
         target_file: Path to target markdown file
         compare_files: List of paths to comparison markdown files
         use_sbert: If True, use Sentence-BERT instead of TF-IDF (default: False)
+        section_idf: IDF used for section-level scores. 'corpus' (default) fits
+            one vectorizer over the target and every section of every compare
+            file; 'pairwise' keeps the original per-section two-document IDF
+        model_name: Sentence-transformers model used when use_sbert=True
+        top_k: Only return the k most similar files (default: all). Result
+            dictionaries and section contents are built for the winners only
+        workers: Processes used to read and analyze comparison files
+            (default: all CPUs for large corpora, see `ingest`)
+        n_features: Hash terms into this many buckets instead of learning a
+            vocabulary (see `corpus_index.HashingVocabulary`); memory stays
+            fixed, scores are approximate where terms share a bucket
     
     Uses TF-IDF vectorization with both cosine similarity and Euclidean distance (default),
     or Sentence-BERT embeddings if use_sbert=True.
@@ -331,72 +486,121 @@ def calculate_similarity(target_file, compare_files, use_sbert=False):
     """
     # Dispatch to SBERT if requested
     if use_sbert:
-        return calculate_similarity_sbert(target_file, compare_files)
+        return calculate_similarity_sbert(target_file, compare_files, model_name=model_name, top_k=top_k)
     
     # Read target file
     print("Reading and processing target file...")
-    target_text = read_markdown_file(target_file)
+    with stage('read', items=1):
+        target_text = read_markdown_file(target_file)
     if not target_text:
         print(f"Error: Could not read target file {target_file}")
         return []
     
-    target_keywords, target_freq = extract_keywords(target_text)
+    with stage('keywords', items=1):
+        target_keywords, target_freq = extract_keywords(target_text)
     
     print(f"\nProcessing {len(compare_files)} comparison files...")
     
-    # Read comparison files
+    # Read and analyze comparison files (in parallel for large corpora)
+    from ingest import ingest_files, file_key, read_unchanged
+    compare_files = [file_path for file_path in compare_files if file_path != target_file]  # Skip self
+    # Without a real top-k selection every section is returned, so the texts
+    # are kept from ingestion. Otherwise only the winners are read again, and
+    # their (mtime_ns, size) must still match the analyzed version.
+    keep_text = n_features is None and (top_k is None or top_k >= len(compare_files))
+    keys = {}
+    if n_features is None and not keep_text:
+        for file_path in compare_files:
+            try:
+                keys[file_path] = file_key(file_path)
+            except OSError:
+                pass
+    notes = ingest_files(compare_files, workers, with_text=keep_text)
+    
+    if n_features is not None:
+        # Hashed term counts; IDF is applied at query time by the index
+        from corpus_index import CorpusIndex
+        index = CorpusIndex(n_features=n_features)
+        with stage('vectorize', items=len(compare_files)):
+            index.add_notes(compare_files, notes)
+        if not len(index):
+            print("No valid comparison files found.")
+            return []
+        return index.query(target_text, top_k=top_k, section_idf=section_idf)
+    
     compare_data = []
-    for file_path in compare_files:
-        if file_path == target_file:
-            continue  # Skip self
-        
-        text = read_markdown_file(file_path)
-        if text:
-            keywords, freq = extract_keywords(text)
-            sections = extract_sections_by_heading(text)
+    for file_path, note in zip(compare_files, notes):
+        if note:
+            keywords, freq, sections = note[:3]
             compare_data.append({
                 'file': file_path,
+                'text': note[3] if keep_text else None,
+                'key': keys.get(file_path),
                 'keywords': keywords,
                 'freq': freq,
-                'sections': sections
+                'sections': [(heading, start, end) for heading, start, end, _ in sections],
+                'section_keywords': [section[3] for section in sections]
             })
     
     if not compare_data:
         print("No valid comparison files found.")
         return []
     
-    # TF-IDF vectorization
+    # TF-IDF vectorization (the first run also pays for importing sklearn)
     all_texts = [target_keywords] + [data['keywords'] for data in compare_data]
     
     try:
-        vectorizer = TfidfVectorizer()
-        tfidf_matrix = vectorizer.fit_transform(all_texts)
+        with stage('vectorize', items=len(all_texts)):
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            vectorizer = TfidfVectorizer()
+            tfidf_matrix = vectorizer.fit_transform(all_texts)
         
         # Calculate both cosine similarity and Euclidean distance
         target_vector = tfidf_matrix[0:1]
         compare_vectors = tfidf_matrix[1:]
         
-        # Cosine similarity (range: -1 to 1, higher is more similar)
-        cosine_similarities = cosine_similarity(target_vector, compare_vectors)[0]
+        with stage('score', items=len(compare_data)):
+            # Cosine similarity (range: -1 to 1, higher is more similar)
+            # TF-IDF rows are already L2-normalized, so this is a sparse dot product
+            cosine_similarities = (compare_vectors @ target_vector.T).toarray().ravel()
+            
+            # Euclidean distance (range: 0 to infinity, lower is more similar)
+            # For unit vectors ||a - b||^2 = 2 - 2 * cos(a, b), so the distance is
+            # derived from the cosine without densifying the TF-IDF matrix
+            euclidean_distances_raw = normalized_euclidean(
+                cosine_similarities, compare_vectors.getnnz(axis=1) > 0, target_vector.nnz > 0
+            )
+            
+            # Normalize Euclidean distance to similarity score (0 to 1)
+            # Using formula: similarity = 1 / (1 + distance)
+            euclidean_similarities = 1 / (1 + euclidean_distances_raw)
+            
+            # Calculate combined similarity (average of both metrics)
+            combined_similarities = (cosine_similarities + euclidean_similarities) / 2
         
-        # Euclidean distance (range: 0 to infinity, lower is more similar)
-        # Convert to dense array for Euclidean distance calculation
-        target_dense = target_vector.toarray()
-        compare_dense = compare_vectors.toarray()
-        euclidean_distances_raw = euclidean_distances(target_dense, compare_dense)[0]
+        # Heading-based similarity (target vs every section of every compare file),
+        # vectorized and scored in a single pass
+        section_keywords = [keywords for data in compare_data for keywords in data['section_keywords']]
+        with stage('score', items=len(section_keywords)):
+            section_results = score_section_keywords(target_keywords, section_keywords, section_idf)
         
-        # Normalize Euclidean distance to similarity score (0 to 1)
-        # Using formula: similarity = 1 / (1 + distance)
-        euclidean_similarities = 1 / (1 + euclidean_distances_raw)
+        section_offsets = np.cumsum([0] + [len(data['sections']) for data in compare_data])
         
-        # Calculate combined similarity (average of both metrics)
-        combined_similarities = (cosine_similarities + euclidean_similarities) / 2
+        with stage('sort', items=len(compare_data)):
+            order = top_k_indices(combined_similarities, top_k)
         
-        # Organize results
+        # Build result dictionaries only for the winners, best first
         results = []
-        for i, data in enumerate(compare_data):
-            # Calculate heading-based similarity (target vs each section of compare file)
-            heading_similarities = calculate_heading_similarity(target_keywords, data['sections'])
+        for i in order:
+            data = compare_data[i]
+            text = data['text']
+            if text is None:
+                # Section content is only read back for the returned files
+                text = read_unchanged(data['file'], data['key'])
+            if text is None:
+                print(f"Warning: '{data['file']}' changed after it was analyzed; its section text is not shown.")
+                text = ''
+            sections = [{'heading': heading, 'content': text[start:end]} for heading, start, end in data['sections']]
             
             results.append({
                 'file': data['file'],
@@ -405,12 +609,9 @@ def calculate_similarity(target_file, compare_files, use_sbert=False):
                 'combined_similarity': combined_similarities[i],
                 'euclidean_distance': euclidean_distances_raw[i],
                 'top_keywords': dict(data['freq'][:10]),
-                'heading_similarities': heading_similarities
+                'heading_similarities': build_heading_similarities(sections, section_results, section_offsets[i])
             })
         
-        # Sort by combined similarity (highest first)
-        results.sort(key=lambda x: x['combined_similarity'], reverse=True)
-        
         return results
     except Exception as e:
         print(f"Error calculating similarity: {e}")
@@ -501,45 +702,447 @@ def print_results(target_file, results):
         
         print()
 
+def pop_option(args, name):
+    """Removes `name VALUE` from args and returns VALUE (None if the option is absent)."""
+    if name not in args:
+        return None
+    position = args.index(name)
+    if position + 1 >= len(args):
+        print(f"Error: {name} requires a value.")
+        sys.exit(1)
+    value = args[position + 1]
+    del args[position:position + 2]
+    return value
+
+def pop_int_option(args, name):
+    """Removes `name N` from args and returns N (None if the option is absent)."""
+    value = pop_option(args, name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        print(f"Error: {name} requires a number.")
+        sys.exit(1)
+
+def read_targets(source):
+    """
+    Returns the target notes of a batch run: every .md file of a directory,
+    or the paths listed one per line in a text file.
+    """
+    if os.path.isdir(source):
+        return sorted(str(file) for file in Path(source).rglob('*.md'))
+    with open(source, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+def index_command(args):
+    """
+    Builds a persistent corpus index for a notes directory.
+    With --hash-features N, terms are hashed into N buckets (see `corpus_index`).
+    Usage:
+    python main.py index <directory> [index_path] [--workers N] [--hash-features N]
+    """
+    from corpus_index import CorpusIndex, default_index_path
+    
+    args = list(args)
+    workers = pop_int_option(args, '--workers')
+    n_features = pop_int_option(args, '--hash-features')
+    if not args or not os.path.isdir(args[0]):
+        print("Usage:")
+        print("  python main.py index <directory> [index_path] [--workers N] [--hash-features N]")
+        sys.exit(1)
+    
+    directory = args[0]
+    index_path = args[1] if len(args) > 1 else default_index_path(directory)
+    files = [str(file) for file in Path(directory).rglob('*.md')]
+    
+    start = time.perf_counter()
+    index = CorpusIndex.build(files, root=directory, workers=workers, n_features=n_features)
+    index.save(index_path)
+    elapsed = time.perf_counter() - start
+    
+    columns = f"{index.n_features} hash buckets" if index.n_features else f"{len(index.vocabulary)} terms"
+    print(f"Indexed {len(index)} files ({columns}) in {elapsed:.2f}s")
+    print(f"Index written to {index_path}")
+
+def update_command(args):
+    """
+    Incrementally updates the corpus index of a notes directory.
+    Only new notes and notes whose mtime or content hash changed are processed;
+    deleted notes are dropped from the index.
+    Usage:
+    python main.py update <directory> [index_path] [--workers N]
+    """
+    from corpus_index import CorpusIndex, default_index_path
+    from profiling import Profile, profiling
+    
+    args = list(args)
+    workers = pop_int_option(args, '--workers')
+    if not args or not os.path.isdir(args[0]):
+        print("Usage:")
+        print("  python main.py update <directory> [index_path] [--workers N]")
+        sys.exit(1)
+    
+    directory = args[0]
+    index_path = args[1] if len(args) > 1 else default_index_path(directory)
+    
+    profile = Profile()
+    with profiling(profile):
+        with stage('load'):
+            if os.path.isdir(index_path):
+                index = CorpusIndex.load(index_path, root=directory)
+            else:
+                print(f"No index found at '{index_path}', creating a new one.")
+                index = CorpusIndex(root=directory)
+        
+        with stage('discover') as record:
+            files = [str(file) for file in Path(directory).rglob('*.md')]
+            record['items'] = len(files)
+        
+        with stage('update', items=len(files)):
+            stats = index.update(files, workers)
+        for name, seconds in stats['timings'].items():
+            profile.add(f'update.{name}', seconds)
+        
+        with stage('save', items=len(index)):
+            index.save(index_path)
+    
+    touched = stats['added'] + stats['modified'] + stats['removed']
+    print(f"Updated index of {len(index)} files ({touched} touched):")
+    print(f"  Added:     {stats['added']}")
+    print(f"  Modified:  {stats['modified']}")
+    print(f"  Removed:   {stats['removed']}")
+    print(f"  Unchanged: {stats['unchanged'] + stats['touched']} ({stats['touched']} with new mtime only)")
+    print()
+    print("Stage timings:")
+    print(profile.format_table())
+
+def cache_command(args):
+    """
+    Inspects or prunes the on-disk SBERT embedding cache.
+    Usage:
+    python main.py cache stats
+    python main.py cache prune [--max-mb MB] [--max-age-days DAYS] [--model NAME]
+    """
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog='python main.py cache', description='Manage the SBERT embedding cache')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    subparsers.add_parser('stats', help='Show cached embeddings per model')
+    prune_parser = subparsers.add_parser('prune', help='Evict least recently used embeddings')
+    prune_parser.add_argument('--max-mb', type=float, help='Size limit per model (default: cache limit)')
+    prune_parser.add_argument('--max-age-days', type=float, help='Drop embeddings unused for this many days')
+    prune_parser.add_argument('--model', help='Only prune this model')
+    options = parser.parse_args(args)
+    
+    cache = get_embedding_cache()
+    
+    if options.action == 'stats':
+        stats = cache.stats()
+        print(f"Embedding cache: {cache.cache_dir}")
+        if not stats:
+            print("  (empty)")
+            return
+        for entry in stats:
+            print(f"  {entry['model']}")
+            print(f"    Entries:   {entry['entries']} x {entry['dim']} ({entry['dtype']})")
+            print(f"    Size:      {entry['size_mb']:.2f} MB used, {entry['file_mb']:.2f} MB on disk")
+        return
+    
+    removed = cache.prune(max_mb=options.max_mb, max_age_days=options.max_age_days, model_name=options.model)
+    for model_name, count in removed.items():
+        print(f"  {model_name}: removed {count} embeddings")
+    print(f"Pruned {sum(removed.values())} embeddings")
+
+def graph_command(args):
+    """
+    Computes the related-notes graph of a whole directory in one job.
+    Usage:
+    python main.py graph <directory> [--top-k N] [--output FILE] [--format jsonl|csv] [--sbert]
+    """
+    import argparse
+    from graph import build_graph, DEFAULT_TOP_K, DEFAULT_BLOCK_MB
+    
+    parser = argparse.ArgumentParser(prog='python main.py graph',
+                                     description='Write the top-k related notes of every note')
+    parser.add_argument('directory', help='Notes directory')
+    parser.add_argument('--top-k', type=int, default=DEFAULT_TOP_K, help='Neighbours per note')
+    parser.add_argument('--output', default='related_notes.jsonl', help='Adjacency file (.jsonl or .csv)')
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help='Output format (default: from extension)')
+    parser.add_argument('--sbert', action='store_true', help='Use SBERT embeddings instead of TF-IDF')
+    parser.add_argument('--model', default=DEFAULT_MODEL, help='Sentence-transformers model for --sbert')
+    parser.add_argument('--block-mb', type=float, default=DEFAULT_BLOCK_MB, help='Memory per score block')
+    parser.add_argument('--workers', type=int, help='Processes used to analyze notes')
+    options = parser.parse_args(args)
+    
+    if not os.path.isdir(options.directory):
+        print(f"Error: '{options.directory}' is not a directory.")
+        sys.exit(1)
+    
+    files = sorted(str(file) for file in Path(options.directory).rglob('*.md'))
+    build_graph(files, options.output, top_k=options.top_k, use_sbert=options.sbert, model_name=options.model,
+                output_format=options.format, block_mb=options.block_mb, workers=options.workers)
+
+def serve_command(args):
+    """
+    Keeps the index and models of a directory warm and answers queries over localhost HTTP.
+    Usage:
+    python main.py serve <directory> [--host HOST] [--port PORT] [--sbert]
+    """
+    import argparse
+    from server import serve, DEFAULT_HOST, DEFAULT_PORT
+    
+    parser = argparse.ArgumentParser(prog='python main.py serve',
+                                     description='Serve similarity queries from a warm index')
+    parser.add_argument('directory', help='Notes directory')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='Interface to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Port to listen on')
+    parser.add_argument('--sbert', action='store_true', help='Also keep an SBERT index and model loaded')
+    parser.add_argument('--model', default=DEFAULT_MODEL, help='Sentence-transformers model for --sbert')
+    parser.add_argument('--workers', type=int, help='Processes used to analyze notes')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    options = parser.parse_args(args)
+    
+    if not os.path.isdir(options.directory):
+        print(f"Error: '{options.directory}' is not a directory.")
+        sys.exit(1)
+    
+    serve(options.directory, options.host, options.port, use_sbert=options.sbert, model_name=options.model,
+          workers=options.workers, verbose=options.verbose)
+
+def batch_command(targets_from, args, output=None, top_k=None, workers=None):
+    """
+    Scores many targets against one corpus and streams one JSON line per target.
+    Usage:
+    python main.py --targets-from <file|directory> <directory|files...> [--top-k N] [--output FILE]
+    """
+    import contextlib
+    from batch import calculate_similarity_batch, write_batch_jsonl
+    
+    if not os.path.exists(targets_from) or not args:
+        print("Usage:")
+        print("  python main.py --targets-from <file|directory> <directory|files...> [--top-k N] [--output FILE]")
+        sys.exit(1)
+    
+    targets = read_targets(targets_from)
+    compare_files = []
+    for arg in args:
+        if os.path.isdir(arg):
+            compare_files.extend(str(file) for file in Path(arg).rglob('*.md'))
+        elif os.path.isfile(arg) and arg.endswith('.md'):
+            compare_files.append(arg)
+        else:
+            print(f"Warning: '{arg}' is neither a markdown file nor a directory. Skipping.")
+    
+    start = time.perf_counter()
+    out = open(output, 'w', encoding='utf-8') if output else sys.stdout
+    try:
+        # Without --output, JSON lines go to stdout and progress to stderr
+        with contextlib.redirect_stdout(sys.stderr if out is sys.stdout else sys.stdout):
+            batch = calculate_similarity_batch(targets, compare_files, top_k=top_k, workers=workers)
+            count = write_batch_jsonl(batch, out)
+            print(f"Scored {count} targets against {len(compare_files)} files "
+                  f"in {time.perf_counter() - start:.2f}s")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
 def main():
     """
     Main function
     Usage:
     python main.py <target_file> <compare_file1> <compare_file2> ...
     or
-    python main.py <target_file> <directory>
+    python main.py <target_file> <directory> [--index] [--top-k N] [--workers N] [--hash-features N]
+    or
+    python main.py <target_file> <directory> --stream [--top-k N] [--chunk-size N] [--memory-mb MB] [--hash-features N]
+    or
+    python main.py --targets-from <file|directory> <directory> [--top-k N] [--output FILE]
+    or
+    python main.py index <directory> [index_path] [--workers N] [--hash-features N]
+    or
+    python main.py update <directory> [index_path] [--workers N]
+    or
+    python main.py cache stats|prune
+    or
+    python main.py graph <directory> [--top-k N] [--output FILE]
+    or
+    python main.py serve <directory> [--port PORT] [--sbert]
+    
+    --hash-features N hashes terms into N buckets instead of learning a
+    vocabulary, so memory stays fixed however many distinct terms the notes
+    have (scores are approximate where terms collide). --index queries use
+    the setting the index was built with.
+    
+    --index and --stream runs return the 10 most similar files unless
+    --top-k is given.
+    
+    Similarity runs accept --profile [--profile-output FILE] [--profile-memory]
+    to print per-stage timings and write them as JSON, and --cprofile FILE to
+    dump cProfile statistics.
     """
-    if len(sys.argv) < 3:
+    if len(sys.argv) > 1 and sys.argv[1] == 'index':
+        index_command(sys.argv[2:])
+        return
+    
+    if len(sys.argv) > 1 and sys.argv[1] == 'update':
+        update_command(sys.argv[2:])
+        return
+    
+    if len(sys.argv) > 1 and sys.argv[1] == 'cache':
+        cache_command(sys.argv[2:])
+        return
+    
+    if len(sys.argv) > 1 and sys.argv[1] == 'graph':
+        graph_command(sys.argv[2:])
+        return
+    
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        serve_command(sys.argv[2:])
+        return
+    
+    flags = ('--index', '--stream', '--profile', '--profile-memory')
+    use_index = '--index' in sys.argv
+    use_stream = '--stream' in sys.argv
+    profile_memory = '--profile-memory' in sys.argv
+    use_profile = '--profile' in sys.argv or profile_memory
+    args = [arg for arg in sys.argv[1:] if arg not in flags]
+    
+    top_k = pop_int_option(args, '--top-k')
+    workers = pop_int_option(args, '--workers')
+    chunk_size = pop_int_option(args, '--chunk-size')
+    memory_mb = pop_int_option(args, '--memory-mb')
+    n_features = pop_int_option(args, '--hash-features')
+    targets_from = pop_option(args, '--targets-from')
+    output = pop_option(args, '--output')
+    profile_output = pop_option(args, '--profile-output')
+    cprofile_output = pop_option(args, '--cprofile')
+    
+    def run():
+        if targets_from is not None:
+            batch_command(targets_from, args, output, top_k, workers)
+        else:
+            similarity_command(args, use_index, use_stream, top_k, workers, chunk_size, memory_mb, n_features)
+    
+    if not (use_profile or cprofile_output):
+        run()
+        return
+    
+    from profiling import Profile, profiling, DEFAULT_PROFILE_PATH
+    profile = Profile(trace_memory=profile_memory)
+    with profiling(profile) if use_profile else nullcontext():
+        if cprofile_output:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.runcall(run)
+            profiler.dump_stats(cprofile_output)
+        else:
+            run()
+    
+    # Batch runs without --output write their results to stdout
+    report = sys.stderr if targets_from is not None and not output else sys.stdout
+    if use_profile:
+        profile_output = profile_output or DEFAULT_PROFILE_PATH
+        profile.write_json(profile_output)
+        print(file=report)
+        print("Stage timings:", file=report)
+        print(profile.format_table(), file=report)
+        print(f"Profile written to {profile_output}", file=report)
+    if cprofile_output:
+        print(f"cProfile statistics written to {cprofile_output} (view with: python -m pstats {cprofile_output})",
+              file=report)
+
+def similarity_command(args, use_index=False, use_stream=False, top_k=None, workers=None, chunk_size=None,
+                       memory_mb=None, n_features=None):
+    """Compares a target note with files or directories (see `main` for the options)."""
+    if len(args) < 2:
         print("Usage:")
         print("  python main.py <target_file> <compare_file1> <compare_file2> ...")
-        print("  python main.py <target_file> <directory>")
+        print("  python main.py <target_file> <directory> [--index] [--top-k N] [--workers N] [--hash-features N]")
+        print("  python main.py <target_file> <directory> --stream [--top-k N] [--chunk-size N] [--memory-mb MB]"
+              " [--hash-features N]")
+        print("  python main.py --targets-from <file|directory> <directory> [--top-k N] [--output FILE]")
+        print("  python main.py index <directory> [index_path] [--workers N] [--hash-features N]")
+        print("  python main.py update <directory> [index_path] [--workers N]")
+        print("  python main.py cache stats|prune [--max-mb MB] [--max-age-days DAYS]")
+        print("  python main.py graph <directory> [--top-k N] [--output FILE] [--sbert]")
+        print("  python main.py serve <directory> [--port PORT] [--sbert]")
+        print()
+        print("Similarity runs also accept --profile [--profile-output FILE] [--profile-memory] and --cprofile FILE.")
         print()
         print("Examples:")
         print("  python main.py notes/target.md notes/compare1.md notes/compare2.md")
         print("  python main.py notes/target.md notes/")
+        print("  python main.py notes/target.md notes/ --top-k 5")
+        print("  python main.py index notes/ && python main.py notes/target.md notes/ --index")
         sys.exit(1)
     
-    target_file = sys.argv[1]
+    target_file = args[0]
     
     # Check if target file exists
     if not os.path.exists(target_file):
         print(f"Error: Target file '{target_file}' not found.")
         sys.exit(1)
     
+    if use_index:
+        # Query a prebuilt index instead of processing every comparison file
+        from corpus_index import CorpusIndex, default_index_path
+        
+        if len(args) != 2 or not os.path.isdir(args[1]):
+            print("Error: --index requires exactly one directory to compare against.")
+            sys.exit(1)
+        
+        index_path = default_index_path(args[1])
+        if not os.path.isdir(index_path):
+            print(f"Error: No index found at '{index_path}'. Run: python main.py index {args[1]}")
+            sys.exit(1)
+        
+        index = CorpusIndex.load(index_path, root=args[1])
+        print(f"Comparing target file with {len(index)} indexed files...")
+        print()
+        
+        # Section text is read back from the returned notes, so only the
+        # top 10 are returned unless --top-k asks for more
+        results = index.query(read_markdown_file(target_file), exclude=target_file,
+                              top_k=10 if top_k is None else top_k)
+        with stage('render', items=len(results)):
+            print_results(target_file, results)
+        return
+    
+    if use_stream:
+        # Walk the comparison files lazily and keep only the top results
+        from streaming import stream_similarity, DEFAULT_CHUNK_SIZE
+        
+        if top_k is not None and top_k < 1:
+            print("Error: --stream requires --top-k of at least 1.")
+            sys.exit(1)
+        compare_files = (str(file) for arg in args[1:] for file in
+                         (Path(arg).rglob('*.md') if os.path.isdir(arg) else [Path(arg)])
+                         if file.suffix == '.md' and file.is_file())
+        results = stream_similarity(target_file, compare_files, top_k=10 if top_k is None else top_k,
+                                    chunk_size=chunk_size or DEFAULT_CHUNK_SIZE,
+                                    memory_budget_mb=memory_mb, workers=workers, n_features=n_features)
+        print()
+        with stage('render', items=len(results)):
+            print_results(target_file, results)
+        return
+    
     # Collect comparison files
     compare_files = []
     
-    for arg in sys.argv[2:]:
-        if os.path.isfile(arg):
-            # If it's a file
-            if arg.endswith('.md'):
-                compare_files.append(arg)
-        elif os.path.isdir(arg):
-            # If it's a directory, collect all markdown files
-            for file in Path(arg).rglob('*.md'):
-                compare_files.append(str(file))
-        else:
-            print(f"Warning: '{arg}' is neither a file nor a directory. Skipping.")
+    with stage('discover') as record:
+        for arg in args[1:]:
+            if os.path.isfile(arg):
+                # If it's a file
+                if arg.endswith('.md'):
+                    compare_files.append(arg)
+            elif os.path.isdir(arg):
+                # If it's a directory, collect all markdown files
+                for file in Path(arg).rglob('*.md'):
+                    compare_files.append(str(file))
+            else:
+                print(f"Warning: '{arg}' is neither a file nor a directory. Skipping.")
+        record['items'] = len(compare_files)
     
     if not compare_files:
         print("Error: No valid comparison files found.")
@@ -549,10 +1152,11 @@ def main():
     print()
     
     # Calculate similarity
-    results = calculate_similarity(target_file, compare_files)
+    results = calculate_similarity(target_file, compare_files, top_k=top_k, workers=workers, n_features=n_features)
     
     # Print results
-    print_results(target_file, results)
+    with stage('render', items=len(results)):
+        print_results(target_file, results)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
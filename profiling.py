@@ -0,0 +1,188 @@
+"""
+Per-stage timing and profiling of the similarity pipeline.
+
+Pipeline code marks its stages with `stage(name)`. Nothing is measured
+unless a run is wrapped in `profiling(profile)`; the active profile is
+held in a context variable, so concurrent runs in other threads (server
+queries, GUI workers) are not mixed up and unprofiled runs pay only for
+an empty context manager per stage.
+
+For every stage the profile records calls, item counts, wall time, CPU
+time of this process and the process's peak resident memory when the
+stage ended (the high-water mark, so the stage that raises it stands
+out). With `trace_memory=True` it also records the peak of Python
+allocations during the stage via tracemalloc, which slows the run down.
+
+Work done in worker processes (see `ingest`) is reported as sub-stages
+such as 'ingest.read' whose time is summed over the workers.
+
+Stage names used by the pipeline: discover, read, keywords, sections,
+ingest (with .read/.keywords/.sections), vectorize, sbert_load,
+sbert_encode, score, sort and render.
+
+Usage:
+    profile = Profile()
+    with profiling(profile):
+        results = calculate_similarity(target, files)
+    print(profile.format_table())
+    profile.write_json('profile.json')
+
+    python main.py notes/target.md notes/ --profile [--profile-output FILE] [--cprofile FILE]
+"""
+import sys
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_PROFILE_PATH = 'profile.json'
+
+_active_profile = ContextVar('dragon_brain_profile', default=None)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class Profile:
+    """
+    Stage measurements of one run.
+
+    Args:
+        trace_memory: Also record per-stage peaks of Python allocations
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.total_wall = 0.0
+        self.total_cpu = 0.0
+        self._open_peaks = []
+
+    def _record(self, name):
+        if name not in self.stages:
+            self.stages[name] = {'calls': 0, 'items': None, 'wall_s': 0.0, 'cpu_s': None,
+                                 'peak_rss_mb': None, 'peak_traced_mb': None}
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name, items=None):
+        """
+        Measures the enclosed code as stage `name`; repeated stages add up.
+        Yields the stage record, whose 'items' may be set once known.
+        """
+        record = self._record(name)
+        record['calls'] += 1
+        if items is not None:
+            record['items'] = (record['items'] or 0) + items
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            self._open_peaks.append(0)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] += time.perf_counter() - wall_start
+            record['cpu_s'] = (record['cpu_s'] or 0.0) + time.process_time() - cpu_start
+            record['peak_rss_mb'] = peak_rss_mb()
+            if tracing:
+                # Nested stages reset the peak; fold their peaks into this one
+                peak = max(tracemalloc.get_traced_memory()[1], self._open_peaks.pop())
+                if self._open_peaks:
+                    self._open_peaks[-1] = max(self._open_peaks[-1], peak)
+                record['peak_traced_mb'] = max(record['peak_traced_mb'] or 0.0, peak / (1024 * 1024))
+
+    def add(self, name, wall_s, cpu_s=None, items=None, calls=1):
+        """Adds time measured elsewhere (e.g. summed over worker processes) to stage `name`."""
+        record = self._record(name)
+        record['calls'] += calls
+        record['wall_s'] += wall_s
+        if cpu_s is not None:
+            record['cpu_s'] = (record['cpu_s'] or 0.0) + cpu_s
+        if items is not None:
+            record['items'] = (record['items'] or 0) + items
+
+    def as_dict(self):
+        """JSON-ready summary: stages in first-use order plus run totals."""
+        return {
+            'stages': [dict(name=name, **record) for name, record in self.stages.items()],
+            'total_wall_s': self.total_wall,
+            'total_cpu_s': self.total_cpu,
+            'peak_rss_mb': peak_rss_mb()
+        }
+
+    def format_table(self):
+        return format_profile(self.as_dict())
+
+    def write_json(self, path=DEFAULT_PROFILE_PATH):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+
+def format_profile(data):
+    """Formats `Profile.as_dict()` output as a text table."""
+    def number(value, digits=3):
+        return '-' if value is None else f"{value:.{digits}f}"
+
+    lines = [f"{'Stage':<22} {'Calls':>6} {'Items':>8} {'Wall (s)':>10} {'CPU (s)':>10} {'Peak RSS (MB)':>14}"]
+    for stage in data['stages']:
+        name = stage['name']
+        if '.' in name:
+            # Sub-stage (e.g. measured in worker processes)
+            name = '  ' + name.split('.', 1)[1]
+        lines.append(f"{name:<22} {stage['calls']:>6} {'-' if stage['items'] is None else stage['items']:>8} "
+                     f"{number(stage['wall_s']):>10} {number(stage['cpu_s']):>10} "
+                     f"{number(stage['peak_rss_mb'], 1):>14}")
+        if stage.get('peak_traced_mb') is not None:
+            lines[-1] += f"  (Python peak {stage['peak_traced_mb']:.1f} MB)"
+    lines.append(f"{'total':<22} {'':>6} {'':>8} {number(data['total_wall_s']):>10} "
+                 f"{number(data['total_cpu_s']):>10} {number(data['peak_rss_mb'], 1):>14}")
+    return '\n'.join(lines)
+
+
+def current_profile():
+    """The profile of the run in progress in this context, or None."""
+    return _active_profile.get()
+
+
+@contextmanager
+def profiling(profile):
+    """Makes `profile` the active profile for the enclosed run."""
+    token = _active_profile.set(profile)
+    started_tracing = profile.trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield profile
+    finally:
+        profile.total_wall += time.perf_counter() - wall_start
+        profile.total_cpu += time.process_time() - cpu_start
+        if started_tracing:
+            tracemalloc.stop()
+        _active_profile.reset(token)
+
+
+@contextmanager
+def stage(name, items=None):
+    """Measures the enclosed code as stage `name` of the active profile, if any."""
+    profile = _active_profile.get()
+    if profile is None:
+        yield {}
+        return
+    with profile.stage(name, items) as record:
+        yield record
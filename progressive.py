@@ -0,0 +1,96 @@
+"""
+Progressive, cancellable similarity for interactive front ends.
+
+`calculate_similarity` returns nothing until every comparison note has been
+read and analyzed. `progressive_similarity` analyzes the notes in chunks,
+adds each chunk to an in-memory `CorpusIndex` and yields an update after
+every chunk:
+
+    {'done': files analyzed, 'total': files to analyze,
+     'results': top_k results over the notes analyzed so far,
+     'final': True for the last update,
+     'index': the in-memory CorpusIndex (last update only)}
+
+Partial results carry the file scores `calculate_similarity` would return
+for the notes analyzed so far, with empty 'heading_similarities': sections
+are scored, and the winners read back for their text, only for the final
+update, which equals `calculate_similarity(target_file, compare_files,
+top_k=top_k)`. Each chunk's rows are appended to the index in place.
+
+Cancellation is cooperative: `cancelled()` is checked before every chunk,
+and the generator stops (raising `Cancelled`) without finishing the run.
+
+Usage:
+    for update in progressive_similarity('notes/target.md', files, top_k=20):
+        show(update['results'], update['done'], update['total'])
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from main import read_markdown_file
+from corpus_index import CorpusIndex
+from ingest import ingest_files, resolve_workers
+
+# Number of partial updates to aim for, and bounds on the chunk size
+PARTIAL_UPDATES = 10
+MIN_CHUNK_SIZE = 32
+MAX_CHUNK_SIZE = 2000
+
+
+class Cancelled(Exception):
+    """Raised when a progressive run is cancelled before it finishes."""
+
+
+def progressive_chunk_size(n_files):
+    """Chunk size giving about PARTIAL_UPDATES updates for n_files notes."""
+    return max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, -(-n_files // PARTIAL_UPDATES)))
+
+
+def progressive_similarity(target_file, compare_files, top_k=None, section_idf='corpus', chunk_size=None,
+                           workers=None, cancelled=None):
+    """
+    Yields progress updates with partial results, ending with the exact final results.
+
+    Args:
+        target_file: Path to target markdown file
+        compare_files: List of paths to comparison markdown files
+        top_k: Only return the k most similar files (default: all)
+        section_idf: 'corpus' or 'pairwise' section IDF (see `main.section_scores`)
+        chunk_size: Notes analyzed between updates (default: about PARTIAL_UPDATES updates)
+        workers: Processes used to analyze notes (see `ingest`)
+        cancelled: Callable returning True when the run should stop
+
+    Raises:
+        Cancelled: when `cancelled()` becomes true before the run finishes
+    """
+    target_text = read_markdown_file(target_file)
+    if not target_text:
+        raise ValueError(f"Could not read target file {target_file}")
+
+    files = [file_path for file_path in compare_files if file_path != target_file]  # Skip self
+    chunk_size = chunk_size or progressive_chunk_size(len(files))
+    index = CorpusIndex()
+
+    # One pool for the whole run instead of one per chunk
+    pool_workers = resolve_workers(workers, len(files))
+    executor = ProcessPoolExecutor(max_workers=pool_workers) if pool_workers > 1 else None
+    try:
+        for start in range(0, len(files), chunk_size):
+            if cancelled is not None and cancelled():
+                raise Cancelled()
+            chunk = files[start:start + chunk_size]
+            index.add_notes(chunk, ingest_files(chunk, pool_workers, executor=executor))
+            done = start + len(chunk)
+            final = done == len(files)
+            yield {
+                'done': done,
+                'total': len(files),
+                'results': index.query(target_text, top_k=top_k, section_idf=section_idf, sections=final),
+                'final': final,
+                'index': index if final else None
+            }
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    if not files:
+        yield {'done': 0, 'total': 0, 'results': [], 'final': True, 'index': index}
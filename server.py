@@ -0,0 +1,268 @@
+"""
+Long-running local query server with warm state.
+
+Every `python main.py ...` run pays for importing numpy/scipy/sklearn
+(and loading an SBERT model) and reading the corpus before the first
+score. `serve` does all of that once: the corpus index (and, with
+--sbert, the semantic index and model) stay in memory, and queries are
+answered over HTTP on localhost. Each request runs in its own thread, so
+several clients (editor plugins, scripts) are served concurrently.
+
+Queries only read the current index. A refresh builds an updated index
+next to it and swaps the reference, so in-flight queries finish against
+the old one and are never blocked.
+
+Endpoints (JSON in, JSON out):
+    GET  /health   -> {"status": "ok", "files": N, "queries": N, "uptime": s, ...}
+    POST /query    {"file": "notes/a.md"} or {"text": "..."}, optional
+                   "top_k", "section_idf", "sbert", "sections"
+                   -> {"results": [...], "elapsed_ms": ms}
+    POST /refresh  -> {"stats": {...}, "files": N}
+
+Usage:
+    python main.py serve notes/ --port 8765 [--sbert]
+    python client.py notes/target.md --top-k 5
+"""
+import os
+import sys
+import json
+import time
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from main import read_markdown_file
+from corpus_index import CorpusIndex, default_index_path
+from embeddings import SBERT_AVAILABLE, DEFAULT_MODEL
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_TOP_K = 10
+SEMANTIC_DIRNAME = 'semantic'
+# Requests larger than this are rejected (a note's text is sent at most)
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+
+def _jsonable(value):
+    """Converts numpy scalars and arrays in results to plain JSON types."""
+    if isinstance(value, dict):
+        return {key: _jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+class QueryService:
+    """
+    Warm corpus state for one notes directory.
+
+    Args:
+        directory: Notes directory
+        index_path: Corpus index location (default: `<directory>/.dragon_brain`)
+        use_sbert: Also keep a semantic (SBERT) index and model loaded
+        model_name: Sentence-transformers model used when use_sbert=True
+        workers: Processes used to analyze changed notes on refresh
+    """
+
+    def __init__(self, directory, index_path=None, use_sbert=False, model_name=DEFAULT_MODEL, workers=None):
+        self.directory = directory
+        self.index_path = index_path or default_index_path(directory)
+        self.use_sbert = use_sbert
+        self.model_name = model_name
+        self.workers = workers
+        self.index = None
+        self.semantic_index = None
+        self.started = time.time()
+        self.queries = 0
+        self._counter_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+        if use_sbert and not SBERT_AVAILABLE:
+            raise ImportError("sentence-transformers not installed. Install with: pip install sentence-transformers")
+        self.refresh()
+
+    def _files(self):
+        return sorted(str(file) for file in Path(self.directory).rglob('*.md'))
+
+    def refresh(self):
+        """
+        Brings the warm indexes in line with the notes on disk (see
+        `CorpusIndex.update` and `SemanticIndex.update`) and saves them. Concurrent refreshes are
+        serialized; queries keep using the previous index until the swap.
+        """
+        with self._refresh_lock:
+            files = self._files()
+            if os.path.isdir(self.index_path):
+                index = CorpusIndex.load(self.index_path, root=self.directory)
+            else:
+                index = CorpusIndex(root=self.directory)
+            stats = index.update(files, self.workers)
+            index.save(self.index_path)
+
+            semantic_index = None
+            if self.use_sbert:
+                semantic_index = self._load_semantic_index()
+                # Only new or edited notes are encoded again
+                stats['semantic'] = semantic_index.update(files)
+                semantic_index.save(os.path.join(self.index_path, SEMANTIC_DIRNAME))
+
+            # Reference swaps are atomic; in-flight queries hold the old objects
+            self.index = index
+            self.semantic_index = semantic_index
+            return stats
+
+    def _load_semantic_index(self):
+        """Returns the saved semantic index, or an empty one if there is none for this model."""
+        from ann_index import SemanticIndex
+
+        semantic_path = os.path.join(self.index_path, SEMANTIC_DIRNAME)
+        if os.path.isdir(semantic_path):
+            try:
+                semantic_index = SemanticIndex.load(semantic_path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Warning: could not load the semantic index ({e}); rebuilding it.")
+            else:
+                if semantic_index.model_name == self.model_name:
+                    return semantic_index
+        return SemanticIndex(self.model_name)
+
+    def query(self, file=None, text=None, top_k=DEFAULT_TOP_K, section_idf='corpus', use_sbert=False,
+              include_sections=True):
+        """
+        Scores a note (by path, or its unsaved text) against the warm index.
+        Results are in the format of `main.calculate_similarity`.
+        """
+        if text is None:
+            if file is None:
+                raise ValueError("A query needs 'file' or 'text'")
+            text = read_markdown_file(file)
+            if not text:
+                raise ValueError(f"Could not read '{file}'")
+
+        with self._counter_lock:
+            self.queries += 1
+
+        if use_sbert:
+            semantic_index = self.semantic_index
+            if semantic_index is None:
+                raise ValueError("The server was started without --sbert")
+            exclude = file and str(file)
+            results = semantic_index.query(text, top_k=top_k, exclude=exclude)
+        else:
+            # Notes are only read back for section text that is sent
+            results = self.index.query(text, exclude=file, top_k=top_k, section_idf=section_idf,
+                                       section_text=include_sections)
+
+        if not include_sections:
+            for result in results:
+                result.pop('heading_similarities', None)
+        return _jsonable(results)
+
+    def health(self):
+        return {
+            'status': 'ok',
+            'directory': self.directory,
+            'files': len(self.index),
+            'sbert': self.semantic_index is not None,
+            'queries': self.queries,
+            'uptime': round(time.time() - self.started, 1)
+        }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """HTTP front end of the `QueryService` stored on the server."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_REQUEST_BYTES:
+            raise ValueError("Request too large")
+        if not length:
+            return {}
+        payload = json.loads(self.rfile.read(length).decode('utf-8'))
+        if not isinstance(payload, dict):
+            raise ValueError("Request body must be a JSON object")
+        return payload
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, self.server.service.health())
+        else:
+            self._send(404, {'error': f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        start = time.perf_counter()
+        try:
+            payload = self._read_json()
+            if self.path == '/query':
+                results = service.query(
+                    file=payload.get('file'),
+                    text=payload.get('text'),
+                    top_k=payload.get('top_k', DEFAULT_TOP_K),
+                    section_idf=payload.get('section_idf', 'corpus'),
+                    use_sbert=bool(payload.get('sbert', False)),
+                    include_sections=bool(payload.get('sections', True))
+                )
+                response = {'results': results}
+            elif self.path == '/refresh':
+                stats = service.refresh()
+                stats.pop('timings', None)
+                response = {'stats': stats, 'files': len(service.index)}
+            else:
+                self._send(404, {'error': f"Unknown endpoint {self.path}"})
+                return
+        except (ValueError, TypeError) as e:
+            self._send(400, {'error': str(e)})
+            return
+        except Exception as e:
+            print(f"Error handling {self.path}: {e}", file=sys.stderr)
+            self._send(500, {'error': str(e)})
+            return
+        response['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        self._send(200, response)
+
+
+class QueryServer(ThreadingHTTPServer):
+    """Threaded HTTP server; one thread per connection."""
+    daemon_threads = True
+
+    def __init__(self, service, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+        self.service = service
+        self.verbose = verbose
+        super().__init__((host, port), QueryHandler)
+
+
+def serve(directory, host=DEFAULT_HOST, port=DEFAULT_PORT, use_sbert=False, model_name=DEFAULT_MODEL,
+          workers=None, verbose=False):
+    """Loads the warm state for `directory` and serves queries until interrupted."""
+    start = time.perf_counter()
+    service = QueryService(directory, use_sbert=use_sbert, model_name=model_name, workers=workers)
+    server = QueryServer(service, host, port, verbose)
+    print(f"Loaded {len(service.index)} notes in {time.perf_counter() - start:.2f}s")
+    print(f"Serving {directory} on http://{host}:{server.server_address[1]} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print()
+        print("Shutting down.")
+    finally:
+        server.server_close()
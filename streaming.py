@@ -0,0 +1,298 @@
+"""
+Streaming, memory-bounded similarity for very large note vaults.
+
+`calculate_similarity` keeps every comparison note in memory while it
+scores. `stream_similarity` reads notes from any iterable (e.g. a
+generator over a directory tree) in fixed-size chunks instead:
+
+1. Each chunk is analyzed (in worker processes for large chunks) and
+   turned into sparse term count rows. The rows and compact metadata
+   (path, top keywords, section offsets, mtime and size) are spilled to a temporary
+   directory, and only the corpus document frequencies stay in memory.
+2. Chunks are loaded back one at a time and scored exactly as
+   `calculate_similarity` would score them. Only a heap of the top_k
+   files is kept.
+3. Section text of the winners is reloaded from their notes by offset,
+   unless a note's mtime or size changed since it was analyzed.
+
+Memory therefore grows with the chunk size, the vocabulary and k, not with
+the number of notes. With `memory_budget_mb`, the chunk size is halved
+whenever the process grows past the budget. Peak RSS is reported.
+
+With `n_features`, terms are hashed into a fixed number of columns (see
+`corpus_index.HashingVocabulary`) and the vocabulary drops out of the
+memory bound. No term dictionary is shared, so each worker process reads,
+analyzes, vectorizes and spills its own part of a chunk, and only the
+document frequencies come back to be added up.
+
+Usage:
+    files = (str(f) for f in Path('vault/').rglob('*.md'))
+    results = stream_similarity('vault/target.md', files, top_k=10, memory_budget_mb=512)
+    results = stream_similarity('vault/target.md', files, top_k=10, n_features=2 ** 20)
+"""
+import os
+import gc
+import json
+import time
+import heapq
+import tempfile
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+
+from main import (
+    read_markdown_file, extract_keywords,
+    tfidf_cosine, normalized_euclidean, section_scores, top_k_indices
+)
+from corpus_index import TermVocabulary, HashingVocabulary
+from ingest import ingest_files, analyze_file, resolve_workers, file_key, read_unchanged
+from profiling import peak_rss_mb
+
+DEFAULT_CHUNK_SIZE = 2000
+MIN_CHUNK_SIZE = 64
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (None where unsupported)."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _resized(matrix, n_columns):
+    matrix = matrix.tocsr()
+    matrix.resize((matrix.shape[0], n_columns))
+    return matrix
+
+
+def _file_keys(files):
+    """(mtime_ns, size) of every file, None where stat() fails; taken before the files are read."""
+    keys = []
+    for path in files:
+        try:
+            keys.append(file_key(path))
+        except OSError:
+            keys.append(None)
+    return keys
+
+
+def _spill_chunk(spill_dir, chunk_id, vocabulary, files, notes, keys):
+    """Vectorizes one analyzed chunk and writes it to disk. Returns its document frequencies."""
+    kept = [(path, note, key) for path, note, key in zip(files, notes, keys) if note]
+    file_counts = vocabulary.count_rows([note[0] for _, note, _ in kept])
+    section_counts = vocabulary.count_rows([section[3] for _, note, _ in kept for section in note[2]])
+    meta = [
+        [path, [[word, count] for word, count in top_keywords], [[h, s, e] for h, s, e, _ in sections], key]
+        for path, (_, top_keywords, sections), key in kept
+    ]
+
+    base = os.path.join(spill_dir, f"chunk_{chunk_id:06d}")
+    sparse.save_npz(base + '_files.npz', file_counts)
+    sparse.save_npz(base + '_sections.npz', section_counts)
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False)
+
+    return (np.bincount(file_counts.indices, minlength=len(vocabulary)),
+            np.bincount(section_counts.indices, minlength=len(vocabulary)),
+            len(kept), section_counts.shape[0])
+
+
+def _ingest_and_spill(spill_dir, chunk_id, n_features, files):
+    """Worker side of hashed streaming: analyzes, vectorizes and spills one part of a chunk."""
+    keys = _file_keys(files)
+    notes = [analyze_file(path) for path in files]
+    return _spill_chunk(spill_dir, chunk_id, HashingVocabulary(n_features), files, notes, keys)
+
+
+def _load_chunk(spill_dir, chunk_id, n_terms):
+    base = os.path.join(spill_dir, f"chunk_{chunk_id:06d}")
+    file_counts = _resized(sparse.load_npz(base + '_files.npz'), n_terms)
+    section_counts = _resized(sparse.load_npz(base + '_sections.npz'), n_terms)
+    with open(base + '.json', 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return file_counts, section_counts, meta
+
+
+def _add(total, counts):
+    """Adds a bincount to a running total that may be shorter (the vocabulary grows)."""
+    if len(total) < len(counts):
+        total = np.concatenate([total, np.zeros(len(counts) - len(total), dtype=total.dtype)])
+    total[:len(counts)] += counts
+    return total
+
+
+def stream_similarity(target_file, compare_files, top_k=10, chunk_size=DEFAULT_CHUNK_SIZE,
+                      memory_budget_mb=None, section_idf='corpus', workers=None, spill_dir=None, n_features=None):
+    """
+    Calculates the top_k most similar notes without holding the corpus in memory.
+
+    Args:
+        target_file: Path to target markdown file
+        compare_files: Iterable of paths to comparison markdown files (may be a generator)
+        top_k: Number of results to keep (None keeps every file, which is
+            no longer memory-bounded)
+        chunk_size: Notes read, analyzed and scored at a time
+        memory_budget_mb: Halve the chunk size whenever RSS exceeds this (default: no limit)
+        section_idf: 'corpus' or 'pairwise' section IDF (see `main.section_scores`)
+        workers: Processes used to analyze each chunk (see `ingest`)
+        spill_dir: Directory for the temporary chunk files (default: system temp)
+        n_features: Hash terms into this many columns instead of building a vocabulary
+
+    Returns:
+        List of result dictionaries sorted by similarity, in the same format
+        and with the same scores as `main.calculate_similarity(..., top_k=top_k,
+        n_features=n_features)`.
+    """
+    start_time = time.perf_counter()
+    print("Reading and processing target file...")
+    target_text = read_markdown_file(target_file)
+    if not target_text:
+        print(f"Error: Could not read target file {target_file}")
+        return []
+    target_keywords, _ = extract_keywords(target_text)
+
+    files = (path for path in compare_files if path != target_file)  # Skip self
+    vocabulary = HashingVocabulary(n_features) if n_features else TermVocabulary()
+    file_df = np.zeros(0, dtype=np.int64)
+    section_df = np.zeros(0, dtype=np.int64)
+    n_files = n_sections = n_chunks = 0
+
+    with tempfile.TemporaryDirectory(dir=spill_dir) as chunk_dir:
+        # Pass 1: analyze chunks, spill their count rows, accumulate document frequencies
+        chunk = list(islice(files, chunk_size))
+        # The number of files is unknown up front; a short first chunk is the
+        # whole corpus, so it decides whether a pool is worth starting
+        pool_workers = resolve_workers(workers, len(chunk))
+        executor = ProcessPoolExecutor(max_workers=pool_workers) if pool_workers > 1 else None
+        try:
+            while chunk:
+                if n_features and executor is not None:
+                    # Workers vectorize their parts independently; hashed columns line up
+                    part_size = -(-len(chunk) // pool_workers)
+                    futures = [
+                        executor.submit(_ingest_and_spill, chunk_dir, n_chunks + part, n_features,
+                                        chunk[start:start + part_size])
+                        for part, start in enumerate(range(0, len(chunk), part_size))
+                    ]
+                    spilled = [future.result() for future in futures]
+                else:
+                    keys = _file_keys(chunk)
+                    notes = ingest_files(chunk, workers=pool_workers, executor=executor)
+                    spilled = [_spill_chunk(chunk_dir, n_chunks, vocabulary, chunk, notes, keys)]
+                    del notes
+                for chunk_file_df, chunk_section_df, chunk_files, chunk_sections in spilled:
+                    file_df = _add(file_df, chunk_file_df)
+                    section_df = _add(section_df, chunk_section_df)
+                    n_files += chunk_files
+                    n_sections += chunk_sections
+                    n_chunks += 1
+                del spilled
+
+                rss = current_rss_mb()
+                if memory_budget_mb is not None and rss is not None and rss > memory_budget_mb:
+                    gc.collect()
+                    chunk_size = max(min(MIN_CHUNK_SIZE, chunk_size), chunk_size // 2)
+                print(f"  Processed {n_files} files ({n_chunks} chunks)...")
+                chunk = list(islice(files, chunk_size))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        if n_files == 0:
+            print("No valid comparison files found.")
+            return []
+
+        # Pass 2: score chunk by chunk against the final vocabulary
+        n_terms = len(vocabulary)
+        file_df = _add(file_df, np.zeros(n_terms, dtype=np.int64))
+        section_df = _add(section_df, np.zeros(n_terms, dtype=np.int64))
+        target, oov_square_sum = vocabulary.query_vector(target_keywords)
+        target_square_sum = float(target @ target) + oov_square_sum
+
+        limit = top_k if top_k is not None else float('inf')
+        heap = []  # (combined, -position, result) of the best files so far; worst at heap[0]
+        position = 0
+        for chunk_id in range(n_chunks):
+            file_counts, section_counts, meta = _load_chunk(chunk_dir, chunk_id, n_terms)
+            cosine, row_nonzero, target_nonzero = tfidf_cosine(
+                file_counts, file_df, n_files + 1, target, oov_square_sum
+            )
+            euclidean = normalized_euclidean(cosine, row_nonzero, target_nonzero)
+            euclidean_sim = 1 / (1 + euclidean)
+            combined = (cosine + euclidean_sim) / 2
+
+            section_results = None
+            if target_keywords and section_counts.shape[0]:
+                section_results = section_scores(
+                    target, target_square_sum, section_counts, section_idf,
+                    document_frequency=section_df, n_documents=n_sections + 1
+                )
+            section_offsets = np.cumsum([0] + [len(sections) for _, _, sections, _ in meta])
+
+            # Only files that beat the current k-th best can enter the heap;
+            # later files lose ties, as in a stable sort
+            candidates = np.arange(len(meta))
+            if len(heap) == limit:
+                candidates = candidates[combined > heap[0][0]]
+            for i in candidates[top_k_indices(combined[candidates], top_k)]:
+                path, top_keywords, sections, key = meta[i]
+                entry = (combined[i], -(position + i), {
+                    'file': path,
+                    'cosine_similarity': cosine[i],
+                    'euclidean_similarity': euclidean_sim[i],
+                    'combined_similarity': combined[i],
+                    'euclidean_distance': euclidean[i],
+                    'top_keywords': dict((word, count) for word, count in top_keywords),
+                    'sections': sections,
+                    'key': key,
+                    'section_scores': None if section_results is None else tuple(
+                        # Copies, so the heap does not keep whole chunk arrays alive
+                        values[section_offsets[i]:section_offsets[i + 1]].copy() for values in section_results
+                    )
+                })
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, entry)
+            position += len(meta)
+            del file_counts, section_counts, meta, section_results
+
+    # Materialize section text for the winners only
+    results = []
+    for _, _, result in sorted(heap, key=lambda entry: entry[:2], reverse=True):
+        result['heading_similarities'] = _heading_similarities(
+            result['file'], result.pop('sections'), result.pop('section_scores'), result.pop('key')
+        )
+        results.append(result)
+
+    peak = peak_rss_mb()
+    peak_text = f", peak RSS {peak:.0f} MB" if peak is not None else ""
+    print(f"Streamed {n_files} files in {n_chunks} chunks ({time.perf_counter() - start_time:.2f}s{peak_text})")
+    return results
+
+
+def _heading_similarities(file_path, sections, scores, key):
+    if scores is None or not sections:
+        return []
+    text = read_unchanged(file_path, tuple(key)) if key is not None else None
+    if text is None:
+        print(f"Warning: '{file_path}' changed after it was analyzed; its section text is not shown.")
+        text = ''
+    cosine, euclidean_sim, combined, valid = scores
+    results = []
+    for j, (heading, start, end) in enumerate(sections):
+        # Skip if vocabulary is empty
+        if not valid[j]:
+            continue
+        results.append({
+            'heading': heading,
+            'content': text[start:end],
+            'cosine_similarity': cosine[j],
+            'euclidean_similarity': euclidean_sim[j],
+            'combined_similarity': combined[j]
+        })
+    return results
@@ -0,0 +1,127 @@
+"""
+Tests for the approximate nearest-neighbour index over SBERT embeddings
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+import ann_index
+import main
+from ann_index import IVFIndex, SemanticIndex
+from embeddings import get_engine
+from main import calculate_similarity_sbert, read_markdown_file
+from test_embeddings import fake_model
+
+NOTES_DIR = "sample_notes/english"
+
+
+def test_ivf_full_probe_is_exact():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(500, 32))
+    index = IVFIndex(n_lists=10).build(vectors)
+    query = rng.normal(size=32)
+
+    ids, scores = index.search(query, k=20, nprobe=10)
+    exact_ids, exact_scores = index.exact_search(query, k=20)
+    assert ids.tolist() == exact_ids.tolist()
+    assert np.allclose(scores, exact_scores)
+
+    expected = vectors @ query / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(query))
+    assert ids.tolist() == np.argsort(-expected)[:20].tolist()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'ivf.npz')
+        index.save(path)
+        loaded = IVFIndex.load(path)
+    assert loaded.search(query, k=20, nprobe=3)[0].tolist() == index.search(query, k=20, nprobe=3)[0].tolist()
+
+
+def test_semantic_index_matches_exact_path():
+    with fake_model() as patch:
+        patch.setattr(main, 'SBERT_AVAILABLE', True)
+        patch.setattr(ann_index, 'SBERT_AVAILABLE', True)
+        files = sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+        index = SemanticIndex.build(files, use_cache=False, n_lists=2)
+
+        expected = calculate_similarity_sbert(files[0], files, use_cache=False)
+        actual = index.query(read_markdown_file(files[0]), top_k=len(files), nprobe=2, exclude=files[0])
+        assert [r['file'] for r in actual] == [r['file'] for r in expected]
+        for result, other in zip(expected, actual):
+            assert abs(result['combined_similarity'] - other['combined_similarity']) < 1e-5
+            assert [s['content'] for s in result['heading_similarities']] == \
+                   [s['content'] for s in other['heading_similarities']]
+
+        # top_k=None scores every file exactly
+        every = index.query(read_markdown_file(files[0]), top_k=None, exclude=files[0])
+        assert [r['file'] for r in every] == [r['file'] for r in expected]
+
+        sections = index.query_sections(read_markdown_file(files[0]), top_k=5, nprobe=2, exclude=files[0])
+        best = sorted((s['combined_similarity'] for r in expected for s in r['heading_similarities']), reverse=True)
+        assert np.allclose([s['combined_similarity'] for s in sections], best[:5], atol=1e-5)
+
+
+def test_changed_note_loses_its_sections():
+    with fake_model() as patch, tempfile.TemporaryDirectory() as tmp_dir:
+        patch.setattr(ann_index, 'SBERT_AVAILABLE', True)
+        shutil.copytree(NOTES_DIR, os.path.join(tmp_dir, 'notes'))
+        files = sorted(str(f) for f in Path(tmp_dir, 'notes').rglob('*.md'))
+        index = SemanticIndex.build(files, use_cache=False, n_lists=2)
+        index.save(os.path.join(tmp_dir, 'semantic'))
+        index.save(os.path.join(tmp_dir, 'semantic'))
+        # Only the arrays of the generation in meta.json are kept
+        assert len([name for name in os.listdir(os.path.join(tmp_dir, 'semantic')) if name.endswith('.npz')]) == 3
+        index = SemanticIndex.load(os.path.join(tmp_dir, 'semantic'))
+
+        target = read_markdown_file(files[0])
+        before = {r['file']: r for r in index.query(target, top_k=None)}
+        assert before[files[1]]['heading_similarities']
+
+        edited = files[1]
+        with open(edited, 'a', encoding='utf-8') as f:
+            f.write('\n# Added later\n\nNew text shifts nothing before it, but the size changed.\n')
+        after = {r['file']: r for r in index.query(target, top_k=None)}
+        assert after[files[1]]['heading_similarities'] == []
+        assert after[files[2]]['heading_similarities'] == before[files[2]]['heading_similarities']
+        assert files[1] not in {s['file'] for s in index.query_sections(target, top_k=None)}
+
+
+def test_update_encodes_only_changed_notes():
+    with fake_model() as patch, tempfile.TemporaryDirectory() as tmp_dir:
+        patch.setattr(ann_index, 'SBERT_AVAILABLE', True)
+        shutil.copytree(NOTES_DIR, os.path.join(tmp_dir, 'notes'))
+        files = sorted(str(f) for f in Path(tmp_dir, 'notes').rglob('*.md'))
+        index = SemanticIndex.build(files, use_cache=False)
+        assert index.update(files, use_cache=False) == {'added': 0, 'modified': 0, 'removed': 0,
+                                                         'unchanged': len(files)}
+
+        edited = files[1]
+        with open(edited, 'a', encoding='utf-8') as f:
+            f.write('\n## Edited\n\nA new section about memory consolidation.\n')
+        new_file = os.path.join(tmp_dir, 'notes', 'new.md')
+        with open(new_file, 'w', encoding='utf-8') as f:
+            f.write('# New\n\nSleep and memory.\n')
+        files = sorted(files[1:] + [new_file])
+
+        changed = SemanticIndex.build([edited, new_file], use_cache=False)
+        model = get_engine().get_model(index.model_name)
+        model.batches.clear()
+        stats = index.update(files, use_cache=False)
+        assert stats == {'added': 1, 'modified': 1, 'removed': 1, 'unchanged': len(files) - 2}
+        assert model.batches == [len(changed.files) + len(changed.sections)]
+
+        rebuilt = SemanticIndex.build(files, use_cache=False)
+        assert index.files == rebuilt.files and index.sections == rebuilt.sections
+        assert np.allclose(index.file_embeddings, rebuilt.file_embeddings)
+        assert np.allclose(index.section_embeddings, rebuilt.section_embeddings)
+        assert index.section_ptr.tolist() == rebuilt.section_ptr.tolist()
+
+
+if __name__ == "__main__":
+    test_ivf_full_probe_is_exact()
+    test_semantic_index_matches_exact_path()
+    test_changed_note_loses_its_sections()
+    test_update_encodes_only_changed_notes()
+    print("✅ All ANN index tests passed!")
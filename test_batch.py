@@ -0,0 +1,56 @@
+"""
+Tests for batch queries of many targets against one corpus
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from main import calculate_similarity
+from batch import calculate_similarity_batch
+from test_corpus_index import assert_same_results
+
+NOTES_DIR = "sample_notes"
+
+
+def test_batch_matches_calculate_similarity():
+    files = sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # A target outside the corpus, with words the corpus does not know
+        outside = os.path.join(tmp_dir, 'outside.md')
+        with open(outside, 'w', encoding='utf-8') as f:
+            f.write("# Outside\nNeural networks and deep learning\n## Other\nzzqq unknown words")
+        targets = files[:4] + [outside]
+
+        for section_idf in ['corpus', 'pairwise']:
+            # A tiny block budget scores the targets one block at a time
+            batch = calculate_similarity_batch(targets, files, top_k=5, section_idf=section_idf, block_mb=0.001)
+            for target_file, actual in batch:
+                expected = calculate_similarity(target_file, files, top_k=5, section_idf=section_idf)
+                assert [r['file'] for r in actual] == [r['file'] for r in expected]
+                assert_same_results(expected, actual)
+
+
+def test_note_edited_during_batch_keeps_scores_only():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shutil.copytree(NOTES_DIR, os.path.join(tmp_dir, 'notes'))
+        files = sorted(str(f) for f in Path(tmp_dir, 'notes').rglob('*.md'))
+        edited = files[-1]
+        # One target per block, so the second block is scored after the edit
+        batch = calculate_similarity_batch(files[:2], files, block_mb=0.00001)
+        _, first = next(batch)
+        with open(edited, 'a', encoding='utf-8') as f:
+            f.write('\n## Appended\n\nMore text.\n')
+        _, second = next(batch)
+
+        before = {r['file']: r['heading_similarities'] for r in first}
+        after = {r['file']: r['heading_similarities'] for r in second}
+        assert any(s['content'] for s in before[edited])
+        assert [s['content'] for s in after[edited]] == [''] * len(after[edited])
+        assert all(s['content'] for s in after[files[2]])
+
+
+if __name__ == "__main__":
+    test_batch_matches_calculate_similarity()
+    test_note_edited_during_batch_keeps_scores_only()
+    print("✅ All batch tests passed!")
@@ -0,0 +1,216 @@
+"""
+Tests for the persistent corpus index
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import corpus_index
+from main import calculate_similarity, read_markdown_file
+from corpus_index import CorpusIndex, HashingVocabulary
+from ingest import ingest_files
+
+NOTES_DIR = "sample_notes/english"
+SCORE_KEYS = ['cosine_similarity', 'euclidean_similarity', 'combined_similarity']
+
+
+def collect_files():
+    return sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+
+
+def assert_same_results(expected, actual):
+    """Index results must match calculate_similarity up to float rounding."""
+    assert len(expected) == len(actual)
+    actual_by_file = {result['file']: result for result in actual}
+    for result in expected:
+        other = actual_by_file[result['file']]
+        for key in SCORE_KEYS + ['euclidean_distance']:
+            assert abs(result[key] - other[key]) < 1e-9, (result['file'], key)
+        assert result['top_keywords'] == other['top_keywords']
+        assert len(result['heading_similarities']) == len(other['heading_similarities'])
+        for section, other_section in zip(result['heading_similarities'], other['heading_similarities']):
+            assert section['heading'] == other_section['heading']
+            assert section['content'] == other_section['content']
+            for key in SCORE_KEYS:
+                assert abs(section[key] - other_section[key]) < 1e-9, (result['file'], section['heading'], key)
+
+
+def test_index_matches_calculate_similarity():
+    files = collect_files()
+    index = CorpusIndex.build(files, root=NOTES_DIR)
+
+    for target_file in files[:2]:
+        expected = calculate_similarity(target_file, files)
+        actual = index.query(read_markdown_file(target_file), exclude=target_file)
+        assert_same_results(expected, actual)
+
+    # Legacy per-section IDF
+    expected = calculate_similarity(files[0], files, section_idf='pairwise')
+    actual = index.query(read_markdown_file(files[0]), exclude=files[0], section_idf='pairwise')
+    assert_same_results(expected, actual)
+
+
+def test_index_save_and_load():
+    files = collect_files()
+    index = CorpusIndex.build(files, root=NOTES_DIR)
+    target_file = files[0]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_path = os.path.join(tmp_dir, 'index')
+        index.save(index_path)
+        loaded = CorpusIndex.load(index_path, root=NOTES_DIR)
+
+        # A save interrupted before meta.json is replaced leaves the previous index whole
+        smaller = CorpusIndex.build(files[:3], root=NOTES_DIR)
+        with pytest.MonkeyPatch.context() as patch:
+            def fail_on_meta(path, write):
+                if path.endswith(corpus_index.META_FILENAME):
+                    raise OSError("interrupted")
+                original_write(path, write)
+            original_write = corpus_index._atomic_write
+            patch.setattr(corpus_index, '_atomic_write', fail_on_meta)
+            with pytest.raises(OSError):
+                smaller.save(index_path)
+        assert len(CorpusIndex.load(index_path, root=NOTES_DIR)) == len(index)
+
+        smaller.save(index_path)
+        assert len(CorpusIndex.load(index_path, root=NOTES_DIR)) == len(smaller)
+        assert len([name for name in os.listdir(index_path) if name.endswith('.npz')]) == 2
+
+    assert len(loaded) == len(index)
+    assert loaded.vocabulary.terms == index.vocabulary.terms
+    target_text = read_markdown_file(target_file)
+    assert_same_results(index.query(target_text, exclude=target_file),
+                        loaded.query(target_text, exclude=target_file))
+
+
+def test_index_top_k():
+    files = collect_files()
+    index = CorpusIndex.build(files, root=NOTES_DIR)
+    target_text = read_markdown_file(files[0])
+
+    results = index.query(target_text, exclude=files[0])
+    top = index.query(target_text, exclude=files[0], top_k=3)
+    assert_same_results(results[:3], top)
+    assert [r['file'] for r in top] == [r['file'] for r in results[:3]]
+
+    # Without section text the notes are not read at all
+    reads = []
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(corpus_index, 'read_unchanged', lambda *args: reads.append(args))
+        scores_only = index.query(target_text, exclude=files[0], section_text=False)
+    assert reads == []
+    for result, other in zip(results, scores_only):
+        assert result['combined_similarity'] == other['combined_similarity']
+        assert [s['heading'] for s in result['heading_similarities']] == \
+               [s['heading'] for s in other['heading_similarities']]
+        assert all(s['content'] is None for s in other['heading_similarities'])
+
+    # Pairwise IDF only scores the sections of the winners
+    results = index.query(target_text, exclude=files[0], section_idf='pairwise')
+    top = index.query(target_text, exclude=files[0], top_k=3, section_idf='pairwise')
+    assert_same_results(results[:3], top)
+
+
+def test_index_update_matches_rebuild():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        notes_dir = os.path.join(tmp_dir, 'notes')
+        shutil.copytree(NOTES_DIR, notes_dir)
+        files = sorted(str(f) for f in Path(notes_dir).rglob('*.md'))
+        index = CorpusIndex.build(files, root=notes_dir)
+
+        # Edit one note, delete one and add a new one
+        with open(files[1], 'a', encoding='utf-8') as f:
+            f.write("\n## Added Section\n\nQuantum **entanglement** and neural networks\n")
+        os.remove(files[2])
+        with open(os.path.join(notes_dir, 'new_note.md'), 'w', encoding='utf-8') as f:
+            f.write("# New Note\n\nNeurons, synapses and brain plasticity\n")
+
+        # Until the update, the edited note keeps its old scores but no section text
+        target_text = read_markdown_file(files[0])
+        stale = {r['file']: r for r in index.query(target_text, exclude=files[0])}
+        assert stale[files[1]]['heading_similarities']
+        assert all(section['content'] == '' for section in stale[files[1]]['heading_similarities'])
+        assert all(section['content'] for section in stale[files[3]]['heading_similarities'])
+
+        files = sorted(str(f) for f in Path(notes_dir).rglob('*.md'))
+        stats = index.update(files)
+        assert (stats['added'], stats['modified'], stats['removed']) == (1, 1, 1)
+        assert stats['unchanged'] == len(files) - 2
+
+        rebuilt = CorpusIndex.build(files, root=notes_dir)
+        target_text = read_markdown_file(files[0])
+        assert_same_results(rebuilt.query(target_text, exclude=files[0]),
+                            index.query(target_text, exclude=files[0]))
+
+        # A second update with no changes must not re-process anything
+        stats = index.update(files)
+        assert stats['unchanged'] == len(files)
+
+
+def test_hashed_index():
+    files = collect_files()
+    target_file = files[0]
+    target_text = read_markdown_file(target_file)
+
+    # Without bucket collisions hashed counts score exactly like the term dictionary
+    n_features = 2 ** 22
+    vocabulary = HashingVocabulary(n_features)
+    terms = CorpusIndex.build(files, root=NOTES_DIR).vocabulary.terms
+    assert len({vocabulary.bucket_counts(term).popitem()[0] for term in terms}) == len(terms)
+    index = CorpusIndex.build(files, root=NOTES_DIR, n_features=n_features)
+    expected = calculate_similarity(target_file, files)
+    assert_same_results(expected, index.query(target_text, exclude=target_file))
+    assert_same_results(expected, calculate_similarity(target_file, files, n_features=n_features))
+
+    # Few buckets: the columns stay fixed however many terms there are
+    small = CorpusIndex.build(files, root=NOTES_DIR, n_features=64)
+    assert small.file_counts.shape[1] == small.section_counts.shape[1] == 64
+    results = small.query(target_text, exclude=target_file)
+    assert len(results) == len(files) - 1
+    assert all(0 <= result['cosine_similarity'] <= 1 + 1e-9 for result in results)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_path = os.path.join(tmp_dir, 'index')
+        small.save(index_path)
+        loaded = CorpusIndex.load(index_path, root=NOTES_DIR)
+        assert loaded.n_features == 64
+        assert_same_results(results, loaded.query(target_text, exclude=target_file))
+
+
+def test_add_notes_in_chunks():
+    files = collect_files()
+    built = CorpusIndex.build(files)
+    index = CorpusIndex()
+    buffers = []
+    for start in range(0, len(files)):
+        chunk = files[start:start + 1]
+        index.add_notes(chunk, ingest_files(chunk, workers=1))
+        buffer = index.file_counts.indices.base
+        assert buffer is not None
+        if not any(buffer is other for other in buffers):
+            buffers.append(buffer)
+    # Rows go into spare capacity; the arrays are only copied when they double
+    assert len(buffers) <= 6, len(buffers)
+
+    assert np.array_equal(index.section_ptr, built.section_ptr)
+    target_text = read_markdown_file(files[0])
+    assert_same_results(built.query(target_text, exclude=files[0]), index.query(target_text, exclude=files[0]))
+    # Replaced matrices are copied into fresh buffers before the next append
+    index.update(files[:-1], workers=1)
+    index.add_notes(files[-1:], ingest_files(files[-1:], workers=1))
+    assert_same_results(built.query(target_text, exclude=files[0]), index.query(target_text, exclude=files[0]))
+
+
+if __name__ == "__main__":
+    test_index_matches_calculate_similarity()
+    test_index_save_and_load()
+    test_index_top_k()
+    test_index_update_matches_rebuild()
+    test_hashed_index()
+    test_add_notes_in_chunks()
+    print("✅ All corpus index tests passed!")
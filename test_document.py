@@ -0,0 +1,65 @@
+"""
+Tests for the shared note document model
+"""
+import random
+from pathlib import Path
+
+from main import extract_keywords, extract_sections_by_heading, read_markdown_file
+from document import NoteDocument
+
+NOTES_DIR = "sample_notes"
+
+TEXT = """Intro line
+
+# Title
+Body with **bold** words
+
+## Empty
+
+## Details
+More words
+#not a heading
+"""
+
+
+def test_document_matches_separate_parsers():
+    for file_path in sorted(Path(NOTES_DIR).rglob('*.md')):
+        text = read_markdown_file(str(file_path))
+        document = NoteDocument(text)
+        assert document.sections == extract_sections_by_heading(text)
+        assert (document.keywords, document.freq) == extract_keywords(text)
+        sections = [s for s in extract_sections_by_heading(text) if s['content'].strip()]
+        assert document.section_keywords == [extract_keywords(s['content'], top_n=10)[0] for s in sections]
+
+
+def test_section_at_position():
+    document = NoteDocument(TEXT)
+    assert [heading[3] for heading in document.headings] == ['Title', 'Empty', 'Details']
+    assert document.section_at(0) is None
+    assert document.section_at(TEXT.index('# Title')) == 'Title'
+    assert document.section_at(TEXT.index('bold')) == 'Title'
+    assert document.section_at(TEXT.index('More')) == 'Details'
+    assert document.section_at(TEXT.index('#not')) == 'Details'
+    assert document.section_at(len(TEXT)) == 'Details'
+    assert [s[0] for s in document.section_spans()] == ['Introduction', 'Title', 'Details']
+
+
+def test_edited_matches_full_parse():
+    rng = random.Random(0)
+    pieces = ['# A\n', '## B', '\n', 'text ', '#', ' ', 'x', '\n\n']
+    text = TEXT
+    document = NoteDocument(text)
+    for _ in range(2000):
+        position = rng.randint(0, len(text))
+        removed = rng.randint(0, min(6, len(text) - position))
+        added = ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 3)))
+        text = text[:position] + added + text[position + removed:]
+        document = document.edited(position, removed, len(added), text)
+        assert document.headings == NoteDocument(text).headings
+
+
+if __name__ == "__main__":
+    test_document_matches_separate_parsers()
+    test_section_at_position()
+    test_edited_matches_full_parse()
+    print("✅ All document tests passed!")
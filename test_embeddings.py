@@ -0,0 +1,139 @@
+"""
+Tests for the shared embedding engine and the on-disk embedding cache
+"""
+import os
+import hashlib
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+import embeddings
+from embeddings import EmbeddingCache, EmbeddingEngine
+
+
+class FakeModel:
+    """Stands in for SentenceTransformer: hashed bag-of-words vectors."""
+    loads = 0
+
+    def __init__(self, model_name, dim=16):
+        FakeModel.loads += 1
+        self.dim = dim
+        self.batches = []
+
+    def parameters(self):
+        return []
+
+    def buffers(self):
+        return []
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True, **kwargs):
+        self.batches.append(len(texts))
+        vectors = np.full((len(texts), self.dim), 0.01, dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[i, int(hashlib.md5(word.encode()).hexdigest(), 16) % self.dim] += 1.0
+        return vectors
+
+
+@contextmanager
+def fake_model():
+    """Makes the embedding engine load FakeModel; every patch is undone on exit."""
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(embeddings, 'SentenceTransformer', FakeModel)
+        patch.setattr(embeddings, 'SBERT_AVAILABLE', True)
+        # The shared engine would otherwise keep the fake model loaded
+        patch.setattr(embeddings, '_engine', None)
+        yield patch
+
+
+def test_engine_loads_model_once():
+    with fake_model():
+        FakeModel.loads = 0
+        engine = EmbeddingEngine()
+        first = engine.encode(["neural networks", "brain plasticity"])
+        second = engine.encode(["brain plasticity"])
+    assert FakeModel.loads == 1
+    assert np.allclose(first[1], second[0])
+
+
+def test_cache_skips_known_texts():
+    with fake_model():
+        engine = EmbeddingEngine()
+        texts = ["neural networks", "brain plasticity", "neural networks"]
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = EmbeddingCache(cache_dir)
+            expected = engine.encode(texts)
+            model = engine.get_model()
+            model.batches.clear()
+
+            first = engine.encode(texts, cache=cache)
+            assert sum(model.batches) == 2  # duplicate text encoded once
+
+            # A fresh cache instance reads the vectors back from disk
+            model.batches.clear()
+            second = engine.encode(texts + ["quantum entanglement"], cache=EmbeddingCache(cache_dir))
+            assert sum(model.batches) == 1
+            assert np.allclose(first, expected)
+            assert np.allclose(second[:3], expected)
+
+            stats = EmbeddingCache(cache_dir).stats()
+            assert stats[0]['model'] == embeddings.DEFAULT_MODEL
+            assert stats[0]['entries'] == 3
+
+
+def test_cache_prune_keeps_recent_entries():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = EmbeddingCache(cache_dir)
+        encode = lambda texts: np.ones((len(texts), 8))
+        cache.get_or_encode('model', [f"note {i}" for i in range(10)], encode)
+
+        removed = cache.prune(max_mb=4 * 8 * 4 / (1024 * 1024))
+        assert removed == {'model': 6}
+        assert cache.stats()[0]['entries'] == 4
+
+        removed = cache.prune(max_age_days=0)
+        assert cache.stats()[0]['entries'] == 0
+
+
+def hashed_vectors(texts):
+    """A vector that can be recomputed from the text, to detect rows mapped to the wrong key."""
+    return np.array([np.frombuffer(hashlib.sha256(text.encode()).digest(), dtype=np.uint8) for text in texts],
+                    dtype=np.float32)
+
+
+def write_from_process(cache_dir, worker):
+    # A limit of 40 entries makes the writers evict (and rewrite the file) repeatedly
+    cache = EmbeddingCache(cache_dir, max_mb=40 * 32 * 4 / (1024 * 1024))
+    for round in range(15):
+        texts = [f"note {(worker * 7 + round * 3 + j) % 60}" for j in range(10)]
+        if not np.array_equal(cache.get_or_encode('model', texts, hashed_vectors), hashed_vectors(texts)):
+            return False
+    return True
+
+
+def test_cache_shared_by_processes():
+    with tempfile.TemporaryDirectory() as cache_dir:
+        with ProcessPoolExecutor(max_workers=4) as pool:
+            assert all(pool.map(write_from_process, [cache_dir] * 4, range(4)))
+
+        texts = [f"note {i}" for i in range(60)]
+        cache = EmbeddingCache(cache_dir, max_mb=None)
+        store = cache._store('model')
+        with store.locked():
+            cached = [text for text in texts if embeddings.text_hash(text) in store.keys]
+            rows = store.lookup([embeddings.text_hash(text) for text in cached])
+            assert cached and np.array_equal(store.read(rows), hashed_vectors(cached))
+            vector_files = [name for name in os.listdir(store.path) if name.endswith('.npy')]
+            assert vector_files == [store.vectors_filename]
+
+
+if __name__ == "__main__":
+    test_engine_loads_model_once()
+    test_cache_skips_known_texts()
+    test_cache_prune_keeps_recent_entries()
+    test_cache_shared_by_processes()
+    print("✅ All embedding tests passed!")
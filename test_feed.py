@@ -0,0 +1,70 @@
+"""
+Tests for the GUI feed cards
+"""
+import os
+import tempfile
+
+from feed import build_feed_cards, card_content, card_html, MarkdownRenderer
+
+
+def make_result(file, similarity, sections):
+    return {
+        'file': file,
+        'combined_similarity': similarity,
+        'top_keywords': {'alpha': 3, 'beta': 2},
+        'heading_similarities': [
+            {'heading': heading, 'content': f"{heading} text", 'combined_similarity': score}
+            for heading, score in sections
+        ]
+    }
+
+
+def test_cards_sorted_by_section_similarity():
+    results = [
+        make_result('notes/a.md', 0.8, [('A1', 0.3), ('A2', 0.9)]),
+        make_result('notes/b.md', 0.6, [('B1', 0.5)])
+    ]
+    cards = build_feed_cards(results)
+    assert [card['heading'] for card in cards] == ['A2', 'B1', 'A1']
+    assert [card['sim_class'] for card in cards] == ['high', 'medium', 'high']
+    assert cards[0]['keywords'] == ['alpha', 'beta']
+
+
+def test_whole_file_card_is_read_when_shown():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'note.md')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("# <Title>\nbody")
+        cards = build_feed_cards([make_result(path, 0.4, [])])
+        assert len(cards) == 1 and cards[0]['content'] is None
+        assert card_content(cards[0]) == "# <Title>\nbody"
+
+    # Headings and file names are escaped; content goes through the renderer
+    card = dict(cards[0], heading='<b>', content='**x**')
+    html = card_html(card, lambda text: f"<p>{text}</p>")
+    assert '&lt;b&gt;' in html and '<p>**x**</p>' in html and '40.0% match' in html
+
+
+def test_renderer_caches_by_content_and_options():
+    renderer = MarkdownRenderer(max_bytes=200)
+    first = renderer.render("**bold** text")
+    assert renderer.render("**bold** text") is first
+    assert (renderer.hits, renderer.misses) == (1, 1)
+
+    # Other options are other entries
+    basic = MarkdownRenderer(use_markdown=False)
+    assert basic.render("**bold** text") == "<b>bold</b> text"
+
+    # The least recently used HTML is dropped once the byte cap is reached
+    for i in range(20):
+        renderer.render(f"paragraph {i} " * 3)
+    assert renderer.cached_bytes <= 200 and 0 < len(renderer) < 21
+    renderer.render("**bold** text")
+    assert renderer.misses == 22
+
+
+if __name__ == "__main__":
+    test_cards_sorted_by_section_similarity()
+    test_whole_file_card_is_read_when_shown()
+    test_renderer_caches_by_content_and_options()
+    print("✅ All feed tests passed!")
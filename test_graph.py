@@ -0,0 +1,50 @@
+"""
+Tests for the all-pairs related-notes graph
+"""
+import os
+import json
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+from main import calculate_similarity
+from embeddings import embedding_scores
+from graph import build_graph, embedding_neighbors
+
+NOTES_DIR = "sample_notes"
+
+
+def test_graph_matches_per_note_similarity():
+    files = sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, 'graph.jsonl')
+        # A tiny block budget forces many blocks
+        build_graph(files, output_path, top_k=5, block_mb=0.01, progress=False)
+        with open(output_path, 'r', encoding='utf-8') as f:
+            graph = {row['source']: row['neighbors'] for row in map(json.loads, f)}
+
+    assert len(graph) == len(files)
+    for target_file in files[:3]:
+        expected = calculate_similarity(target_file, files, top_k=5)
+        neighbors = graph[target_file]
+        assert [n['target'] for n in neighbors] == [r['file'] for r in expected]
+        for neighbor, result in zip(neighbors, expected):
+            assert abs(neighbor['combined_similarity'] - result['combined_similarity']) < 1e-6
+
+
+def test_embedding_neighbors_match_embedding_scores():
+    embeddings = np.random.default_rng(0).normal(size=(50, 8))
+    for row, columns, cosine, _, combined in embedding_neighbors(embeddings, top_k=4, block_mb=0.001,
+                                                                 progress=False):
+        expected_cosine, _, _, expected_combined = embedding_scores(embeddings[row], embeddings)
+        expected_combined[row] = -np.inf
+        assert columns.tolist() == np.argsort(-expected_combined, kind='stable')[:4].tolist()
+        assert np.allclose(cosine, expected_cosine[columns])
+        assert np.allclose(combined, expected_combined[columns])
+
+
+if __name__ == "__main__":
+    test_graph_matches_per_note_similarity()
+    test_embedding_neighbors_match_embedding_scores()
+    print("✅ All graph tests passed!")
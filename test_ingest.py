@@ -0,0 +1,51 @@
+"""
+Tests for parallel note ingestion
+"""
+import os
+import tempfile
+from pathlib import Path
+
+from main import extract_keywords, extract_sections_by_heading, read_markdown_file
+from ingest import ingest_files, file_key, read_unchanged
+
+NOTES_DIR = "sample_notes"
+
+
+def test_parallel_ingestion_matches_serial():
+    files = sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md')) + ['missing.md']
+    serial = ingest_files(files, workers=1)
+    parallel = ingest_files(files, workers=2, chunksize=3)
+    assert parallel == serial
+    assert serial[-1] is None
+
+    text = read_markdown_file(files[0])
+    keywords, top_keywords, sections = serial[0]
+    assert (keywords, top_keywords) == (extract_keywords(text)[0], extract_keywords(text)[1][:10])
+    expected = [s for s in extract_sections_by_heading(text) if s['content'].strip()]
+    assert [(heading, text[start:end]) for heading, start, end, _ in sections] == \
+           [(s['heading'], s['content']) for s in expected]
+
+
+def test_section_text_is_kept_or_checked():
+    files = sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+    assert ingest_files(files[:3], workers=2, with_text=True)[0][3] == read_markdown_file(files[0])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'note.md')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("# B\n\n## Two\nalpha gamma\n")
+        key = file_key(path)
+        assert read_unchanged(path, key) == "# B\n\n## Two\nalpha gamma\n"
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("# B\n\nrewritten")
+        # Offsets from the old version must not be applied to the new text
+        assert read_unchanged(path, key) is None
+        os.remove(path)
+        assert read_unchanged(path, key) is None
+
+
+if __name__ == "__main__":
+    test_parallel_ingestion_matches_serial()
+    test_section_text_is_kept_or_checked()
+    print("✅ All ingestion tests passed!")
@@ -0,0 +1,66 @@
+"""
+Tests for the keyword extractor in main.py
+"""
+import re
+from collections import Counter
+from pathlib import Path
+
+from main import (
+    extract_keywords, extract_sections_by_heading, read_markdown_file,
+    ENGLISH_STOP_WORDS, KOREAN_STOP_WORDS
+)
+
+NOTES_DIR = "sample_notes"
+
+TRICKY_TEXTS = [
+    "",
+    "# Title with **bold** and [a link](http://x.y)\n\nPlain words, again words.",
+    "Inline `code spans` and ```\nfenced\ncode``` stay out of the words",
+    "a`b ```x``` c`d ` unclosed",
+    "한국어와English가섞인 문장입니다 가a나bc 다",
+    "C# is #not a heading but ## this is",
+    "__under__ **bold** ****empty**** __ ** _x_ *y*",
+    "Kelvin sign and İstanbul lower to ASCII letters",
+    "snake_case_words and CamelCase and x1y2z3",
+]
+
+
+def reference_extract_keywords(text, top_n=20):
+    """The original multi-pass implementation, kept to check exactness."""
+    english_stop_words = set(ENGLISH_STOP_WORDS)
+    korean_stop_words = set(KOREAN_STOP_WORDS)
+
+    keywords = []
+    keywords.extend(re.findall(r'#{1,6}\s+(.+)', text))
+    keywords.extend([b[0] or b[1] for b in re.findall(r'\*\*(.+?)\*\*|__(.+?)__', text)])
+    keywords.extend(re.findall(r'\[(.+?)\]\(.+?\)', text))
+
+    text_without_code = re.sub(r'```.*?```', '', text, flags=re.DOTALL)
+    text_without_code = re.sub(r'`.*?`', '', text_without_code)
+    clean_text = re.sub(r'[#*_\[\]\(\)`]', ' ', text_without_code)
+    words = re.findall(r'[가-힣]+|[a-zA-Z]+', clean_text.lower())
+    filtered_words = [
+        w for w in words
+        if len(w) >= 2 and w not in english_stop_words and w not in korean_stop_words
+    ]
+
+    word_freq = Counter(keywords + filtered_words)
+    top_keywords = [word for word, freq in word_freq.most_common(top_n * 3)]
+    return ' '.join(top_keywords), list(word_freq.items())
+
+
+def test_keywords_match_reference():
+    texts = list(TRICKY_TEXTS)
+    for file_path in sorted(Path(NOTES_DIR).rglob('*.md')):
+        text = read_markdown_file(str(file_path))
+        texts.append(text)
+        texts.extend(section['content'] for section in extract_sections_by_heading(text))
+
+    for text in texts:
+        for top_n in (20, 10):
+            assert extract_keywords(text, top_n) == reference_extract_keywords(text, top_n), text[:80]
+
+
+if __name__ == "__main__":
+    test_keywords_match_reference()
+    print("✅ All keyword tests passed!")
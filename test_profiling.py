@@ -0,0 +1,80 @@
+"""
+Tests for per-stage profiling of the similarity pipeline
+"""
+import os
+import json
+import glob
+import tempfile
+
+from main import calculate_similarity
+from profiling import Profile, profiling, stage, current_profile, format_profile
+
+
+def sample_files():
+    files = sorted(glob.glob(os.path.join('sample_notes', '**', '*.md'), recursive=True))
+    return files[0], files[1:]
+
+
+def test_stages_recorded_without_changing_results():
+    target, compare_files = sample_files()
+    expected = calculate_similarity(target, compare_files)
+
+    profile = Profile()
+    with profiling(profile):
+        results = calculate_similarity(target, compare_files)
+    assert current_profile() is None
+
+    assert [r['file'] for r in results] == [r['file'] for r in expected]
+    assert [r['combined_similarity'] for r in results] == [r['combined_similarity'] for r in expected]
+
+    stages = profile.stages
+    for name in ('read', 'keywords', 'ingest', 'ingest.read', 'ingest.keywords', 'vectorize', 'score', 'sort'):
+        assert name in stages, name
+    assert stages['ingest']['items'] == len(compare_files)
+    assert stages['score']['calls'] == 2
+    assert all(record['wall_s'] >= 0 for record in stages.values())
+    assert profile.total_wall >= stages['vectorize']['wall_s']
+
+
+def test_json_and_table():
+    profile = Profile()
+    with profiling(profile):
+        with stage('read', items=3) as record:
+            record['items'] += 1
+        with stage('read', items=2):
+            pass
+        profile.add('ingest.read', 0.5, cpu_s=0.25, calls=0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'profile.json')
+        profile.write_json(path)
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    assert [s['name'] for s in data['stages']] == ['read', 'ingest.read']
+    assert data['stages'][0]['calls'] == 2 and data['stages'][0]['items'] == 6
+    assert data['stages'][1]['wall_s'] == 0.5 and data['stages'][1]['cpu_s'] == 0.25
+
+    table = format_profile(data)
+    assert table.splitlines()[-1].startswith('total')
+    assert '\n  read' in table  # Sub-stages are indented under their stage
+
+
+def test_stage_without_profile_is_noop():
+    with stage('read', items=1) as record:
+        record['items'] = 5
+    assert current_profile() is None
+
+    profile = Profile(trace_memory=True)
+    with profiling(profile):
+        with stage('outer'):
+            with stage('inner'):
+                data = [0] * 100000
+            del data
+    assert profile.stages['outer']['peak_traced_mb'] >= profile.stages['inner']['peak_traced_mb'] > 0
+
+
+if __name__ == "__main__":
+    test_stages_recorded_without_changing_results()
+    test_json_and_table()
+    test_stage_without_profile_is_noop()
+    print("✅ All profiling tests passed!")
@@ -0,0 +1,58 @@
+"""
+Tests for progressive, cancellable similarity
+"""
+from pathlib import Path
+
+import pytest
+
+import corpus_index
+from main import calculate_similarity
+from progressive import progressive_similarity, Cancelled
+from test_corpus_index import assert_same_results
+
+NOTES_DIR = "sample_notes"
+
+
+def test_progressive_updates_match_calculate_similarity():
+    files = sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+    updates = []
+    reads = []
+    with pytest.MonkeyPatch.context() as patch:
+        read_unchanged = corpus_index.read_unchanged
+        patch.setattr(corpus_index, 'read_unchanged', lambda *args: reads.append(args) or read_unchanged(*args))
+        for update in progressive_similarity(files[0], files, chunk_size=8, workers=1):
+            # Partial updates never read notes back
+            assert update['final'] or reads == []
+            updates.append(update)
+
+    assert [u['done'] for u in updates] == [8, 16, 24, 32, len(files) - 1]
+    assert [u['final'] for u in updates] == [False] * 4 + [True]
+    # Partial results carry the file scores of the notes analyzed so far; the last update is exact
+    partial = [f for f in files[1:9]]
+    expected = calculate_similarity(files[0], [files[0]] + partial)
+    for result in expected:
+        result['heading_similarities'] = []
+    assert_same_results(expected, updates[0]['results'])
+    assert_same_results(calculate_similarity(files[0], files), updates[-1]['results'])
+
+    top = list(progressive_similarity(files[0], files, top_k=5, chunk_size=8, workers=1))[-1]['results']
+    assert_same_results(calculate_similarity(files[0], files, top_k=5), top)
+
+
+def test_progressive_cancel():
+    files = sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+    updates = []
+    try:
+        for update in progressive_similarity(files[0], files, chunk_size=8, workers=1,
+                                             cancelled=lambda: len(updates) == 2):
+            updates.append(update)
+        assert False, "the run must stop once cancelled"
+    except Cancelled:
+        pass
+    assert len(updates) == 2
+
+
+if __name__ == "__main__":
+    test_progressive_updates_match_calculate_similarity()
+    test_progressive_cancel()
+    print("✅ All progressive tests passed!")
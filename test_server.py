@@ -0,0 +1,54 @@
+"""
+Tests for the warm query server and its client
+"""
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import client
+from main import calculate_similarity
+from server import QueryService, QueryServer
+
+NOTES_DIR = "sample_notes"
+
+
+def test_server_matches_calculate_similarity():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        notes_dir = os.path.join(tmp_dir, 'notes')
+        shutil.copytree(NOTES_DIR, notes_dir)
+        files = sorted(str(f) for f in Path(notes_dir).rglob('*.md'))
+
+        server = QueryServer(QueryService(notes_dir), port=0)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            expected = calculate_similarity(files[0], files, top_k=5)
+            results = client.query(file=files[0], top_k=5, url=url)
+            assert [r['file'] for r in results] == [r['file'] for r in expected]
+            for result, reference in zip(results, expected):
+                assert abs(result['combined_similarity'] - reference['combined_similarity']) < 1e-9
+                assert [h['heading'] for h in result['heading_similarities']] == \
+                    [h['heading'] for h in reference['heading_similarities']]
+
+            # New notes are picked up on refresh
+            with open(os.path.join(notes_dir, 'new_note.md'), 'w', encoding='utf-8') as f:
+                f.write("# New\nFresh words about gardening and tomatoes")
+            assert client.refresh(url=url)['stats']['added'] == 1
+            assert client.health(url=url)['files'] == len(files) + 1
+
+            try:
+                client.query(url=url)
+                assert False, "a query without file or text must fail"
+            except client.ServerError as e:
+                assert e.args[0].startswith('400')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    test_server_matches_calculate_similarity()
+    print("✅ All server tests passed!")
@@ -0,0 +1,104 @@
+"""
+Tests for the TF-IDF similarity engine in main.py
+"""
+from pathlib import Path
+
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import cosine_similarity, euclidean_distances
+
+from main import (
+    calculate_similarity, calculate_heading_similarity, extract_keywords,
+    extract_sections_by_heading, read_markdown_file, top_k_indices
+)
+
+NOTES_DIR = "sample_notes/english"
+
+
+def collect_files():
+    return sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+
+
+def test_pairwise_sections_match_per_section_vectorizer():
+    """section_idf='pairwise' must reproduce one TfidfVectorizer per section."""
+    files = collect_files()
+    target_keywords, _ = extract_keywords(read_markdown_file(files[0]))
+    sections = extract_sections_by_heading(read_markdown_file(files[1]))
+
+    results = calculate_heading_similarity(target_keywords, sections, section_idf='pairwise')
+
+    expected = []
+    for section in sections:
+        if not section['content'].strip():
+            continue
+        section_keywords, _ = extract_keywords(section['content'], top_n=10)
+        tfidf_matrix = TfidfVectorizer().fit_transform([target_keywords, section_keywords])
+        cosine = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
+        distance = euclidean_distances(tfidf_matrix[0:1].toarray(), tfidf_matrix[1:2].toarray())[0][0]
+        expected.append((section['heading'], cosine, 1 / (1 + distance)))
+
+    assert len(results) == len(expected)
+    for result, (heading, cosine, euclidean_sim) in zip(results, expected):
+        assert result['heading'] == heading
+        assert abs(result['cosine_similarity'] - cosine) < 1e-9
+        assert abs(result['euclidean_similarity'] - euclidean_sim) < 1e-9
+
+
+def test_corpus_sections_use_single_vectorizer():
+    """section_idf='corpus' scores every section with one shared TF-IDF fit."""
+    files = collect_files()
+    target_file = files[0]
+    results = calculate_similarity(target_file, files)
+
+    target_keywords, _ = extract_keywords(read_markdown_file(target_file))
+    section_keywords = []
+    for result in results:
+        for section in result['heading_similarities']:
+            section_keywords.append(extract_keywords(section['content'], top_n=10)[0])
+    tfidf_matrix = TfidfVectorizer().fit_transform([target_keywords] + section_keywords)
+    expected = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:])[0]
+
+    actual = [s['cosine_similarity'] for r in results for s in r['heading_similarities']]
+    assert len(actual) == len(expected)
+    for value, expected_value in zip(actual, expected):
+        assert abs(value - expected_value) < 1e-9
+
+
+def test_file_scores_match_dense_euclidean():
+    """Sparse Euclidean distances must equal the dense sklearn computation."""
+    files = collect_files()
+    target_file = files[0]
+    results = calculate_similarity(target_file, files)
+
+    target_keywords, _ = extract_keywords(read_markdown_file(target_file))
+    compare_files = [f for f in files if f != target_file]
+    compare_keywords = [extract_keywords(read_markdown_file(f))[0] for f in compare_files]
+    tfidf_matrix = TfidfVectorizer().fit_transform([target_keywords] + compare_keywords)
+    distances = euclidean_distances(tfidf_matrix[0:1].toarray(), tfidf_matrix[1:].toarray())[0]
+    cosines = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:])[0]
+
+    results_by_file = {result['file']: result for result in results}
+    for file_path, distance, cosine in zip(compare_files, distances, cosines):
+        assert abs(results_by_file[file_path]['euclidean_distance'] - distance) < 1e-9
+        assert abs(results_by_file[file_path]['cosine_similarity'] - cosine) < 1e-9
+
+
+def test_top_k_matches_full_ranking():
+    """top_k must return exactly the head of the full ranking."""
+    assert top_k_indices([0.2, 0.9, 0.5, 0.9, 0.1], 3).tolist() == [1, 3, 2]
+    assert top_k_indices([0.2, 0.9, 0.5], None).tolist() == [1, 2, 0]
+
+    files = collect_files()
+    for section_idf in ['corpus', 'pairwise']:
+        results = calculate_similarity(files[0], files, section_idf=section_idf)
+        top = calculate_similarity(files[0], files, section_idf=section_idf, top_k=3)
+        assert [r['file'] for r in top] == [r['file'] for r in results[:3]]
+        for result, other in zip(results, top):
+            assert result['heading_similarities'] == other['heading_similarities']
+
+
+if __name__ == "__main__":
+    test_pairwise_sections_match_per_section_vectorizer()
+    test_corpus_sections_use_single_vectorizer()
+    test_file_scores_match_dense_euclidean()
+    test_top_k_matches_full_ranking()
+    print("✅ All similarity tests passed!")
@@ -0,0 +1,22 @@
+"""
+Tests that heavy optional dependencies stay out of startup
+"""
+import sys
+import subprocess
+
+HEAVY_MODULES = ['sklearn', 'torch', 'sentence_transformers', 'nltk', 'markdown']
+
+
+def test_import_main_is_light():
+    code = (
+        "import sys, main, corpus_index, server\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == '', f"imported at startup: {result.stdout.strip()}"
+
+
+if __name__ == "__main__":
+    test_import_main_is_light()
+    print("✅ All startup tests passed!")
@@ -0,0 +1,64 @@
+"""
+Tests for streaming, memory-bounded similarity
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from main import calculate_similarity
+from streaming import stream_similarity
+from test_corpus_index import assert_same_results
+
+NOTES_DIR = "sample_notes"
+
+
+def test_stream_matches_calculate_similarity():
+    files = sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+    for section_idf in ['corpus', 'pairwise']:
+        expected = calculate_similarity(files[0], files, section_idf=section_idf, top_k=5)
+        # Small chunks so that scoring spans several spilled chunks
+        actual = stream_similarity(files[0], iter(files), top_k=5, chunk_size=4,
+                                   section_idf=section_idf, workers=1)
+        assert [r['file'] for r in actual] == [r['file'] for r in expected]
+        assert_same_results(expected, actual)
+
+
+def test_hashed_stream_with_workers():
+    files = sorted(str(f) for f in Path(NOTES_DIR).rglob('*.md'))
+    for n_features in [2 ** 20, 256]:
+        expected = calculate_similarity(files[0], files, top_k=5, n_features=n_features)
+        # Two workers each vectorize and spill their half of every chunk
+        actual = stream_similarity(files[0], iter(files), top_k=5, chunk_size=8, workers=2, n_features=n_features)
+        assert [r['file'] for r in actual] == [r['file'] for r in expected]
+        assert_same_results(expected, actual)
+
+
+def test_note_edited_after_spill_keeps_scores_only():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        shutil.copytree(NOTES_DIR, os.path.join(tmp_dir, 'notes'))
+        files = sorted(str(f) for f in Path(tmp_dir, 'notes').rglob('*.md'))
+        expected = stream_similarity(files[0], iter(files), top_k=None, chunk_size=4, workers=1)
+        edited = expected[0]['file']
+        assert expected[0]['heading_similarities']
+
+        def edit_after_listing():
+            # Runs when the last chunk is requested, after the first chunks were analyzed
+            yield from files
+            with open(edited, 'r+', encoding='utf-8') as f:
+                text = f.read()
+                f.seek(0)
+                f.write('# Prepended\n\n' + text)
+
+        actual = stream_similarity(files[0], edit_after_listing(), top_k=None, chunk_size=4, workers=1)
+        assert [r['file'] for r in actual] == [r['file'] for r in expected]
+        assert [s['content'] for s in actual[0]['heading_similarities']] == \
+               [''] * len(expected[0]['heading_similarities'])
+        assert actual[1]['heading_similarities'] == expected[1]['heading_similarities']
+
+
+if __name__ == "__main__":
+    test_stream_matches_calculate_similarity()
+    test_hashed_stream_with_workers()
+    test_note_edited_after_spill_keeps_scores_only()
+    print("✅ All streaming tests passed!")
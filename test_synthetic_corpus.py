@@ -0,0 +1,59 @@
+"""
+Tests for the benchmark corpus generator and regression check
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from main import find_headings, extract_keywords
+from synthetic_corpus import generate_corpus, NoteGenerator
+from bench_suite import compare, note_count
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_corpus_is_deterministic():
+    with tempfile.TemporaryDirectory() as tmp:
+        first = generate_corpus(os.path.join(tmp, 'a'), 30, sections=(2, 4), seed=3)
+        second = generate_corpus(os.path.join(tmp, 'b'), 30, sections=(2, 4), seed=3)
+        assert [os.path.basename(f) for f in first] == [os.path.basename(f) for f in second]
+        assert all(read(a) == read(b) for a, b in zip(first, second))
+
+        texts = [read(path) for path in first]
+        # Both languages, the configured number of sections, and keywords to extract
+        assert any('가' <= ch <= '힣' for ch in ''.join(texts))
+        assert any(text.split('\n', 1)[0].isascii() for text in texts)
+        for text in texts:
+            sections = [h for h in find_headings(text) if h[2] == 2]
+            assert 2 <= len(sections) <= 4
+            assert extract_keywords(text)
+
+        # An existing corpus with the same parameters is reused, another seed is not
+        mtime = os.path.getmtime(first[0])
+        assert generate_corpus(os.path.join(tmp, 'a'), 30, sections=(2, 4), seed=3) == first
+        assert os.path.getmtime(first[0]) == mtime
+        other = generate_corpus(os.path.join(tmp, 'a'), 30, sections=(2, 4), seed=4)
+        assert [read(path) for path in other] != texts
+
+    assert NoteGenerator(seed=1).fingerprint() != NoteGenerator(seed=2).fingerprint()
+
+
+def test_compare_flags_regressions():
+    baseline = {'benchmarks': {'keywords': {'best_s': 1.0}, 'similarity': {'best_s': 2.0}}}
+    current = {'benchmarks': {'keywords': {'best_s': 1.05}, 'similarity': {'best_s': 2.5}, 'feed': {'best_s': 0.1}}}
+    rows = {row['name']: row for row in compare(baseline, current, threshold=0.1)}
+    assert set(rows) == {'keywords', 'similarity'}
+    assert not rows['keywords']['regression']
+    assert rows['similarity']['regression'] and abs(rows['similarity']['change'] - 0.25) < 1e-9
+    assert note_count('10k') == 10000 and note_count('1000') == 1000
+
+
+if __name__ == "__main__":
+    test_corpus_is_deterministic()
+    test_compare_flags_regressions()
+    print("✅ All synthetic corpus tests passed!")